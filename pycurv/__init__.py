@@ -14,3 +14,9 @@ from .tomogram_batch_processing import split_segmentation
 from .distances_between_surfaces import *
 from .surface import *
 from .linalg import *
+from .batch_voting import *
+from .neighborhoods import *
+from .bounded_dijkstra import *
+from .indexed_heap import *
+from .triangle_mesh import *
+from .coordinates_index import *
@@ -0,0 +1,399 @@
+import numpy as np
+
+"""
+Set of vectorized functions implementing the vote collection steps of the
+normal vector voting algorithm (Page et al., 2002) for many vertices at once.
+
+The geodesic neighborhoods of the vertices are passed in compressed sparse row
+(CSR) format: the neighbors of the i-th vertex are ids[indptr[i]:indptr[i+1]]
+with geodesic distances dists[indptr[i]:indptr[i+1]]. All the vertex
+properties (coordinates, normals, areas) are given as numpy arrays in vertex
+index order, as returned by graph-tool's get_array and get_2d_array.
+
+Author: Maria Salfer (Max Planck Institute for Biochemistry)
+"""
+
+__author__ = 'Maria Salfer'
+
+
+def segment_sum(values, indptr):
+    """
+    Sums up the rows of an array within each segment of a CSR structure.
+
+    Args:
+        values (numpy.ndarray): array with indptr[-1] rows (any shape of the
+            remaining dimensions)
+        indptr (numpy.ndarray): CSR index pointer of length n + 1, where n is
+            the number of segments
+
+    Returns:
+        an array with n rows holding the sum over each segment (zeros for
+        empty segments)
+    """
+    indptr = np.asarray(indptr)
+    num_segments = len(indptr) - 1
+    sums = np.zeros((num_segments,) + values.shape[1:],
+                    dtype=np.result_type(values.dtype, np.float64))
+    starts = indptr[:-1]
+    non_empty = indptr[1:] > starts
+    if np.any(non_empty):
+        # empty segments are skipped, so each reduction runs until the start
+        # of the next non-empty segment, which is the end of the current one
+        sums[non_empty] = np.add.reduceat(values, starts[non_empty], axis=0)
+    return sums
+
+
+def segment_ids(indptr):
+    """
+    Expands a CSR index pointer to the segment index of each entry.
+
+    Args:
+        indptr (numpy.ndarray): CSR index pointer of length n + 1
+
+    Returns:
+        an integer array of length indptr[-1], holding for each entry the
+        index of the segment it belongs to
+    """
+    indptr = np.asarray(indptr)
+    return np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+
+
+def collect_normal_votes_csr(v_xyz, indptr, ids, dists, xyz, normals, areas,
+                             a_max, sigma):
+    """
+    For a block of vertices v, collects the normal votes of all triangles
+    within their geodesic neighborhoods and calculates the weighted covariance
+    matrix sums V_v (vectorized TriangleGraph.collect_normal_votes).
+
+    Each neighboring triangle centroid c_i votes on v with n_i = n + 2 *
+    cos(theta_i) * vc_i / |vc_i|, where n is the normal of triangle i and
+    theta_i the angle between n and vc_i, weighted by w_i = a_i / a_max *
+    exp(- g_i / sigma).
+
+    Args:
+        v_xyz (numpy.ndarray): coordinates of the vertices v, shape (n, 3)
+        indptr (numpy.ndarray): CSR index pointer of the neighborhoods of the
+            vertices v, length n + 1
+        ids (numpy.ndarray): neighbor vertex indices of all vertices v
+        dists (numpy.ndarray): geodesic distances corresponding to ids
+        xyz (numpy.ndarray): coordinates of all vertices of the graph, shape
+            (N, 3)
+        normals (numpy.ndarray): triangle normals of all vertices of the graph,
+            shape (N, 3)
+        areas (numpy.ndarray): triangle areas of all vertices of the graph,
+            shape (N,)
+        a_max (float): the area of the largest triangle in the surface
+            triangle-graph
+        sigma (float): sigma, defined as 3*sigma = g_max, so that votes
+            beyond the neighborhood can be ignored
+
+    Returns:
+        - numbers of geodesic neighbors of the vertices v (numpy.ndarray)
+        - the 3x3 symmetric matrices V_v, shape (n, 3, 3)
+    """
+    num_neighbors = np.diff(indptr)
+    seg = segment_ids(indptr)
+
+    vc_i = xyz[ids] - v_xyz[seg]
+    vc_i_len = np.sqrt(np.einsum('ij,ij->i', vc_i, vc_i))
+    vc_i_norm = vc_i / vc_i_len[:, np.newaxis]
+
+    # theta_i is the angle between the vectors n and vc_i
+    n = normals[ids]
+    cos_theta_i = - np.einsum('ij,ij->i', n, vc_i) / vc_i_len
+    n_i = n + 2 * cos_theta_i[:, np.newaxis] * vc_i_norm
+
+    # weights depending on the area of the neighboring triangle i and the
+    # geodesic distance to its centroid from vertex v:
+    w_i = areas[ids] / a_max * np.exp(- dists / sigma)
+
+    # weighted covariance matrices of the votes, summed up per vertex v:
+    V_i = np.einsum('k,ki,kj->kij', w_i, n_i, n_i)
+    V_v = segment_sum(V_i, indptr)
+    return num_neighbors, V_v
+
+
+def collect_curvature_votes_csr(
+        v_xyz, v_n_v, indptr, ids, dists, xyz, n_vs, sigma,
+        page_curvature_formula=False, areas=None, a_max=0.0):
+    """
+    For a block of vertices v, collects the curvature and tangent votes of all
+    neighbors within their geodesic neighborhoods and calculates the matrices
+    B_v (vectorized SurfaceGraph.collect_curvature_votes).
+
+    Each neighbor v_i votes with its tangent direction t_i, its normal
+    curvature kappa_i (formula of Tong and Tang or of Page et al.) and a weight
+    w_i = exp(- g_i / sigma) (multiplied by a_i / a_max if a_max > 0); the
+    weights of each vertex v are normalized to sum up to 2 * pi.
+
+    Args:
+        v_xyz (numpy.ndarray): coordinates of the vertices v, shape (n, 3)
+        v_n_v (numpy.ndarray): estimated normals of the vertices v, shape
+            (n, 3)
+        indptr (numpy.ndarray): CSR index pointer of the neighborhoods of the
+            vertices v, length n + 1
+        ids (numpy.ndarray): neighbor vertex indices of all vertices v
+        dists (numpy.ndarray): geodesic distances corresponding to ids
+        xyz (numpy.ndarray): coordinates of all vertices of the graph, shape
+            (N, 3)
+        n_vs (numpy.ndarray): estimated normals of all vertices of the graph,
+            shape (N, 3)
+        sigma (float): sigma, defined as 3*sigma = g_max, so that votes
+            beyond the neighborhood can be ignored
+        page_curvature_formula (boolean, optional): if True (default False)
+            normal curvature definition from Page et al. is used, otherwise
+            the one from Tong and Tang
+        areas (numpy.ndarray, optional): triangle areas of all vertices of the
+            graph, shape (N,), required if a_max > 0
+        a_max (float, optional): if given (default 0.0), votes are weighted by
+            triangle area like in the first pass (normals estimation)
+
+    Returns:
+        - numbers of neighbors of the vertices v (numpy.ndarray)
+        - the 3x3 symmetric matrices B_v, shape (n, 3, 3); NaN for vertices
+          without neighbors
+    """
+    num_neighbors, B_vs_list = collect_curvature_votes_variants_csr(
+        v_xyz, v_n_v, indptr, ids, dists, xyz, n_vs, sigma,
+        [(page_curvature_formula, a_max)], areas=areas)
+    return num_neighbors, B_vs_list[0]
+
+
+def collect_curvature_votes_variants_csr(
+        v_xyz, v_n_v, indptr, ids, dists, xyz, n_vs, sigma, variants,
+        areas=None):
+    """
+    Collects the curvature votes like collect_curvature_votes_csr for several
+    variants of the vector voting (e.g. RVV, AVV and NVV) at once, which share
+    the tangents and turning angles of all votes and differ only in the
+    weighting by triangle area and in the normal curvature formula.
+
+    Args:
+        v_xyz (numpy.ndarray): coordinates of the vertices v, shape (n, 3)
+        v_n_v (numpy.ndarray): estimated normals of the vertices v, shape
+            (n, 3)
+        indptr (numpy.ndarray): CSR index pointer of the neighborhoods of the
+            vertices v, length n + 1
+        ids (numpy.ndarray): neighbor vertex indices of all vertices v
+        dists (numpy.ndarray): geodesic distances corresponding to ids
+        xyz (numpy.ndarray): coordinates of all vertices of the graph, shape
+            (N, 3)
+        n_vs (numpy.ndarray): estimated normals of all vertices of the graph,
+            shape (N, 3)
+        sigma (float): sigma, defined as 3*sigma = g_max, so that votes
+            beyond the neighborhood can be ignored
+        variants (list): tuples of page_curvature_formula (boolean) and a_max
+            (float) for each variant (see collect_curvature_votes_csr)
+        areas (numpy.ndarray, optional): triangle areas of all vertices of the
+            graph, shape (N,), required if a_max > 0 for any variant
+
+    Returns:
+        - numbers of neighbors of the vertices v (numpy.ndarray)
+        - a list with the matrices B_v (shape (n, 3, 3), NaN for vertices
+          without neighbors) of each variant
+    """
+    num_neighbors = np.diff(indptr)
+    seg = segment_ids(indptr)
+
+    # First, calculate the weights depending on the geodesic distances g_i:
+    exp_w_i = np.exp(- dists / sigma)
+
+    # Second, calculate tangent directions t_i of each vote:
+    n_v = v_n_v[seg]
+    vv_i = xyz[ids] - v_xyz[seg]
+    t_i = vv_i - np.einsum('ij,ij->i', n_v, vv_i)[:, np.newaxis] * n_v
+    t_i_len = np.sqrt(np.einsum('ij,ij->i', t_i, t_i))
+    t_i = t_i / t_i_len[:, np.newaxis]
+    t_i_outer = t_i[:, :, np.newaxis] * t_i[:, np.newaxis, :]
+
+    # Third, calculate the normal curvatures kappa_i:
+    # p_i: vector perpendicular to the plane that contains both n_v and t_i
+    p_i = np.cross(n_v, t_i)
+    n_v_i = n_vs[ids]
+    # n_v_i_p: projection of n_v_i on the plane containing n_v rooted at v and
+    # v_i
+    n_v_i_p = n_v_i - np.einsum('ij,ij->i', p_i, n_v_i)[:, np.newaxis] * p_i
+    n_v_i_p_len = np.sqrt(np.einsum('ij,ij->i', n_v_i_p, n_v_i_p))
+    # 0 <= phi <= pi is the turning angle between n_v_i_p and n_v
+    cos_phi = np.einsum('ij,ij->i', n_v, n_v_i_p) / n_v_i_p_len
+    phi = np.arccos(np.clip(cos_phi, -1.0, 1.0))
+    kappa_i = {}
+    if any(page_curvature_formula for page_curvature_formula, _ in variants):
+        # formula from Page et al. paper:
+        kappa_i[True] = phi / dists  # arc length s = g_i
+    if not all(page_curvature_formula for page_curvature_formula, _ in
+               variants):
+        # formula from Tong and Tang paper:
+        vv_i_len = np.sqrt(np.einsum('ij,ij->i', vv_i, vv_i))
+        kappa_i[False] = np.abs(2 * np.cos((np.pi - phi) / 2) / vv_i_len)
+        # curvature sign has to be negated according to our surface normals
+        # convention (point towards inside of a convex surface):
+        kappa_i[False] *= -1 * np.sign(np.einsum('ij,ij->i', t_i, n_v_i_p))
+
+    B_vs_list = []
+    for page_curvature_formula, a_max in variants:
+        if a_max > 0:
+            w_i = exp_w_i * (areas[ids] / a_max)
+        else:
+            w_i = exp_w_i
+        # Finally, sum up the components of B_v:
+        B_i = ((w_i * kappa_i[page_curvature_formula])[
+            :, np.newaxis, np.newaxis] * t_i_outer)
+        B_v = segment_sum(B_i, indptr)
+
+        # Normalize B_v by factor / (2 * pi), where the weights multiplied by
+        # the factor sum up to 2 * pi:
+        sum_w_i = segment_sum(w_i, indptr)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            factor = 2 * np.pi / sum_w_i
+            B_v *= (factor / (2 * np.pi))[:, np.newaxis, np.newaxis]
+        B_v[num_neighbors == 0] = np.nan
+        B_vs_list.append(B_v)
+    return num_neighbors, B_vs_list
+
+
+def estimate_normals_batch(V_vs, normals, epsilon=0, eta=0):
+    """
+    For a block of vertices and their calculated matrices V_v (output of
+    collect_normal_votes), classifies their orientation and estimates their
+    normals or tangents (vectorized SurfaceGraph.estimate_normal).
+
+    All matrices are decomposed with a single stacked eigen-decomposition.
+
+    Args:
+        V_vs (numpy.ndarray): the 3x3 symmetric matrices V_v, shape (n, 3, 3)
+        normals (numpy.ndarray): original normals of the vertices, used to
+            orient the estimated normals, shape (n, 3)
+        epsilon (float, optional): parameter of Normal Vector Voting
+            algorithm influencing the number of triangles classified as
+            "crease junction" (class 2), default 0
+        eta (float, optional): parameter of Normal Vector Voting algorithm
+            influencing the number of triangles classified as "crease
+            junction" (class 2) and "no preferred orientation" (class 3),
+            default 0
+
+    Returns:
+        - orientation classes (numpy.ndarray): 1 for surface patches, 2 for
+          crease junctions and 3 for no preferred orientation
+        - estimated normals "n_v" where class is 1, otherwise zeros, shape
+          (n, 3)
+        - estimated tangents "t_v" where class is 2, otherwise zeros, shape
+          (n, 3)
+    """
+    num_vertices = len(V_vs)
+    if num_vertices == 0:
+        return (np.zeros(0, dtype=np.int32), np.zeros((0, 3)),
+                np.zeros((0, 3)))
+    # eigenvalues are in increasing order and eigenvectors are in columns
+    eigenvalues, eigenvectors = np.linalg.eigh(V_vs)
+    e_1_vec = eigenvectors[:, :, 2]
+    e_3_vec = eigenvectors[:, :, 0]
+    # Saliency maps:
+    S_s = eigenvalues[:, 2] - eigenvalues[:, 1]  # surface patch
+    S_c = eigenvalues[:, 1] - eigenvalues[:, 0]  # crease junction
+    S_n = eigenvalues[:, 0]  # no preferred orientation
+    max_saliency = np.maximum(np.maximum(S_s, epsilon * S_c),
+                              epsilon * eta * S_n)
+    classes = np.where(max_saliency == S_s, 1,
+                       np.where(max_saliency == epsilon * S_c, 2, 3))
+    classes = classes.astype(np.int32)
+
+    # Flip the estimated normals, for which the angle to the original normal
+    # is bigger (or cosine of the angle is lower) than for the negated ones:
+    cos_angle1 = np.einsum('ij,ij->i', normals, e_1_vec)
+    cos_angle2 = np.einsum('ij,ij->i', normals, -e_1_vec)
+    n_vs = np.where((cos_angle1 > cos_angle2)[:, np.newaxis],
+                    e_1_vec, -e_1_vec)
+    n_vs[classes != 1] = 0
+    t_vs = np.where((classes == 2)[:, np.newaxis], e_3_vec, 0.0)
+    return classes, n_vs, t_vs
+
+
+def estimate_curvatures_batch(B_vs, n_vs, keep_unmatched=False):
+    """
+    For a block of vertices and their calculated matrices B_v (output of
+    collect_curvature_votes), calculates the principal directions and
+    curvatures and the derived curvature descriptors (vectorized
+    SurfaceGraph.estimate_curvature).
+
+    All matrices are decomposed with a single stacked eigen-decomposition.
+    The eigenvector equal to the normal n_v (or -n_v), comparing absolute
+    values rounded to 7 decimals, is excluded from the principal directions.
+
+    Args:
+        B_vs (numpy.ndarray): the 3x3 symmetric matrices B_v, shape (n, 3, 3);
+            NaN for vertices to be ignored
+        n_vs (numpy.ndarray): estimated normals of the vertices, shape (n, 3)
+        keep_unmatched (boolean, optional): if True (default False), the
+            principal directions and curvatures of vertices without an
+            eigenvector equal to the normal are calculated from the two
+            eigenvectors with the highest eigenvalues (as in
+            SurfaceGraph.gen_curv_vote), otherwise the vertices are not valid
+
+    Returns:
+        a dictionary with the keys 't_1', 't_2' (shape (n, 3)), 'kappa_1',
+        'kappa_2', 'gauss_curvature', 'mean_curvature', 'shape_index',
+        'curvedness' (shape (n,)) and 'valid' (boolean mask of vertices, for
+        which the estimation worked; the other values are zeros)
+    """
+    num_vertices = len(B_vs)
+    t_1 = np.zeros((num_vertices, 3))
+    t_2 = np.zeros((num_vertices, 3))
+    b_1 = np.zeros(num_vertices)
+    b_2 = np.zeros(num_vertices)
+    valid = ~np.isnan(B_vs[:, 0, 0])
+    if np.any(valid):
+        # eigenvalues are in increasing order and eigenvectors are in columns
+        eigenvalues, eigenvectors = np.linalg.eigh(B_vs[valid])
+        b_1_valid = eigenvalues[:, 2]
+        b_2_valid = eigenvalues[:, 1]
+        b_3_valid = eigenvalues[:, 0]
+        t_1_valid = eigenvectors[:, :, 2]
+        t_2_valid = eigenvectors[:, :, 1]
+        t_3_valid = eigenvectors[:, :, 0]  # has to be equal to n_v or -n_v
+        n_v_abs = np.round(np.abs(n_vs[valid]), 7)
+
+        def equals_normal(t):
+            return np.all(np.round(np.abs(t), 7) == n_v_abs, axis=1)
+
+        t_3_ok = equals_normal(t_3_valid)
+        t_1_ok = ~t_3_ok & equals_normal(t_1_valid)
+        t_2_ok = ~t_3_ok & ~t_1_ok & equals_normal(t_2_valid)
+        # t_3 = n_v, b_3 = 0:
+        t_1_valid[t_1_ok] = t_3_valid[t_1_ok]
+        b_1_valid[t_1_ok] = b_3_valid[t_1_ok]
+        t_2_valid[t_2_ok] = t_3_valid[t_2_ok]
+        b_2_valid[t_2_ok] = b_3_valid[t_2_ok]
+        matched = t_3_ok | t_1_ok | t_2_ok
+        if not np.all(matched):
+            print("Error: no eigenvector which equals to the normal found for "
+                  "{} vertices".format(np.sum(~matched)))
+            if keep_unmatched:
+                matched[:] = True
+
+        valid_inds = np.where(valid)[0]
+        valid[valid_inds[~matched]] = False
+        t_1[valid] = t_1_valid[matched]
+        t_2[valid] = t_2_valid[matched]
+        b_1[valid] = b_1_valid[matched]
+        b_2[valid] = b_2_valid[matched]
+
+    # Estimated principal curvatures:
+    kappa_1 = 3 * b_1 - b_2
+    kappa_2 = 3 * b_2 - b_1
+    # Curvatures and directions might be interchanged:
+    swap = kappa_1 < kappa_2
+    t_1[swap], t_2[swap] = t_2[swap], t_1[swap]
+    kappa_1[swap], kappa_2[swap] = kappa_2[swap], kappa_1[swap]
+
+    sum_kappa = kappa_1 + kappa_2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        shape_index = 2 / np.pi * np.arctan(sum_kappa / (kappa_1 - kappa_2))
+    shape_index[(kappa_1 == 0) & (kappa_2 == 0)] = 0
+    return {
+        't_1': t_1, 't_2': t_2, 'kappa_1': kappa_1, 'kappa_2': kappa_2,
+        'gauss_curvature': kappa_1 * kappa_2,
+        'mean_curvature': sum_kappa / 2,
+        'shape_index': shape_index,
+        'curvedness': np.sqrt((kappa_1 ** 2 + kappa_2 ** 2) / 2),
+        'valid': valid}
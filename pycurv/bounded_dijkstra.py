@@ -0,0 +1,184 @@
+import numpy as np
+from scipy.spatial import cKDTree
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra
+
+"""
+Contains a class finding shortest distances along the edges of a surface graph
+within a maximal distance from a source vertex, touching only the vertices
+within this distance instead of the whole graph.
+
+Author: Maria Salfer (Max Planck Institute for Biochemistry)
+"""
+
+__author__ = 'Maria Salfer'
+
+
+# relative tolerance added to the radius of the Euclidean ball around the
+# source, because the edge distances are stored with single precision
+BALL_TOLERANCE = 1e-5
+
+
+class BoundedDijkstra(object):
+    """
+    Class finding shortest distances along the graph edges from a source vertex
+    to all vertices within a maximal distance with Dijkstra's algorithm.
+
+    Since the edge distances are the Euclidean distances between the vertex
+    coordinates, all vertices within a shortest distance d from the source lie
+    inside the Euclidean ball with radius d around it, and so do all vertices
+    of the shortest paths to them. Therefore, the ball is found with a k-d
+    tree and Dijkstra's algorithm is run only on the subgraph induced by the
+    ball. A scratch buffer for the vertex indices inside the ball is kept and
+    reused by all searches, so an object should not be shared by threads.
+    """
+
+    def __init__(self, xyz, edges):
+        """
+        Constructor of a BoundedDijkstra object.
+
+        Args:
+            xyz (numpy.ndarray): coordinates of all vertices, shape (N, 3)
+            edges (numpy.ndarray): rows of source vertex index, target vertex
+                index and distance of all (undirected) edges, shape (E, 3)
+
+        Returns:
+            None
+        """
+        self.xyz = np.asarray(xyz, dtype=np.float64)
+        num_vertices = len(self.xyz)
+        edges = np.asarray(edges, dtype=np.float64).reshape(-1, 3)
+        sources = edges[:, 0].astype(np.int64)
+        targets = edges[:, 1].astype(np.int64)
+        # store each edge in both directions, sorted by the source vertex
+        rows = np.concatenate([sources, targets])
+        cols = np.concatenate([targets, sources])
+        weights = np.concatenate([edges[:, 2], edges[:, 2]])
+        order = np.lexsort((cols, rows))
+        self.indptr = np.zeros(num_vertices + 1, dtype=np.int64)
+        self.indptr[1:] = np.cumsum(np.bincount(rows, minlength=num_vertices))
+        self.indices = cols[order]
+        self.weights = weights[order]
+        self.tree = cKDTree(self.xyz)
+        # local indices of the vertices inside the current ball, -1 outside
+        self._local_inds = np.full(num_vertices, -1, dtype=np.int64)
+
+    @classmethod
+    def from_graph(cls, graph):
+        """
+        Creates a BoundedDijkstra object for a graph.
+
+        Args:
+            graph (graph_tool.Graph): graph with the vertex property "xyz" and
+                the edge property "distance"
+
+        Returns:
+            a BoundedDijkstra object
+        """
+        xyz = graph.vp.xyz.get_2d_array([0, 1, 2]).T
+        edges = graph.get_edges(eprops=[graph.ep.distance])
+        return cls(xyz, edges)
+
+    @property
+    def num_vertices(self):
+        """
+        Number of vertices of the graph (int).
+        """
+        return len(self.xyz)
+
+    def search(self, source, max_dist):
+        """
+        Finds the shortest distances from a source vertex to all vertices
+        within a maximal distance.
+
+        Args:
+            source (int): index of the source vertex
+            max_dist (float): maximal distance
+
+        Returns:
+            indices of the reached vertices, in increasing order and including
+            the source itself, and the distances to them (numpy.ndarray)
+        """
+        source = int(source)
+        ball = np.sort(np.asarray(self.tree.query_ball_point(
+            self.xyz[source], max_dist * (1 + BALL_TOLERANCE)),
+            dtype=np.int64))
+        local_inds = self._local_inds
+        local_inds[ball] = np.arange(len(ball))
+        try:
+            subgraph = self._induced_subgraph(ball)
+            dists = dijkstra(subgraph, directed=True,
+                             indices=local_inds[source], limit=max_dist)
+        finally:
+            local_inds[ball] = -1
+        reached = np.isfinite(dists)
+        return ball[reached], dists[reached]
+
+    def distances_from(self, sources, max_dist=np.inf):
+        """
+        Finds the shortest distances from several source vertices to all
+        vertices of the graph.
+
+        Args:
+            sources (numpy.ndarray): indices of the source vertices
+            max_dist (float, optional): maximal distance (default infinity)
+
+        Returns:
+            a 2D array (numpy.ndarray) of the distances from each source to
+            all vertices, infinity for unreached vertices
+        """
+        graph = csr_matrix((self.weights, self.indices, self.indptr),
+                           shape=(self.num_vertices, self.num_vertices))
+        return dijkstra(graph, directed=True,
+                        indices=np.asarray(sources, dtype=np.int64),
+                        limit=max_dist).reshape(len(sources), -1)
+
+    def distances_from_nearest(self, sources, max_dist=np.inf):
+        """
+        Finds the shortest distances from the nearest of several source
+        vertices to all vertices of the graph, by a single run of Dijkstra's
+        algorithm started from all sources at distance 0.
+
+        Args:
+            sources (numpy.ndarray): indices of the source vertices
+            max_dist (float, optional): maximal distance (default infinity)
+
+        Returns:
+            an array (numpy.ndarray) of the distances from the nearest source
+            to all vertices, infinity for unreached vertices
+        """
+        sources = np.asarray(sources, dtype=np.int64)
+        if len(sources) == 0:
+            return np.full(self.num_vertices, np.inf)
+        graph = csr_matrix((self.weights, self.indices, self.indptr),
+                           shape=(self.num_vertices, self.num_vertices))
+        return dijkstra(graph, directed=True, indices=sources, limit=max_dist,
+                        min_only=True)
+
+    def _induced_subgraph(self, ball):
+        """
+        Gets the subgraph induced by the vertices inside a ball, whose local
+        indices have to be set in the scratch buffer.
+
+        Args:
+            ball (numpy.ndarray): indices of the vertices inside the ball
+
+        Returns:
+            a sparse matrix (scipy.sparse.csr_matrix) of the edge distances
+            between the vertices inside the ball
+        """
+        starts = self.indptr[ball]
+        lengths = self.indptr[ball + 1] - starts
+        offsets = np.cumsum(lengths) - lengths
+        # positions of the edges of all vertices inside the ball:
+        positions = (np.arange(offsets[-1] + lengths[-1]) -
+                     np.repeat(offsets - starts, lengths))
+        cols = self._local_inds[self.indices[positions]]
+        keep = cols >= 0
+        rows = np.repeat(np.arange(len(ball)), lengths)
+        sub_indptr = np.zeros(len(ball) + 1, dtype=np.int64)
+        sub_indptr[1:] = np.cumsum(
+            np.bincount(rows[keep], minlength=len(ball)))
+        return csr_matrix(
+            (self.weights[positions][keep], cols[keep], sub_indptr),
+            shape=(len(ball), len(ball)))
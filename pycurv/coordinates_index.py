@@ -0,0 +1,107 @@
+import numpy as np
+from scipy.spatial import cKDTree
+
+"""
+Contains a class mapping vertex coordinates to vertex indices, which is built
+from an array of coordinates, looks up many coordinates at once using a
+KD-tree and can be used like a dictionary.
+
+Author: Maria Salfer (Max Planck Institute for Biochemistry)
+"""
+
+__author__ = 'Maria Salfer'
+
+
+class CoordinatesIndex(object):
+    """
+    Class mapping vertex coordinates (x, y, z) to vertex indices.
+
+    The coordinates of vertex i are stored in the i-th row of an array and
+    found by an exact match using a KD-tree, which is built at the first
+    lookup. Coordinates added like to a dictionary (e.g. during an expansion of
+    voxels) are kept in a dictionary next to the array.
+    """
+
+    def __init__(self, xyz=None):
+        """
+        Constructor of a CoordinatesIndex object.
+
+        Args:
+            xyz (numpy.ndarray, optional): coordinates of the vertices, shape
+                (n, 3), the row index being the vertex index (default None:
+                empty)
+
+        Returns:
+            None
+        """
+        if xyz is None:
+            xyz = np.empty((0, 3))
+        self._xyz = np.asarray(xyz, dtype=float).reshape(-1, 3)
+        self._tree = None  # built from self._xyz at the first lookup
+        self._added = {}  # coordinates tuple to vertex index
+
+    def __len__(self):
+        return len(self._xyz) + len(self._added)
+
+    def __contains__(self, coordinates):
+        return self.get(coordinates) is not None
+
+    def __getitem__(self, coordinates):
+        index = self.get(coordinates)
+        if index is None:
+            raise KeyError(coordinates)
+        return index
+
+    def __setitem__(self, coordinates, index):
+        self._added[tuple(coordinates)] = index
+
+    def __iter__(self):
+        for coordinates in map(tuple, self._xyz.tolist()):
+            yield coordinates
+        for coordinates in self._added:
+            yield coordinates
+
+    def get(self, coordinates, default=None):
+        """
+        Gets the vertex index of the given coordinates.
+
+        Args:
+            coordinates (tuple): coordinates (x, y, z)
+            default (optional): returned if the coordinates are not found
+                (default None)
+
+        Returns:
+            the vertex index (int) or default
+        """
+        coordinates = tuple(coordinates)
+        if coordinates in self._added:
+            return self._added[coordinates]
+        index = self.lookup([coordinates])[0]
+        if index < 0:
+            return default
+        return int(index)
+
+    def lookup(self, coordinates):
+        """
+        Gets the vertex indices of many coordinates at once.
+
+        Args:
+            coordinates (numpy.ndarray): coordinates, shape (m, 3)
+
+        Returns:
+            vertex indices (numpy.ndarray of shape (m,)), -1 for coordinates
+            that are not found
+        """
+        coordinates = np.asarray(coordinates, dtype=float).reshape(-1, 3)
+        indices = np.full(len(coordinates), -1, dtype=np.int64)
+        if len(self._xyz) > 0 and len(coordinates) > 0:
+            if self._tree is None:
+                self._tree = cKDTree(self._xyz)
+            dists, nearest = self._tree.query(coordinates)
+            found = dists == 0
+            indices[found] = nearest[found]
+        if len(self._added) > 0:
+            for i in np.flatnonzero(indices < 0):
+                indices[i] = self._added.get(
+                    tuple(coordinates[i].tolist()), -1)
+        return indices
@@ -1,14 +1,17 @@
 import math
 import vtk
+from vtk.util.numpy_support import numpy_to_vtk, get_numpy_array_type
 import numpy as np
 from datetime import datetime
-from graph_tool import Graph
-from graph_tool.topology import shortest_distance
-from heapq import heappush, heappop
+from graph_tool import Graph, ungroup_vector_property
 
 from .pycurv_io import TypesConverter
 from . import pexceptions
 from .linalg import nice_acos, euclidean_distance
+from .bounded_dijkstra import BoundedDijkstra
+from .triangle_mesh import make_vtk_cell_array
+from .indexed_heap import IndexedHeap
+from .coordinates_index import CoordinatesIndex
 
 """
 Contains an abstract class (SegmentationGraph) for representing a segmentation
@@ -19,6 +22,11 @@ Author: Maria Salfer (Max Planck Institute for Biochemistry)
 
 __author__ = 'Maria Salfer'
 
+# tags of the vertices in the fast marching algorithm
+# (find_geodesic_neighbors_exact), vertices without a tag are Far:
+CLOSE = 1
+ALIVE = 2
+
 
 class SegmentationGraph(object):
     """
@@ -48,14 +56,20 @@ class SegmentationGraph(object):
         # edge property for storing the distance between the connected vertices:
         self.graph.ep.distance = self.graph.new_edge_property("float")
 
-        self.coordinates_to_vertex_index = {}
-        """dict: a dictionary mapping the vertex coordinates (x, y, z) to the
-        vertex index.
+        self._coordinates_index = (self.graph, CoordinatesIndex())
+        """tuple: the graph and the CoordinatesIndex object mapping its vertex
+        coordinates to vertex indices (None if it has to be built again), see
+        coordinates_to_vertex_index.
         """
         self.coordinates_pair_connected = set()
         """set: a set storing pairs of vertex coordinates that are
         connected by an edge in a tuple form ((x1, y1, z1), (x2, y2, z2)).
         """
+        self._bounded_dijkstra = None
+        """tuple: the graph, its numbers of vertices and edges and the
+        BoundedDijkstra object built for it by get_bounded_dijkstra (None if it
+        has to be built again).
+        """
 
     @staticmethod
     def distance_between_voxels(voxel1, voxel2):
@@ -83,23 +97,84 @@ class SegmentationGraph(object):
                 msg=('Tuples of integers of length 3 required as first and '
                      'second input.'))
 
+    @property
+    def coordinates_to_vertex_index(self):
+        """
+        CoordinatesIndex: a dictionary-like object mapping the vertex
+        coordinates (x, y, z) to the vertex index, also able to look up many
+        coordinates at once.
+
+        It is built from the vertex coordinates only when accessed after the
+        graph was replaced or update_coordinates_to_vertex_index was called.
+        """
+        if (self._coordinates_index is None or
+                self._coordinates_index[0] is not self.graph):
+            if self.graph.num_vertices() > 0:
+                xyz = self.graph.vp.xyz.get_2d_array([0, 1, 2]).T
+            else:
+                xyz = None
+            self._coordinates_index = (self.graph, CoordinatesIndex(xyz))
+        return self._coordinates_index[1]
+
+    @coordinates_to_vertex_index.setter
+    def coordinates_to_vertex_index(self, xyz):
+        """
+        Sets the vertex coordinates.
+
+        Args:
+            xyz (numpy.ndarray): coordinates of the vertices, shape (n, 3), the
+                row index being the vertex index
+
+        Returns:
+            None
+        """
+        self._coordinates_index = (self.graph, CoordinatesIndex(xyz))
+
     def update_coordinates_to_vertex_index(self):
         """
-        Updates graph's dictionary coordinates_to_vertex_index.
+        Updates graph's coordinates_to_vertex_index.
 
-        The dictionary maps the vertex coordinates (x, y, z) to the vertex
-        index. It has to be updated after purging the graph, because vertices
-        are renumbered, as well as after reading a graph from a file (e.g.
-        before density calculation).
+        The mapping of the vertex coordinates (x, y, z) to the vertex index has
+        to be updated after purging the graph, because vertices are renumbered.
+        It is built again only when accessed next time.
 
         Returns:
             None
         """
-        self.coordinates_to_vertex_index = {}
-        for vd in self.graph.vertices():
-            [x, y, z] = self.graph.vp.xyz[vd]
-            self.coordinates_to_vertex_index[
-                (x, y, z)] = self.graph.vertex_index[vd]
+        self._coordinates_index = None
+
+    def update_bounded_dijkstra(self):
+        """
+        Updates graph's BoundedDijkstra object.
+
+        It has to be updated after changing the edge distances, and is built
+        again only when requested next time by get_bounded_dijkstra.
+
+        Returns:
+            None
+        """
+        self._bounded_dijkstra = None
+
+    def get_bounded_dijkstra(self):
+        """
+        Gets a BoundedDijkstra object finding shortest distances within a
+        maximal distance on the graph, building it only if the graph was
+        replaced, its numbers of vertices or edges changed or
+        update_bounded_dijkstra was called since the last call.
+
+        Returns:
+            a BoundedDijkstra object
+        """
+        graph = self.graph
+        num_vertices = graph.num_vertices()
+        num_edges = graph.num_edges()
+        if (self._bounded_dijkstra is None or
+                self._bounded_dijkstra[0] is not graph or
+                self._bounded_dijkstra[1:3] != (num_vertices, num_edges)):
+            self._bounded_dijkstra = (
+                graph, num_vertices, num_edges,
+                BoundedDijkstra.from_graph(graph))
+        return self._bounded_dijkstra[3]
 
     def calculate_density(self, size, scale, mask=None, target_coordinates=None,
                           verbose=False):
@@ -173,28 +248,22 @@ class SegmentationGraph(object):
         if verbose:
             print(target_coordinates)
 
-        # Pre-filter the target coordinates to those existing in the graph
-        # (should already all be in the graph, but just in case):
-        target_coordinates_in_graph = []
-        for target_xyz in target_coordinates:
-            if target_xyz in self.coordinates_to_vertex_index:
-                target_coordinates_in_graph.append(target_xyz)
-            else:
-                raise pexceptions.PySegInputWarning(
-                    expr='calculate_density (SegmentationGraph)',
-                    msg=('Target ({}, {}, {}) not inside the membrane!'.format(
-                        target_xyz[0], target_xyz[1], target_xyz[2])))
+        # Get all indices of the target coordinates, checking that they exist
+        # in the graph (should already all be in the graph, but just in case):
+        target_vertices_indices = self.coordinates_to_vertex_index.lookup(
+            np.asarray(target_coordinates, dtype=float))
+        not_in_graph = np.flatnonzero(target_vertices_indices < 0)
+        if len(not_in_graph) > 0:
+            target_xyz = target_coordinates[not_in_graph[0]]
+            raise pexceptions.PySegInputWarning(
+                expr='calculate_density (SegmentationGraph)',
+                msg=('Target ({}, {}, {}) not inside the membrane!'.format(
+                    target_xyz[0], target_xyz[1], target_xyz[2])))
 
         print('{} target coordinates in graph'.format(len(
-            target_coordinates_in_graph)))
+            target_vertices_indices)))
         if verbose:
-            print(target_coordinates_in_graph)
-
-        # Get all indices of the target coordinates:
-        target_vertices_indices = []
-        for target_xyz in target_coordinates_in_graph:
-            v_target_index = self.coordinates_to_vertex_index[target_xyz]
-            target_vertices_indices.append(v_target_index)
+            print(target_coordinates)
 
         # Density calculation
         # Add a new vertex property to the graph, density:
@@ -203,44 +272,34 @@ class SegmentationGraph(object):
         # to a list of density values falling within that voxel:
         voxel_to_densities = {}
 
+        # The graph is undirected, so the shortest distances from all vertices
+        # to the (few) target vertices are found by searches starting at the
+        # targets. Iterate over all shortest distances from the target
+        # vertices to the membrane vertices, while calculating the density:
+        # Initializing: membrane coordinates with no reachable ribosomes
+        # will have a value of 0, those with reachable ribosomes > 0.
+        bounded_dijkstra = self.get_bounded_dijkstra()
+        unique_targets, target_counts = np.unique(
+            target_vertices_indices, return_counts=True)
+        # indexed by the vertex index, including vertices hidden by a filter
+        num_vertices = self.graph.num_vertices(ignore_filter=True)
+        densities_array = np.zeros(num_vertices)
+        # limit the memory of the distances by searching from blocks of targets
+        block_size = max(1, int(1e7 // max(1, num_vertices)))
+        for start in range(0, len(unique_targets), block_size):
+            dists = bounded_dijkstra.distances_from(
+                unique_targets[start:start + block_size])
+            counts = target_counts[start:start + block_size]
+            # unreachable targets (infinite distance) do not contribute
+            densities_array += np.sum(
+                counts[:, np.newaxis] / (dists + 1), axis=0)
+        self.graph.vp.density.a = densities_array
+
         # For each vertex in the graph:
         for v_membrane in self.graph.vertices():
             # Get its coordinates:
             membrane_xyz = self.graph.vp.xyz[v_membrane]
-            if verbose:
-                print('Membrane vertex ({}, {}, {})'.format(
-                    membrane_xyz[0], membrane_xyz[1], membrane_xyz[2]))
-            # Get a distance map with all pairs of distances between current
-            # graph vertex (membrane_xyz) and target vertices (ribosome
-            # coordinates):
-            dist_map = shortest_distance(self.graph, source=v_membrane,
-                                         target=target_vertices_indices,
-                                         weights=self.graph.ep.distance)
-
-            # Iterate over all shortest distances from the membrane vertex to
-            # the target vertices, while calculating the density:
-            # Initializing: membrane coordinates with no reachable ribosomes
-            # will have a value of 0, those with reachable ribosomes > 0.
-            density = 0
-            # If there is only one target voxel, dist_map is a single value -
-            # wrap it into a list.
-            if len(target_coordinates_in_graph) == 1:
-                dist_map = [dist_map]
-            for d in dist_map:
-                if verbose:
-                    print('\tTarget vertex ...')
-                # if unreachable, the maximum float64 is stored
-                if d == np.finfo(np.float64).max:
-                    if verbose:
-                        print('\t\tunreachable')
-                else:
-                    if verbose:
-                        print('\t\td = {}'.format(d))
-                    density += 1 / (d + 1)
-
-            # Add the density of the membrane vertex as a property of the
-            # current vertex in the graph:
-            self.graph.vp.density[v_membrane] = density
+            density = densities_array[self.graph.vertex_index[v_membrane]]
 
             # Calculate the corresponding voxel of the vertex and add the
             # density to the list keyed by the voxel in the dictionary:
@@ -297,115 +356,103 @@ class SegmentationGraph(object):
             - vtk.vtkPolyData with vertex-cells
             - vtk.vtkPolyData with edges as line-cells
         """
-        # Initialization
-        poly_verts = vtk.vtkPolyData()
-        poly_lines = vtk.vtkPolyData()
-        points = vtk.vtkPoints()
-        vertex_arrays = list()
-        edge_arrays = list()
-        # Vertex property arrays
-        for prop_key in list(self.graph.vp.keys()):
-            data_type = self.graph.vp[prop_key].value_type()
-            if (data_type != 'string' and data_type != 'python::object' and
-                    prop_key != 'xyz'):
-                if verbose:
-                    print('\nvertex property key: {}'.format(prop_key))
-                    print('value type: {}'.format(data_type))
-                if data_type[0:6] != 'vector':  # scalar
-                    num_components = 1
-                else:  # vector
-                    num_components = len(
-                        self.graph.vp[prop_key][self.graph.vertex(0)])
-                array = TypesConverter().gt_to_vtk(data_type)
-                array.SetName(prop_key)
-                if verbose:
-                    print('number of components: {}'.format(num_components))
-                array.SetNumberOfComponents(num_components)
-                vertex_arrays.append(array)
-        # Edge property arrays
-        for prop_key in list(self.graph.ep.keys()):
-            data_type = self.graph.ep[prop_key].value_type()
-            if data_type != 'string' and data_type != 'python::object':
-                if verbose:
-                    print('\nedge property key: {}'.format(prop_key))
-                    print('value type: {}'.format(data_type))
-                if data_type[0:6] != 'vector':  # scalar
-                    num_components = 1
-                else:  # vector (all edge properties so far are scalars)
-                    # num_components = len(
-                    #     self.graph.ep[prop_key][self.graph.edge(0, 1)])
-                    num_components = 3
-                    if verbose:
-                        print('Sorry, not implemented yet, assuming a vector '
-                              'with 3 components.')
-                array = TypesConverter().gt_to_vtk(data_type)
-                array.SetName(prop_key)
-                if verbose:
-                    print('number of components: {}'.format(num_components))
-                array.SetNumberOfComponents(num_components)
-                edge_arrays.append(array)
-        if verbose:
-            print('\nvertex arrays length: {}'.format(len(vertex_arrays)))
-            print('edge arrays length: {}'.format(len(edge_arrays)))
-
         # Geometry
-        lut = np.zeros(shape=self.graph.num_vertices(), dtype=np.int)
-        for i, vd in enumerate(self.graph.vertices()):
-            [x, y, z] = self.graph.vp.xyz[vd]
-            points.InsertPoint(i, x, y, z)
-            lut[self.graph.vertex_index[vd]] = i
+        vertex_inds = self.graph.get_vertices()
+        points = vtk.vtkPoints()
+        points.SetData(self.property_to_vtk_array('xyz', vertex_inds))
+        # lut[vertex_index] = point_array_index
+        lut = np.zeros(self.graph.num_vertices(ignore_filter=True),
+                       dtype=np.int64)
+        lut[vertex_inds] = np.arange(len(vertex_inds))
         if verbose:
             print('number of points: {}'.format(points.GetNumberOfPoints()))
 
-        # Topology
-        # Vertices
-        verts = vtk.vtkCellArray()
+        # vtkPolyData construction
+        poly_verts = vtk.vtkPolyData()
+        poly_lines = vtk.vtkPolyData()
+        poly_verts.SetPoints(points)
+        poly_lines.SetPoints(points)
+        # Vertices with vertex property arrays
         if vertices:
-            for vd in self.graph.vertices():  # vd = vertex descriptor
-                verts.InsertNextCell(1)
-                verts.InsertCellPoint(lut[self.graph.vertex_index[vd]])
-                for array in vertex_arrays:
-                    prop_key = array.GetName()
-                    n_comp = array.GetNumberOfComponents()
-                    data_type = self.graph.vp[prop_key].value_type()
-                    data_type = TypesConverter().gt_to_numpy(data_type)
-                    array.InsertNextTuple(self.get_vertex_prop_entry(
-                        prop_key, vd, n_comp, data_type))
+            poly_verts.SetVerts(make_vtk_cell_array(
+                lut[vertex_inds].reshape(-1, 1)))
+            for prop_key in list(self.graph.vp.keys()):
+                data_type = self.graph.vp[prop_key].value_type()
+                # point_ids of TriangleGraph index its point table
+                if (data_type != 'string' and data_type != 'python::object' and
+                        prop_key not in ('xyz', 'point_ids')):
+                    if verbose:
+                        print('\nvertex property key: {}'.format(prop_key))
+                        print('value type: {}'.format(data_type))
+                    poly_verts.GetCellData().AddArray(
+                        self.property_to_vtk_array(prop_key, vertex_inds))
             if verbose:
                 print('number of vertex cells: {}'.format(
-                    verts.GetNumberOfCells()))
-        # Edges
-        lines = vtk.vtkCellArray()
+                    poly_verts.GetNumberOfVerts()))
+        # Edges with edge property arrays
         if edges:
-            for ed in self.graph.edges():  # ed = edge descriptor
-                lines.InsertNextCell(2)
-                lines.InsertCellPoint(lut[self.graph.vertex_index[ed.source()]])
-                lines.InsertCellPoint(lut[self.graph.vertex_index[ed.target()]])
-                for array in edge_arrays:
-                    prop_key = array.GetName()
-                    n_comp = array.GetNumberOfComponents()
-                    data_type = self.graph.ep[prop_key].value_type()
-                    data_type = TypesConverter().gt_to_numpy(data_type)
-                    array.InsertNextTuple(self.get_edge_prop_entry(
-                        prop_key, ed, n_comp, data_type))
+            edge_array = self.graph.get_edges([self.graph.edge_index])
+            poly_lines.SetLines(make_vtk_cell_array(lut[edge_array[:, :2]]))
+            for prop_key in list(self.graph.ep.keys()):
+                data_type = self.graph.ep[prop_key].value_type()
+                if (data_type != 'string' and data_type != 'python::object' and
+                        len(edge_array) > 0):
+                    if verbose:
+                        print('\nedge property key: {}'.format(prop_key))
+                        print('value type: {}'.format(data_type))
+                    poly_lines.GetCellData().AddArray(
+                        self.property_to_vtk_array(
+                            prop_key, edge_array[:, 2], edge=True))
             if verbose:
                 print('number of line cells: {}'.format(
-                    lines.GetNumberOfCells()))
-
-        # vtkPolyData construction
-        poly_verts.SetPoints(points)
-        poly_lines.SetPoints(points)
-        if vertices:
-            poly_verts.SetVerts(verts)
-        if edges:
-            poly_lines.SetLines(lines)
-        for array in vertex_arrays:
-            poly_verts.GetCellData().AddArray(array)
-        for array in edge_arrays:
-            poly_lines.GetCellData().AddArray(array)
+                    poly_lines.GetNumberOfLines()))
 
         return poly_verts, poly_lines
 
+    def property_to_vtk_array(self, prop_key, indices, edge=False,
+                              num_components=None):
+        """
+        Gets the values of a vertex or edge property for many vertices or
+        edges at once as a VTK vtkDataArray object, used for exporting the
+        graph without iterating over the vertices or edges.
+
+        Args:
+            prop_key (str): name of the desired vertex or edge property
+            indices (numpy.ndarray): indices of the vertices or edges, in the
+                order of the array tuples
+            edge (boolean, optional): if True (default False), an edge property
+                is converted, otherwise a vertex property
+            num_components (int, optional): number of components of a vector
+                property; by default, the length of its value for the first
+                vertex or edge
+
+        Returns:
+            vtkDataArray object named like the property, with the property
+            values converted to its data type
+        """
+        prop_map = self.graph.ep[prop_key] if edge else self.graph.vp[prop_key]
+        data_type = prop_map.value_type()
+        vtk_type = TypesConverter().gt_to_vtk(data_type).GetDataType()
+        if data_type[0:6] != 'vector':  # scalar
+            values = prop_map.a[indices]
+        else:  # vector
+            if num_components is None:
+                if edge:
+                    source, target = self.graph.get_edges()[0, :2]
+                    num_components = len(
+                        prop_map[self.graph.edge(source, target)])
+                else:
+                    num_components = len(
+                        prop_map[self.graph.vertex(indices[0])])
+            values = np.column_stack([
+                component.a[indices] for component in
+                ungroup_vector_property(prop_map, range(num_components))])
+        array = numpy_to_vtk(
+            np.ascontiguousarray(values, dtype=get_numpy_array_type(vtk_type)),
+            deep=True, array_type=vtk_type)
+        array.SetName(prop_key)
+        return array
+
     def get_vertex_prop_entry(self, prop_key, vertex_descriptor, n_comp,
                               data_type):
         """
@@ -523,22 +570,19 @@ class SegmentationGraph(object):
             print("Average length: {}".format(average_edge_length))
         return average_edge_length
 
-    def find_geodesic_neighbors(self, v, g_max, full_dist_map=None,
-                                only_surface=False, verbose=False):
+    def find_geodesic_neighbors(self, v, g_max, only_surface=False,
+                                verbose=False):
         """
         Finds geodesic neighbor vertices of a given vertex v in the graph that
         are within a given maximal geodesic distance g_max from it.
 
         Also finds the corresponding geodesic distances. All edges are
-        considered. The distances are calculated with a breadth-first search
-        (BFS) or Dijkstra's algorithm.
+        considered. The distances are calculated with Dijkstra's algorithm
+        bounded to the vertices within g_max (see BoundedDijkstra).
 
         Args:
             v (graph_tool.Vertex): the source vertex
             g_max: maximal geodesic distance (in the units of the graph)
-            full_dist_map (graph_tool.PropertyMap, optional): the full distance
-                map for the whole graph; if None, a local distance map is
-                calculated for each vertex (default)
             only_surface (boolean, optional): if True (default False), only
                 neighbors classified as surface patch (class 1) are considered
             verbose (boolean, optional): if True (default False), some extra
@@ -548,22 +592,15 @@ class SegmentationGraph(object):
             a dictionary mapping a neighbor vertex index to the geodesic
             distance from vertex v
         """
-        if full_dist_map is not None:
-            dist_v = full_dist_map[v].get_array()
-        else:
-            dist_v = shortest_distance(self.graph, source=v, target=None,
-                                       weights=self.graph.ep.distance,
-                                       max_dist=g_max)
-            dist_v = dist_v.get_array()
-        # numpy array of distances from v to all vertices, in vertex index order
+        # only the reached vertices within g_max and their distances
+        idxs, dists = self.get_bounded_dijkstra().search(
+            self.graph.vertex_index[v], g_max)
 
         vertex = self.graph.vertex
         orientation_class = self.graph.vp.orientation_class
         neighbor_id_to_dist = dict()
 
-        idxs = np.where(dist_v <= g_max)[0]  # others are INF
-        for idx in idxs:
-            dist = dist_v[idx]
+        for idx, dist in zip(idxs, dists):
             if dist != 0:  # ignore the source vertex itself
                 v_i = vertex(idx)
                 if (not only_surface) or orientation_class[v_i] == 1:
@@ -573,6 +610,52 @@ class SegmentationGraph(object):
             print("{} neighbors".format(len(neighbor_id_to_dist)))
         return neighbor_id_to_dist
 
+    def find_geodesic_neighbors_batch(self, vertex_inds, g_max,
+                                      only_surface=False, surface_mask=None):
+        """
+        Finds geodesic neighbor vertices and the corresponding geodesic
+        distances for a block of vertices (see find_geodesic_neighbors),
+        packed in compressed sparse row (CSR) format.
+
+        Args:
+            vertex_inds (numpy.ndarray): indices of the source vertices
+            g_max: maximal geodesic distance (in the units of the graph)
+            only_surface (boolean, optional): if True (default False), only
+                neighbors classified as surface patch (class 1) are considered
+            surface_mask (numpy.ndarray, optional): boolean mask of the vertices
+                classified as surface patch, used if only_surface is True
+                (default None: found from the vertex property
+                "orientation_class")
+
+        Returns:
+            - CSR index pointer (numpy.ndarray of length len(vertex_inds) + 1)
+            - neighbor vertex indices, in increasing order for each source
+              vertex (numpy.ndarray)
+            - geodesic distances to the neighbors (numpy.ndarray)
+        """
+        if only_surface and surface_mask is None:
+            surface_mask = self.graph.vp.orientation_class.get_array() == 1
+        search = self.get_bounded_dijkstra().search
+        indptr = np.zeros(len(vertex_inds) + 1, dtype=np.int64)
+        ids_list = []
+        dists_list = []
+        for i, vertex_ind in enumerate(vertex_inds):
+            idxs, dists = search(vertex_ind, g_max)
+            # ignore the source vertex itself
+            mask = dists != 0
+            if only_surface:
+                mask &= surface_mask[idxs]
+            ids_list.append(idxs[mask])
+            dists_list.append(dists[mask])
+            indptr[i + 1] = indptr[i] + len(ids_list[-1])
+        if len(ids_list) > 0:
+            ids = np.concatenate(ids_list)
+            dists = np.concatenate(dists_list).astype(np.float64)
+        else:
+            ids = np.zeros(0, dtype=np.int64)
+            dists = np.zeros(0)
+        return indptr, ids, dists
+
     def find_geodesic_neighbors_exact(
             self, o, g_max, only_surface=False, verbose=False, debug=False):
         """
@@ -582,7 +665,9 @@ class SegmentationGraph(object):
         Also finds the corresponding geodesic distances. All edges and faces are
         considered. The distances are calculated with Sun's and Abidi's
         algorithm, a simplification of Kimmels' and Sethian's fast marching
-        algorithm.
+        algorithm, with an indexed priority queue of the Close vertices
+        (IndexedHeap), so that each vertex is updated in O(log k), where k is
+        the number of vertices within g_max.
 
         Args:
             o (graph_tool.Vertex): the source vertex
@@ -604,49 +689,45 @@ class SegmentationGraph(object):
         orientation_class = self.graph.vp.orientation_class
         distance_between_voxels = self.distance_between_voxels
         calculate_geodesic_distance = self._calculate_geodesic_distance
-        insert_geo_dist_vertex_id = self._insert_geo_dist_vertex_id
         # Initialization
-        geo_dist_heap = []  # heap has the smallest geodesic distance first
-        # dictionaries to keep track which geodesic distance belongs to which
-        # vertex or vertices and vice versa
-        geo_dist_to_vertex_ids = {}
+        # heap of the Close vertices, has the smallest geodesic distance first
+        geo_dist_heap = IndexedHeap()
+        # dictionary to keep track which geodesic distance belongs to which
+        # vertex
         vertex_id_to_geo_dist = {}
         neighbor_id_to_dist = {}  # output dictionary
+        # The tags (Alive or Close, Far if missing) are kept in a local
+        # dictionary sized to the neighborhood instead of a vertex property of
+        # the whole graph, so the graph is not changed and the method can run
+        # concurrently on the same graph:
+        tag = {}
         # Tag the center point (o) as Alive:
-        self.graph.vp.tag = self.graph.new_vertex_property("string")
-        tag = self.graph.vp.tag  # shortcut
-        tag[o] = "Alive"
+        tag[int(o)] = ALIVE
         if debug:
             print("Vertex o={}: Alive".format(int(o)))
         vertex_id_to_geo_dist[int(o)] = 0  # need it for geo. dist. calculation
         xyz_o = tuple(xyz[o])
         for n in o.all_neighbours():
             # Tag all neighboring points of the center point (n) as Close
-            tag[n] = "Close"
+            tag[int(n)] = CLOSE
             # Geodesic distance in this case = Euclidean between o and n
             xyz_n = tuple(xyz[n])
             on = distance_between_voxels(xyz_o, xyz_n)
             if debug:
                 print("Vertex n={}: Close with distance {}".format(int(n), on))
-            heappush(geo_dist_heap, on)
-            insert_geo_dist_vertex_id(geo_dist_to_vertex_ids, on, int(n))
+            geo_dist_heap.push(int(n), on)
             vertex_id_to_geo_dist[int(n)] = on
 
         # Repeat while the smallest distance is <= g_max
-        while len(geo_dist_heap) >= 1 and geo_dist_heap[0] <= g_max:
+        while len(geo_dist_heap) >= 1 and geo_dist_heap.peek()[0] <= g_max:
             if debug:
                 print("\n{} distances in heap, first={}".format(
-                    len(geo_dist_heap), geo_dist_heap[0]))
+                    len(geo_dist_heap), geo_dist_heap.peek()[0]))
             # 1. Change the tag of the point in Close with the smallest
             # geodesic distance (a) from Close to Alive
-            smallest_geo_dist = heappop(geo_dist_heap)
-            closest_vertices_ids = geo_dist_to_vertex_ids[smallest_geo_dist]
-            a = vertex(closest_vertices_ids[0])
-            if len(closest_vertices_ids) > 1:  # move the first one (a) to the
-                # back, so it's not taken again next time
-                closest_vertices_ids.pop(0)
-                closest_vertices_ids.append(int(a))
-            tag[a] = "Alive"
+            smallest_geo_dist, a_ind = geo_dist_heap.pop()
+            a = vertex(a_ind)
+            tag[a_ind] = ALIVE
             # only proceed if a is a surface patch:
             if only_surface and orientation_class[a] != 1:
                 continue
@@ -658,11 +739,11 @@ class SegmentationGraph(object):
             for c in neighbors_a:
                 # 2. Tag all neighboring points (c) of this point as Close,
                 # but skip those which are Alive already
-                if tag[c] == "Alive":
+                if tag.get(int(c)) == ALIVE:
                     if debug:
                         print("Skipping Alive neighbor {}".format(int(c)))
                     continue
-                tag[c] = "Close"
+                tag[int(c)] = CLOSE
                 if debug:
                     print("Vertex c={}: Close".format(int(c)))
                 # 3. Recompute the geodesic distance of these neighboring
@@ -674,7 +755,7 @@ class SegmentationGraph(object):
                 common_neighbors_a_c = neighbors_a.intersection(neighbors_c)
                 for b in common_neighbors_a_c:
                     # check if b is tagged Alive
-                    if tag[b] == "Alive":
+                    if tag.get(int(b)) == ALIVE:
                         if debug:
                             print("\tUsing vertex b={}".format(int(b)))
                         new_geo_dist_c = calculate_geodesic_distance(
@@ -685,9 +766,7 @@ class SegmentationGraph(object):
                                 print("\tadding new distance {}".format(
                                     new_geo_dist_c))
                             vertex_id_to_geo_dist[int(c)] = new_geo_dist_c
-                            heappush(geo_dist_heap, new_geo_dist_c)
-                            insert_geo_dist_vertex_id(
-                                geo_dist_to_vertex_ids, new_geo_dist_c, int(c))
+                            geo_dist_heap.push(int(c), new_geo_dist_c)
                         else:
                             old_geo_dist_c = vertex_id_to_geo_dist[int(c)]
                             if new_geo_dist_c < old_geo_dist_c:  # update c
@@ -695,26 +774,13 @@ class SegmentationGraph(object):
                                     print("\tupdating distance {} to {}".format(
                                         old_geo_dist_c, new_geo_dist_c))
                                 vertex_id_to_geo_dist[int(c)] = new_geo_dist_c
-                                if old_geo_dist_c in geo_dist_heap:
-                                    # check because it is sometimes not there
-                                    geo_dist_heap.remove(old_geo_dist_c)
-                                heappush(geo_dist_heap, new_geo_dist_c)
-                                old_geo_dist_vertex_ids = geo_dist_to_vertex_ids[
-                                    old_geo_dist_c]
-                                if len(old_geo_dist_vertex_ids) == 1:
-                                    del geo_dist_to_vertex_ids[old_geo_dist_c]
-                                else:
-                                    old_geo_dist_vertex_ids.remove(int(c))
-                                insert_geo_dist_vertex_id(
-                                    geo_dist_to_vertex_ids, new_geo_dist_c,
-                                    int(c))
+                                # decrease the key of c in the heap
+                                geo_dist_heap.push(int(c), new_geo_dist_c)
                             elif debug:
                                 print("\tkeeping the old distance={}, because "
                                       "it's <= the new={}".format(
                                         old_geo_dist_c, new_geo_dist_c))
                         # if debug:
-                        #     print(geo_dist_heap)
-                        #     print(geo_dist_to_vertex_ids)
                         #     print(vertex_id_to_geo_dist)
                         #     print(neighbor_id_to_dist)
                         break  # one Alive b is expected, stop iteration
@@ -722,7 +788,6 @@ class SegmentationGraph(object):
                     if debug:
                         print("\tNo common neighbors of a and c are Alive")
 
-        del self.graph.vertex_properties["tag"]
         if debug:
             print("Vertex o={} has {} geodesic neighbors".format(
                 int(o), len(neighbor_id_to_dist)))
@@ -755,13 +820,6 @@ class SegmentationGraph(object):
             geo_dist_c = min(geo_dist_a + ac, geo_dist_b + bc)
         return geo_dist_c
 
-    @staticmethod
-    def _insert_geo_dist_vertex_id(geo_dist_to_vertices, geo_dist, vertex_ind):
-        if geo_dist in geo_dist_to_vertices:
-            geo_dist_to_vertices[geo_dist].append(vertex_ind)
-        else:
-            geo_dist_to_vertices[geo_dist] = [vertex_ind]
-
     def get_vertex_property_array(self, property_name):
         """
         Gets a numpy array with all values of a vertex property of the graph,
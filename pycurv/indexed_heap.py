@@ -0,0 +1,131 @@
+"""
+Contains a class implementing an indexed binary min-heap (priority queue) with
+a decrease-key operation, as needed by the fast marching algorithm.
+
+Author: Maria Salfer (Max Planck Institute for Biochemistry)
+"""
+
+__author__ = 'Maria Salfer'
+
+
+class IndexedHeap(object):
+    """
+    Class implementing a binary min-heap of items (e.g. vertex indices) with
+    keys (e.g. geodesic distances), which keeps the position of each item in
+    the heap, so that the key of an item can be changed in O(log n).
+
+    Items with equal keys are popped in the order they were pushed or last
+    updated.
+    """
+
+    def __init__(self):
+        """
+        Constructor of an empty IndexedHeap object.
+
+        Returns:
+            None
+        """
+        self._heap = []  # entries [key, insertion count, item]
+        self._positions = {}  # item to its position in self._heap
+        self._count = 0
+
+    def __len__(self):
+        return len(self._heap)
+
+    def __contains__(self, item):
+        return item in self._positions
+
+    def push(self, item, key):
+        """
+        Pushes an item with the given key to the heap or changes the key of the
+        item if it is already in the heap.
+
+        Args:
+            item (hashable): item, e.g. a vertex index
+            key (float): key, e.g. a geodesic distance
+
+        Returns:
+            None
+        """
+        self._count += 1
+        if item in self._positions:
+            pos = self._positions[item]
+            entry = self._heap[pos]
+            old_entry = (entry[0], entry[1])
+            entry[0] = key
+            entry[1] = self._count
+            if (key, self._count) < old_entry:
+                self._sift_up(pos)
+            else:
+                self._sift_down(pos)
+        else:
+            self._heap.append([key, self._count, item])
+            self._positions[item] = len(self._heap) - 1
+            self._sift_up(len(self._heap) - 1)
+
+    def peek(self):
+        """
+        Gets the item with the smallest key without removing it.
+
+        Returns:
+            a tuple of the smallest key and its item
+        """
+        key, _, item = self._heap[0]
+        return key, item
+
+    def pop(self):
+        """
+        Removes the item with the smallest key from the heap.
+
+        Returns:
+            a tuple of the smallest key and its item
+        """
+        heap = self._heap
+        key, _, item = heap[0]
+        del self._positions[item]
+        last = heap.pop()
+        if len(heap) > 0:
+            heap[0] = last
+            self._positions[last[2]] = 0
+            self._sift_down(0)
+        return key, item
+
+    def _sift_up(self, pos):
+        heap = self._heap
+        positions = self._positions
+        entry = heap[pos]
+        while pos > 0:
+            parent_pos = (pos - 1) >> 1
+            parent = heap[parent_pos]
+            if entry[0] < parent[0] or (
+                    entry[0] == parent[0] and entry[1] < parent[1]):
+                heap[pos] = parent
+                positions[parent[2]] = pos
+                pos = parent_pos
+            else:
+                break
+        heap[pos] = entry
+        positions[entry[2]] = pos
+
+    def _sift_down(self, pos):
+        heap = self._heap
+        positions = self._positions
+        size = len(heap)
+        entry = heap[pos]
+        while True:
+            child_pos = 2 * pos + 1
+            if child_pos >= size:
+                break
+            right_pos = child_pos + 1
+            if right_pos < size and (heap[right_pos][0], heap[right_pos][1]) < (
+                    heap[child_pos][0], heap[child_pos][1]):
+                child_pos = right_pos
+            child = heap[child_pos]
+            if (child[0], child[1]) < (entry[0], entry[1]):
+                heap[pos] = child
+                positions[child[2]] = pos
+                pos = child_pos
+            else:
+                break
+        heap[pos] = entry
+        positions[entry[2]] = pos
@@ -118,6 +118,49 @@ def rotate_vector(v, theta, axis=None, matrix=None, debug=False):
     return u
 
 
+def perpendicular_vectors(ivs):
+    """
+    Finds unit vectors perpendicular to given vectors (vectorized
+    perpendicular_vector).
+
+    Args:
+        ivs (numpy.ndarray): input non-zero 3D vectors, shape (n, 3)
+
+    Returns:
+        3D vectors perpendicular to the input vectors (numpy.ndarray), shape
+        (n, 3)
+    """
+    ivs = np.asarray(ivs, dtype=np.float64)
+    rows = np.arange(len(ivs))
+    # index of the first non-zero component
+    m = np.argmax(ivs != 0, axis=1)
+    n = np.where(m == 2, 0, m + 1)
+    ovs = np.zeros_like(ivs)
+    ovs[rows, n] = ivs[rows, m]
+    ovs[rows, m] = -ivs[rows, n]
+    return ovs / np.sqrt(np.sum(ovs * ovs, axis=1))[:, np.newaxis]
+
+
+def rotation_matrices(axes, theta):
+    """
+    Generates rotation matrices for rotating 3D vectors around axes by an
+    angle (vectorized rotation_matrix, using Rodrigues' formula).
+
+    Args:
+        axes (numpy.ndarray): rotational axes (3D vectors), shape (n, 3)
+        theta (float): rotational angle (radians)
+
+    Returns:
+        3 x 3 rotation matrices, shape (n, 3, 3)
+    """
+    axes = np.asarray(axes, dtype=np.float64)
+    a = axes / np.sqrt(np.sum(axes * axes, axis=1))[:, np.newaxis]
+    # skew-symmetric matrices associated to a
+    A = np.cross(np.eye(3)[np.newaxis], a[:, np.newaxis, :])
+    return (np.eye(3)[np.newaxis] + math.sin(theta) * A +
+            (1 - math.cos(theta)) * np.matmul(A, A))
+
+
 def signum(number):
     """
     Returns the signum of a number.
@@ -297,6 +340,45 @@ def triangle_area_heron(a, b, c):
     return math.sqrt(s * (s - ab) * (s - bc) * (s - ac))
 
 
+def triangle_areas(a, b, c):
+    """
+    Calculate areas of triangles using their points a, b, c with the same
+    formula as vtkTriangle.TriangleArea (vectorized).
+
+    Args:
+        a (numpy.ndarray): first points coordinates, shape (n, 3)
+        b (numpy.ndarray): second points coordinates, shape (n, 3)
+        c (numpy.ndarray): third points coordinates, shape (n, 3)
+
+    Returns:
+        areas of the triangles (numpy.ndarray), shape (n,)
+    """
+    ab2 = np.sum((b - a) ** 2, axis=1)
+    bc2 = np.sum((c - b) ** 2, axis=1)
+    ca2 = np.sum((a - c) ** 2, axis=1)
+    return 0.25 * np.sqrt(np.abs(4.0 * ab2 * ca2 - (ab2 - bc2 + ca2) ** 2))
+
+
+def triangle_normals(a, b, c):
+    """
+    Calculate unit normals of triangles using their points a, b, c with the
+    same orientation as vtkTriangle.ComputeNormal (vectorized).
+
+    Args:
+        a (numpy.ndarray): first points coordinates, shape (n, 3)
+        b (numpy.ndarray): second points coordinates, shape (n, 3)
+        c (numpy.ndarray): third points coordinates, shape (n, 3)
+
+    Returns:
+        normals of the triangles (numpy.ndarray), shape (n, 3); zero for
+        degenerated triangles
+    """
+    normals = np.cross(c - b, a - b)
+    lengths = np.sqrt(np.sum(normals * normals, axis=1))
+    lengths[lengths == 0] = 1
+    return normals / lengths[:, np.newaxis]
+
+
 def euclidean_distance(a, b):
     """
     Calculates and returns the Euclidean distance between two voxels.
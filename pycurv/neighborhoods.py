@@ -0,0 +1,335 @@
+import time
+import hashlib
+import numpy as np
+from glob import glob, escape
+from os import remove, replace
+from os.path import isfile, splitext
+
+from .worker_pool import map_in_pool
+
+"""
+Contains a class storing the geodesic neighborhoods of all vertices of a
+surface graph, so that they can be found once and reused by both passes of the
+normal vector voting algorithm and by all curvature estimation methods.
+
+The neighborhoods can be saved next to the graph file as three memory-mappable
+.npy files, whose names contain g_max and a hash of the graph topology, edge
+distances and g_max, so that they are only reused for the same graph and g_max.
+One set of files is kept for each g_max.
+
+Author: Maria Salfer (Max Planck Institute for Biochemistry)
+"""
+
+__author__ = 'Maria Salfer'
+
+
+MEMORY_BUDGET = 2 * 1024 ** 3
+"""int: default memory budget in bytes for the geodesic neighborhoods of all
+vertices; if they are estimated to need more, they are found on demand.
+"""
+
+
+class NeighborhoodIndex(object):
+    """
+    Class storing the geodesic neighbors within a maximal geodesic distance
+    g_max of all vertices of a graph in compressed sparse row (CSR) format:
+    the neighbors of vertex i are ids[indptr[i]:indptr[i+1]] with geodesic
+    distances dists[indptr[i]:indptr[i+1]]. The vertices themselves are not
+    included in their neighborhoods.
+    """
+
+    def __init__(self, indptr, ids, dists, g_max):
+        """
+        Constructor of a NeighborhoodIndex object.
+
+        Args:
+            indptr (numpy.ndarray): CSR index pointer of length N + 1, where N
+                is the number of vertices
+            ids (numpy.ndarray): neighbor vertex indices
+            dists (numpy.ndarray): geodesic distances corresponding to ids
+            g_max (float): maximal geodesic distance of the neighborhoods
+
+        Returns:
+            None
+        """
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.ids = np.asarray(ids, dtype=np.int32)
+        self.dists = np.asarray(dists, dtype=np.float64)
+        self.g_max = g_max
+
+    @classmethod
+    def from_graph(cls, sg, g_max, cores=1):
+        """
+        Finds the geodesic neighborhoods of all vertices of a graph with
+        SegmentationGraph.find_geodesic_neighbors_batch.
+
+        Args:
+            sg (SegmentationGraph): graph whose vertices neighborhoods are found
+            g_max (float): maximal geodesic distance in units of the graph
+            cores (int, optional): number of processes to search the
+                neighborhoods in parallel (default 1)
+
+        Returns:
+            a NeighborhoodIndex object
+        """
+        t_begin = time.time()
+        print("\nFinding geodesic neighborhoods of all vertices...")
+        vertex_inds = np.arange(sg.graph.num_vertices())
+        # build the bounded search once, before the workers are forked
+        sg.get_bounded_dijkstra()
+
+        def find_neighbors(inds):
+            indptr, ids, dists = sg.find_geodesic_neighbors_batch(inds, g_max)
+            return np.diff(indptr), ids.astype(np.int32), dists
+
+        if cores > 1:
+            results_list = map_in_pool(find_neighbors, vertex_inds, cores)
+        else:
+            results_list = [find_neighbors(vertex_inds)]
+        index = cls._from_blocks(results_list, g_max)
+
+        t_end = time.time()
+        minutes, seconds = divmod(t_end - t_begin, 60)
+        print('Finding {} neighbors took: {} min {} s'.format(
+            len(index.ids), minutes, seconds))
+        return index
+
+    @staticmethod
+    def estimate_nbytes(sg, g_max, num_samples=100):
+        """
+        Estimates the memory needed by the geodesic neighborhoods of all
+        vertices of a graph from the neighborhoods of a sample of vertices.
+
+        Args:
+            sg (SegmentationGraph): graph whose vertices neighborhoods are
+                estimated
+            g_max (float): maximal geodesic distance in units of the graph
+            num_samples (int, optional): number of sampled vertices (default
+                100)
+
+        Returns:
+            the estimated number of bytes
+        """
+        num_v = sg.graph.num_vertices()
+        if num_v == 0:
+            return 0
+        rand = np.random.RandomState(0)
+        samples = rand.choice(num_v, min(num_v, num_samples), replace=False)
+        search = sg.get_bounded_dijkstra().search
+        avg_num_neighbors = np.mean(
+            [len(search(sample, g_max)[0]) - 1 for sample in samples])
+        # int32 neighbor indices and float64 distances, int64 index pointer
+        return int(num_v * (avg_num_neighbors * 12 + 8))
+
+    @classmethod
+    def _from_blocks(cls, results_list, g_max):
+        """
+        Joins the geodesic neighborhoods found for consecutive blocks of
+        vertices.
+
+        Args:
+            results_list (list): tuples of the numbers of neighbors, neighbor
+                vertex indices and geodesic distances of the blocks
+            g_max (float): maximal geodesic distance of the neighborhoods
+
+        Returns:
+            a NeighborhoodIndex object
+        """
+        num_neighbors = np.concatenate(
+            [np.zeros(0, dtype=np.int64)] + [r[0] for r in results_list])
+        indptr = np.zeros(len(num_neighbors) + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum(num_neighbors)
+        ids = np.concatenate(
+            [np.zeros(0, dtype=np.int32)] + [r[1] for r in results_list])
+        dists = np.concatenate(
+            [np.zeros(0, dtype=np.float64)] + [r[2] for r in results_list])
+        return cls(indptr, ids, dists, g_max)
+
+    @property
+    def num_neighbors(self):
+        """
+        Numbers of geodesic neighbors of all vertices (numpy.ndarray).
+        """
+        return np.diff(self.indptr)
+
+    def neighbors(self, vertex_ind):
+        """
+        Gets the geodesic neighbors of a vertex.
+
+        Args:
+            vertex_ind (int): vertex index
+
+        Returns:
+            neighbor vertex indices and geodesic distances (numpy.ndarray)
+        """
+        start, stop = self.indptr[vertex_ind], self.indptr[vertex_ind + 1]
+        return self.ids[start:stop], self.dists[start:stop]
+
+    def block(self, vertex_inds, vertex_mask=None):
+        """
+        Gets the geodesic neighborhoods of a block of vertices in CSR format.
+
+        Args:
+            vertex_inds (numpy.ndarray): indices of the vertices
+            vertex_mask (numpy.ndarray, optional): boolean mask of all vertices
+                of the graph; if given, only neighbors inside the mask are kept
+                (e.g. vertices classified as surface patch)
+
+        Returns:
+            CSR index pointer of length len(vertex_inds) + 1, neighbor vertex
+            indices and geodesic distances of the vertices
+        """
+        vertex_inds = np.asarray(vertex_inds, dtype=np.int64)
+        starts = self.indptr[vertex_inds]
+        lengths = self.indptr[vertex_inds + 1] - starts
+        block_indptr = np.zeros(len(vertex_inds) + 1, dtype=np.int64)
+        block_indptr[1:] = np.cumsum(lengths)
+        # positions of the neighbors of all vertices in the index arrays:
+        positions = (np.arange(block_indptr[-1]) -
+                     np.repeat(block_indptr[:-1] - starts, lengths))
+        ids = self.ids[positions]
+        dists = self.dists[positions]
+
+        if vertex_mask is not None:
+            keep = vertex_mask[ids]
+            seg = np.repeat(np.arange(len(vertex_inds)), lengths)
+            block_indptr[1:] = np.cumsum(
+                np.bincount(seg[keep], minlength=len(vertex_inds)))
+            ids = ids[keep]
+            dists = dists[keep]
+        return block_indptr, ids, dists
+
+    def threshold(self, g_max):
+        """
+        Derives the geodesic neighborhoods for a smaller maximal geodesic
+        distance by leaving out the neighbors further away than it.
+
+        Args:
+            g_max (float): maximal geodesic distance of the new neighborhoods
+
+        Returns:
+            a NeighborhoodIndex object (this one if g_max is not smaller than
+            the maximal geodesic distance of this index)
+        """
+        if g_max >= self.g_max:
+            return self
+        keep = self.dists <= g_max
+        seg = np.repeat(np.arange(len(self.indptr) - 1), self.num_neighbors)
+        indptr = np.zeros_like(self.indptr)
+        indptr[1:] = np.cumsum(
+            np.bincount(seg[keep], minlength=len(self.indptr) - 1))
+        return NeighborhoodIndex(indptr, self.ids[keep], self.dists[keep],
+                                 g_max)
+
+    @staticmethod
+    def graph_key(sg, g_max):
+        """
+        Calculates a hash of the graph topology, its edge distances and g_max,
+        identifying the neighborhoods of the graph.
+
+        Args:
+            sg (SegmentationGraph): graph whose neighborhoods are identified
+            g_max (float): maximal geodesic distance of the neighborhoods
+
+        Returns:
+            the hexadecimal hash string
+        """
+        # rows of source and target vertex indices and distances of all edges
+        edges = sg.graph.get_edges(eprops=[sg.graph.ep.distance])
+        sha = hashlib.sha1()
+        sha.update(np.int64(sg.graph.num_vertices()).tobytes())
+        sha.update(np.ascontiguousarray(edges, dtype=np.float64).tobytes())
+        sha.update(np.float64(g_max).tobytes())
+        return sha.hexdigest()
+
+    @staticmethod
+    def _file_prefix(graph_file, g_max):
+        """
+        Gets the beginning of the names of the index files saved next to the
+        graph file for a maximal geodesic distance.
+
+        Args:
+            graph_file (str): graph file name
+            g_max (float): maximal geodesic distance of the neighborhoods
+
+        Returns:
+            the beginning of the file names, followed by the key (str)
+        """
+        return "{}_neighborhoods_{}_".format(
+            splitext(graph_file)[0], float(g_max))
+
+    @classmethod
+    def _file_names(cls, graph_file, g_max, key):
+        """
+        Gets the names of the three index files saved next to the graph file.
+
+        Args:
+            graph_file (str): graph file name
+            g_max (float): maximal geodesic distance of the neighborhoods
+            key (str): hash identifying the neighborhoods (see graph_key)
+
+        Returns:
+            a dictionary mapping 'indptr', 'ids' and 'dists' to the file names
+        """
+        prefix = cls._file_prefix(graph_file, g_max)
+        return {name: "{}{}_{}.npy".format(prefix, key, name)
+                for name in ['indptr', 'ids', 'dists']}
+
+    def save(self, graph_file, key):
+        """
+        Saves the neighborhoods next to the graph file, removing neighborhoods
+        with the same g_max saved there before for another key, which are
+        stale, since the graph changed.
+
+        Args:
+            graph_file (str): graph file name
+            key (str): hash identifying the neighborhoods (see graph_key)
+
+        Returns:
+            None
+        """
+        prefix = self._file_prefix(graph_file, self.g_max)
+        suffix = '_indptr.npy'
+        for old_file in glob(escape(prefix) + '*' + suffix):
+            old_key = old_file[len(prefix):-len(suffix)]
+            if old_key == key:
+                continue
+            for file_name in self._file_names(
+                    graph_file, self.g_max, old_key).values():
+                try:
+                    remove(file_name)
+                except OSError:  # already removed, e.g. by a concurrent run
+                    pass
+        for name, file_name in self._file_names(
+                graph_file, self.g_max, key).items():
+            # write to a temporary file first, so that no incomplete files are
+            # found by a concurrent run
+            tmp_file_name = file_name + '.tmp.npy'
+            np.save(tmp_file_name, getattr(self, name))
+            replace(tmp_file_name, file_name)
+
+    @classmethod
+    def load(cls, graph_file, key, g_max, mmap_mode='r'):
+        """
+        Loads the neighborhoods saved next to the graph file for the given key.
+
+        Args:
+            graph_file (str): graph file name
+            key (str): hash identifying the neighborhoods (see graph_key)
+            g_max (float): maximal geodesic distance of the neighborhoods
+            mmap_mode (str, optional): memory-map mode of numpy.load (default
+                'r'), None to read the arrays into memory
+
+        Returns:
+            a NeighborhoodIndex object or None if no neighborhoods are saved
+            for the key
+        """
+        file_names = cls._file_names(graph_file, g_max, key)
+        if not all(isfile(file_name) for file_name in file_names.values()):
+            return None
+        try:
+            arrays = {name: np.load(file_name, mmap_mode=mmap_mode)
+                      for name, file_name in file_names.items()}
+        except (IOError, OSError):  # removed meanwhile by a concurrent run
+            return None
+        return cls(arrays['indptr'], arrays['ids'], arrays['dists'], g_max)
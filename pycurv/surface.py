@@ -1,4 +1,5 @@
 import vtk
+from vtk.util.numpy_support import vtk_to_numpy, numpy_to_vtk
 
 from . import pexceptions
 from . import pycurv_io as io
@@ -7,6 +8,7 @@ from scipy.ndimage import binary_dilation
 from scipy.ndimage.morphology import distance_transform_edt
 from scipy.ndimage.filters import gaussian_filter
 from .linalg import dot_norm
+from .triangle_mesh import extract_polygons
 import time
 
 """
@@ -91,28 +93,16 @@ def gen_surface(tomo, lbl=1, mask=True, other_mask=None, purge_ratio=1,
 
     # Load file with the cloud of points
     nx, ny, nz = tomo.shape
+    voxels = np.argwhere(tomo == lbl)
+    if purge_ratio > 1:
+        # Keep randomly 1 every purge_ratio + 1 foreground voxels
+        purge = np.random.randint(0, purge_ratio+1, len(voxels))
+        voxels = voxels[purge == purge_ratio - 1]
     cloud = vtk.vtkPolyData()
     points = vtk.vtkPoints()
+    points.SetData(numpy_to_vtk(voxels.astype(np.float32), deep=True))
     cloud.SetPoints(points)
 
-    if purge_ratio <= 1:
-        for x in range(nx):
-            for y in range(ny):
-                for z in range(nz):
-                    if tomo[x, y, z] == lbl:
-                        points.InsertNextPoint(x, y, z)
-    else:
-        count = 0
-        mx_value = purge_ratio - 1
-        purge = np.random.randint(0, purge_ratio+1, nx*ny*nz)
-        for x in range(nx):
-            for y in range(ny):
-                for z in range(nz):
-                    if purge[count] == mx_value:
-                        if tomo[x, y, z] == lbl:
-                            points.InsertNextPoint(x, y, z)
-                    count += 1
-
     if verbose:
         print('Cloud of points loaded...')
 
@@ -168,22 +158,19 @@ def gen_surface(tomo, lbl=1, mask=True, other_mask=None, purge_ratio=1,
             raise pexceptions.PySegInputError(
                 expr='gen_surface', msg='Other mask must be a ndarray.')
 
-        for i in range(tsurf.GetNumberOfCells()):
-
-            # Check if all points which made up the polygon are in the mask
-            points_cell = tsurf.GetCell(i).GetPoints()
-            count = 0
-            for j in range(0, points_cell.GetNumberOfPoints()):
-                x, y, z = points_cell.GetPoint(j)
-                if (tomod[int(round(x)), int(round(y)), int(round(z))] >
-                        MAX_DIST_SURF):
-                    count += 1
-
-            if count > 0:
-                tsurf.DeleteCell(i)
-
-        # Release free memory
-        tsurf.RemoveDeletedCells()
+        # Remove the polygons with a point which is further away from the
+        # mask than MAX_DIST_SURF
+        xyz = vtk_to_numpy(tsurf.GetPoints().GetData())
+        pixels = np.round(xyz).astype(int)
+        is_far = (tomod[pixels[:, 0], pixels[:, 1], pixels[:, 2]] >
+                  MAX_DIST_SURF)
+        # number of far points of each polygon, summed over its point ids
+        polys = tsurf.GetPolys()
+        offsets = vtk_to_numpy(polys.GetOffsetsArray()).astype(np.int64)
+        connectivity = vtk_to_numpy(polys.GetConnectivityArray())
+        num_far = np.add.reduceat(
+            is_far[connectivity].astype(np.int64), offsets[:-1])
+        tsurf = extract_polygons(tsurf, num_far == 0)
 
         if verbose:
             print('Mask applied...')
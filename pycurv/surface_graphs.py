@@ -1,21 +1,29 @@
 import vtk
+from vtk.util.numpy_support import vtk_to_numpy, numpy_to_vtk
 import numpy as np
 import time
 from scipy import ndimage
 import math
-from graph_tool import GraphView, incident_edges_op
-from graph_tool.topology import (shortest_distance, label_largest_component,
-                                 label_components)
+from graph_tool import GraphView, incident_edges_op, ungroup_vector_property
+from graph_tool.topology import label_largest_component, label_components
 
 from . import graphs
 from . import pexceptions
-from .pycurv_io import TypesConverter
 from .curvature_definitions import *
 from .surface import (add_point_normals_to_vtk_surface,
                      add_curvature_to_vtk_surface, rescale_surface)
 from .linalg import (
-    perpendicular_vector, rotation_matrix, rotate_vector, signum, nice_acos,
-    triangle_normal, triangle_center, triangle_area_cross_product)
+    perpendicular_vector, rotation_matrix, rotate_vector, signum,
+    perpendicular_vectors, rotation_matrices,
+    triangle_normal, triangle_center, triangle_area_cross_product,
+    triangle_areas, triangle_normals)
+from .triangle_mesh import (
+    get_triangle_point_ids, make_vtk_cell_array, merge_duplicated_points,
+    find_triangle_neighbors, find_unique_edges, find_point_triangles)
+from .batch_voting import (
+    collect_normal_votes_csr, collect_curvature_votes_csr,
+    collect_curvature_votes_variants_csr,
+    estimate_normals_batch, estimate_curvatures_batch)
 
 """
 Set of functions and classes (abstract SurfaceGraph and derived TriangleGraph)
@@ -27,6 +35,11 @@ Author: Maria Salfer (Max Planck Institute for Biochemistry)
 
 __author__ = 'Maria Salfer'
 
+SSVV_TOLERANCE = 0.001
+"""float: tolerance of the intersections between the sampling lines and the
+surface in SSVV (see SurfaceGraph.gen_curv_vote).
+"""
+
 
 class SurfaceGraph(graphs.SegmentationGraph):
     """Class defining the abstract SurfaceGraph object."""
@@ -134,8 +147,8 @@ class SurfaceGraph(graphs.SegmentationGraph):
     # * The following SurfaceGraph methods are implementing with adaptations
     # the second step of normal vector voting algorithm of Page et al., 2002. *
     def collect_curvature_votes(
-            self, vertex_v_ind, g_max, sigma, full_dist_map=None,
-            page_curvature_formula=False, a_max=0.0):
+            self, vertex_v_ind, g_max, sigma, page_curvature_formula=False,
+            a_max=0.0):
         """
         For a vertex v, collects the curvature and tangent votes of all
         triangles within its geodesic neighborhood belonging to a surface patch
@@ -168,9 +181,6 @@ class SurfaceGraph(graphs.SegmentationGraph):
             g_max (float): the maximal geodesic distance in units of the graph
             sigma (float): sigma, defined as 3*sigma = g_max, so that votes
                 beyond the neighborhood can be ignored
-            full_dist_map (graph_tool.PropertyMap, optional): the full distance
-                map for the whole graph; if None, a local distance map is
-                calculated for this vertex (default)
             page_curvature_formula (boolean, optional): if True (default False)
                 normal curvature definition from Page et al. is used:
                 the turning angle phi between n_v and the projection n_v_i_p
@@ -185,29 +195,13 @@ class SurfaceGraph(graphs.SegmentationGraph):
         """
         vertex_v = self.graph.vertex(vertex_v_ind)
 
-        # To spare function referencing every time in the following for loop:
-        vertex = self.graph.vertex
-        vp_n_v = self.graph.vp.n_v
-        exp = math.exp
-        xyz = self.graph.vp.xyz
-        array = np.array
-        dot = np.dot
-        sqrt = math.sqrt
-        pi = math.pi
-        cross = np.cross
-        acos = nice_acos
-        outer = np.multiply.outer
-        cos = math.cos
-        if a_max > 0:
-            area = self.graph.vp.area
-
         # Find the neighboring vertices of vertex v to be returned:
         if self.__class__.__name__ == "TriangleGraph":
             if vertex_v_ind == 0:
                 print("Calling find_geodesic_neighbors")
             # leave only neighbors belonging to a surface patch
             neighbor_idx_to_dist = self.find_geodesic_neighbors(
-                vertex_v, g_max, full_dist_map=full_dist_map, only_surface=True)
+                vertex_v, g_max, only_surface=True)
         else:  # PointGraph
             if vertex_v_ind == 0:
                 print("Calling find_geodesic_neighbors_exact")
@@ -223,77 +217,145 @@ class SurfaceGraph(graphs.SegmentationGraph):
             print("The vertex will be ignored.")
             return None
 
-        # Get the coordinates of vertex v and its estimated normal n_v (as numpy
-        # array):
-        v = array(xyz[vertex_v])
-        n_v = array(vp_n_v[vertex_v])
+        # Gather the coordinates, estimated normals (and areas) of vertex v
+        # and its neighbors into arrays and let all neighbors vote at once:
+        num_neighbors = len(neighbor_idx_to_dist)
+        vertices_v_i = [self.graph.vertex(idx_v_i)
+                        for idx_v_i in neighbor_idx_to_dist.keys()]
+        dists = np.fromiter(neighbor_idx_to_dist.values(), dtype=np.float64,
+                            count=num_neighbors)
+        xyz = self.graph.vp.xyz
+        vp_n_v = self.graph.vp.n_v
+        xyz_i = np.array([xyz[vertex_v_i] for vertex_v_i in vertices_v_i])
+        n_v_i = np.array([vp_n_v[vertex_v_i] for vertex_v_i in vertices_v_i])
+        if a_max > 0:
+            area = self.graph.vp.area
+            areas = np.array([area[vertex_v_i] for vertex_v_i in vertices_v_i])
+        else:
+            areas = None
+        _, B_v = collect_curvature_votes_csr(
+            np.array([xyz[vertex_v]]), np.array([vp_n_v[vertex_v]]),
+            np.array([0, num_neighbors]), np.arange(num_neighbors), dists,
+            xyz_i, n_v_i, sigma, page_curvature_formula=page_curvature_formula,
+            areas=areas, a_max=a_max)
+        return B_v[0]
+
+    def collect_curvature_votes_batch(
+            self, vertex_v_inds, g_max, sigma, page_curvature_formula=False,
+            a_max=0.0, chunk_size=256, neighborhoods=None, variants=None):
+        """
+        Vectorized version of collect_curvature_votes() for a block of
+        vertices.
 
-        # Initialize the weighted matrix sum of all votes for vertex v to be
-        # calculated:
-        B_v = np.zeros(shape=(3, 3))
+        The geodesic neighborhoods belonging to a surface patch are found for
+        chunks of vertices and the votes of all neighbors are calculated at
+        once with collect_curvature_votes_csr() from the vertex property
+        arrays.
 
-        # Store all the weights w_i of the neighboring triangles because
-        # they will have to be normalized to sum up to 2 * pi:
-        all_w_i = []
-
-        # Let each of the neighboring triangles belonging to a surface patch
-        # (as checked before) to cast a vote on vertex v:
-        for i, idx_v_i in enumerate(neighbor_idx_to_dist.keys()):
-            # Get the neighboring vertex v_i:
-            vertex_v_i = vertex(idx_v_i)
-
-            # First, calculate the weight depending on the geodesic distance to
-            # the neighboring vertex v_i from the vertex v, g_i:
-            g_i = neighbor_idx_to_dist[idx_v_i]
-            w_i = exp(- g_i / sigma)
-            if a_max > 0:
-                a_i = area[vertex_v_i]
-                w_i *= a_i / a_max
-            all_w_i.append(w_i)
-
-            # Second, calculate tangent directions t_i of each vote:
-            v_i = array(xyz[vertex_v_i])
-            vv_i = v_i - v
-            t_i = vv_i - dot(n_v, vv_i) * n_v
-            t_i_len = sqrt(dot(t_i, t_i))
-            t_i = t_i / t_i_len
-
-            # Third, calculate the normal curvature kappa_i:
-            # p_i: vector perpendicular to the plane that contains both n_v and
-            # t_i as well as the normal curve (between v and v_i)
-            p_i = cross(n_v, t_i)
-            n_v_i = array(vp_n_v[vertex_v_i])  # estimated normal of vertex v_i
-            # n_v_i_p: projection of n_v_i on the plane containing n_v rooted at
-            # v and v_i
-            n_v_i_p = n_v_i - dot(p_i, n_v_i) * p_i
-            n_v_i_p_len = sqrt(dot(n_v_i_p, n_v_i_p))
-            # 0 <= phi <= pi is the turning angle between n_v_i_p and n_v
-            cos_phi = float(dot(n_v, n_v_i_p) / n_v_i_p_len)
-            phi = acos(cos_phi)
-            if page_curvature_formula:  # formula from Page et al. paper:
-                s = neighbor_idx_to_dist[idx_v_i]  # arc length s = g_i
-                kappa_i = phi / s
-                # decomposition does not work if multiply kappa_i with its sign
-            else:  # formula from Tong and Tang paper:
-                kappa_i = abs(2 * cos((pi - phi) / 2) / sqrt(dot(vv_i, vv_i)))
-                # curvature sign has to be negated according to our surface
-                # normals convention (point towards inside of a convex surface):
-                kappa_i_sign = -1 * signum(dot(t_i, n_v_i_p))
-                kappa_i *= kappa_i_sign
-
-            # Finally, sum up the components of B_v:
-            B_v += w_i * kappa_i * outer(t_i, t_i)
-
-        # Calculate the factor the weights have to be multiplied with in order
-        # to sum up to 2 * pi
-        all_w_i = array(all_w_i)
-        sum_w_i = np.sum(all_w_i)
-        wanted_sum_w_i = 2 * pi
-        factor = wanted_sum_w_i / sum_w_i
-
-        # Normalize B_v by factor / (2 * pi):
-        B_v *= factor / (2 * pi)
-        return B_v
+        Args:
+            vertex_v_inds (numpy.ndarray): indices of the vertices v in the
+                surface graph for which the votes are collected
+            g_max (float): the maximal geodesic distance in units of the graph
+            sigma (float): sigma, defined as 3*sigma = g_max, so that votes
+                beyond the neighborhood can be ignored
+            page_curvature_formula (boolean, optional): if True (default False)
+                normal curvature definition from Page et al. is used (see
+                collect_curvature_votes)
+            a_max (float, optional): if given (default 0.0), votes are
+                weighted by triangle area like in the first pass (normals
+                estimation)
+            chunk_size (int, optional): number of vertices whose votes are
+                calculated at once, limiting the memory usage (default 256)
+            neighborhoods (NeighborhoodIndex, optional): if given (default
+                None), the geodesic neighborhoods are taken from it instead of
+                being searched in the graph (only for TriangleGraph)
+            variants (list, optional): if given (default None), tuples of
+                page_curvature_formula and a_max for several variants of the
+                vector voting (e.g. RVV, AVV and NVV), whose votes are
+                collected at once, instead of page_curvature_formula and a_max
+
+        Returns:
+            - numbers of neighbors belonging to a surface patch of the vertices
+              v (numpy.ndarray)
+            - the 3x3 symmetric matrices B_v, shape (n, 3, 3); NaN for vertices
+              without such neighbors (a list of them for each variant, if
+              variants are given)
+        """
+        vertex_v_inds = np.asarray(vertex_v_inds, dtype=np.int64)
+        single_variant = variants is None
+        if single_variant:
+            variants = [(page_curvature_formula, a_max)]
+        xyz = self.graph.vp.xyz.get_2d_array([0, 1, 2]).T
+        n_vs = self.graph.vp.n_v.get_2d_array([0, 1, 2]).T
+        if any(variant_a_max > 0 for _, variant_a_max in variants):
+            areas = self.graph.vp.area.get_array()
+        else:
+            areas = None
+        # leave only neighbors belonging to a surface patch
+        surface_mask = self.graph.vp.orientation_class.get_array() == 1
+
+        num_neighbors = np.zeros(len(vertex_v_inds), dtype=np.int64)
+        B_vs_list = [np.zeros((len(vertex_v_inds), 3, 3)) for _ in variants]
+        for start in range(0, len(vertex_v_inds), chunk_size):
+            chunk = vertex_v_inds[start:start + chunk_size]
+            if neighborhoods is not None:
+                indptr, ids, dists = neighborhoods.block(
+                    chunk, vertex_mask=surface_mask)
+            else:
+                indptr, ids, dists = self._find_surface_neighbors_batch(
+                    chunk, g_max, surface_mask=surface_mask)
+            (num_neighbors[start:start + chunk_size],
+             chunk_B_vs_list) = collect_curvature_votes_variants_csr(
+                xyz[chunk], n_vs[chunk], indptr, ids, dists, xyz, n_vs, sigma,
+                variants, areas=areas)
+            for B_vs, chunk_B_vs in zip(B_vs_list, chunk_B_vs_list):
+                B_vs[start:start + chunk_size] = chunk_B_vs
+
+        if np.any(num_neighbors == 0):
+            print("{} vertices without neighbors in a surface patch will be "
+                  "ignored.".format(np.sum(num_neighbors == 0)))
+        if single_variant:
+            return num_neighbors, B_vs_list[0]
+        return num_neighbors, B_vs_list
+
+    def _find_surface_neighbors_batch(self, vertex_v_inds, g_max,
+                                      surface_mask=None):
+        """
+        Finds the geodesic neighbors belonging to a surface patch for a block
+        of vertices, with find_geodesic_neighbors for TriangleGraph and
+        find_geodesic_neighbors_exact for PointGraph.
+
+        Args:
+            vertex_v_inds (numpy.ndarray): indices of the source vertices
+            g_max (float): the maximal geodesic distance in units of the graph
+            surface_mask (numpy.ndarray, optional): boolean mask of the vertices
+                classified as surface patch, used for TriangleGraph (default
+                None: found from the vertex property "orientation_class")
+
+        Returns:
+            CSR index pointer, neighbor vertex indices and geodesic distances
+            (see SegmentationGraph.find_geodesic_neighbors_batch)
+        """
+        if self.__class__.__name__ == "TriangleGraph":
+            return self.find_geodesic_neighbors_batch(
+                vertex_v_inds, g_max, only_surface=True,
+                surface_mask=surface_mask)
+        # PointGraph: stop looking if neighbor is not in a surface patch
+        indptr = np.zeros(len(vertex_v_inds) + 1, dtype=np.int64)
+        ids_list = []
+        dists_list = []
+        for i, vertex_v_ind in enumerate(vertex_v_inds):
+            neighbor_idx_to_dist = self.find_geodesic_neighbors_exact(
+                self.graph.vertex(vertex_v_ind), g_max, verbose=False,
+                only_surface=True)
+            ids_list.append(np.fromiter(neighbor_idx_to_dist.keys(),
+                                        dtype=np.int64))
+            dists_list.append(np.fromiter(neighbor_idx_to_dist.values(),
+                                          dtype=np.float64))
+            indptr[i + 1] = indptr[i] + len(neighbor_idx_to_dist)
+        if len(ids_list) > 0:
+            return indptr, np.concatenate(ids_list), np.concatenate(dists_list)
+        return indptr, np.zeros(0, dtype=np.int64), np.zeros(0)
 
     def estimate_curvature(self, vertex_v_ind, B_v):
         """
@@ -379,7 +441,7 @@ class SurfaceGraph(graphs.SegmentationGraph):
         return (t_1, t_2, kappa_1, kappa_2,
                 gauss_curvature, mean_curvature, shape_index, curvedness)
 
-    def first_pass(self, vertex_v_ind, g_max, a_max, sigma, full_dist_map=None):
+    def first_pass(self, vertex_v_ind, g_max, a_max, sigma):
         """
         Combines the two steps of the first pass: normal votes collection
         and normals estimation. For more information, see the functions
@@ -394,9 +456,6 @@ class SurfaceGraph(graphs.SegmentationGraph):
                 triangle-graph
             sigma (float): sigma, defined as 3*sigma = g_max, so that votes
                 beyond the neighborhood can be ignored
-            full_dist_map (graph_tool.PropertyMap, optional): the full distance
-                map for the whole graph; if None, a local distance map is
-                calculated for this vertex (default)
 
         Returns:
             orientation of vertex v (int): 1 if it belongs to a surface patch,
@@ -406,17 +465,63 @@ class SurfaceGraph(graphs.SegmentationGraph):
             the estimated_tangent "t_v" (3x1 array) if class is 2, otherwise
                 zeros
         """
-        if self.__class__.__name__ == 'TriangleGraph':
-            num_neighbors, V_v = self.collect_normal_votes(
-                vertex_v_ind, g_max, a_max, sigma, full_dist_map)
-        else:  # PointGraph
-            num_neighbors, V_v = self.collect_normal_votes(
-                vertex_v_ind, g_max, a_max, sigma)
+        num_neighbors, V_v = self.collect_normal_votes(
+            vertex_v_ind, g_max, a_max, sigma)
         class_v, n_v, t_v = self.estimate_normal(
             vertex_v_ind, V_v, epsilon=0, eta=0)
         return num_neighbors, class_v, n_v, t_v
 
-    def second_pass(self, vertex_v_ind, g_max, sigma, full_dist_map=None,
+    def first_pass_batch(self, vertex_v_inds, g_max, a_max, sigma, epsilon=0,
+                         eta=0, neighborhoods=None):
+        """
+        Runs the first pass (normal votes collection and normals estimation)
+        for a block of vertices, see first_pass(). For TriangleGraph, the votes
+        are collected by the vectorized collect_normal_votes_batch().
+
+        Args:
+            vertex_v_inds (numpy.ndarray): indices of the vertices v in the
+                surface graph for which the votes are collected
+            g_max (float): the maximal geodesic distance in units of the graph
+            a_max (float): the area of the largest triangle in the surface
+                triangle-graph
+            sigma (float): sigma, defined as 3*sigma = g_max, so that votes
+                beyond the neighborhood can be ignored
+            epsilon (float, optional): parameter of Normal Vector Voting
+                algorithm influencing the number of triangles classified as
+                "crease junction" (class 2), default 0
+            eta (float, optional): parameter of Normal Vector Voting algorithm
+                influencing the number of triangles classified as "crease
+                junction" (class 2) and "no preferred orientation" (class 3),
+                default 0
+            neighborhoods (NeighborhoodIndex, optional): if given (default
+                None), the geodesic neighborhoods are taken from it instead of
+                being searched in the graph (only for TriangleGraph)
+
+        Returns:
+            a dictionary of arrays with the numbers of geodesic neighbors
+            ('num_neighbors'), orientation classes ('orientation_class'),
+            estimated normals ('n_v', shape (n, 3)) and estimated tangents
+            ('t_v', shape (n, 3)) of the vertices
+        """
+        vertex_v_inds = np.asarray(vertex_v_inds, dtype=np.int64)
+        num_vertices = len(vertex_v_inds)
+        if self.__class__.__name__ == 'TriangleGraph':
+            num_neighbors, V_vs = self.collect_normal_votes_batch(
+                vertex_v_inds, g_max, a_max, sigma,
+                neighborhoods=neighborhoods)
+        else:  # PointGraph
+            num_neighbors = np.zeros(num_vertices, dtype=np.int64)
+            V_vs = np.zeros((num_vertices, 3, 3))
+            for i, vertex_v_ind in enumerate(vertex_v_inds):
+                num_neighbors[i], V_vs[i] = self.collect_normal_votes(
+                    vertex_v_ind, g_max, a_max, sigma)
+        normals = self.graph.vp.normal.get_2d_array([0, 1, 2]).T
+        classes, n_vs, t_vs = estimate_normals_batch(
+            V_vs, normals[vertex_v_inds], epsilon, eta)
+        return {'num_neighbors': num_neighbors, 'orientation_class': classes,
+                'n_v': n_vs, 't_v': t_vs}
+
+    def second_pass(self, vertex_v_ind, g_max, sigma,
                     page_curvature_formula=False, a_max=0.0):
         """
         Combines the two steps of the second pass: curvature votes collection
@@ -429,9 +534,6 @@ class SurfaceGraph(graphs.SegmentationGraph):
             g_max (float): the maximal geodesic distance in units of the graph
             sigma (float): sigma, defined as 3*sigma = g_max, so that votes
                 beyond the neighborhood can be ignored
-            full_dist_map (graph_tool.PropertyMap, optional): the full distance
-                map for the whole graph; if None, a local distance map is
-                calculated for this vertex (default)
             page_curvature_formula (boolean, optional): if True (default False)
                 normal curvature definition from Page et al. is used:
                 the turning angle phi between n_v and the projection n_v_i_p
@@ -448,11 +550,55 @@ class SurfaceGraph(graphs.SegmentationGraph):
             neighbor belonging to a surface patch
         """
         B_v = self.collect_curvature_votes(
-            vertex_v_ind, g_max, sigma, full_dist_map,
-            page_curvature_formula, a_max)
+            vertex_v_ind, g_max, sigma, page_curvature_formula, a_max)
         return self.estimate_curvature(vertex_v_ind, B_v)
 
-    def gen_curv_vote(self, poly_surf, vertex_v, radius_hit):
+    def second_pass_batch(self, vertex_v_inds, g_max, sigma,
+                          page_curvature_formula=False, a_max=0.0,
+                          neighborhoods=None, variants=None):
+        """
+        Runs the second pass (curvature votes collection and curvature
+        estimation) for a block of vertices, see second_pass(). The votes are
+        collected by the vectorized collect_curvature_votes_batch(), for
+        several variants of the vector voting at once if variants are given.
+
+        Args:
+            vertex_v_inds (numpy.ndarray): indices of the vertices v in the
+                surface graph for which the votes are collected
+            g_max (float): the maximal geodesic distance in units of the graph
+            sigma (float): sigma, defined as 3*sigma = g_max, so that votes
+                beyond the neighborhood can be ignored
+            page_curvature_formula (boolean, optional): if True (default False)
+                normal curvature definition from Page et al. is used (see
+                collect_curvature_votes)
+            a_max (float, optional): if given (default 0.0), votes are
+                weighted by triangle area like in the first pass (normals
+                estimation)
+            neighborhoods (NeighborhoodIndex, optional): if given (default
+                None), the geodesic neighborhoods are taken from it instead of
+                being searched in the graph (only for TriangleGraph)
+            variants (list, optional): if given (default None), tuples of
+                page_curvature_formula and a_max for several variants of the
+                vector voting (e.g. RVV, AVV and NVV), whose votes are
+                collected at once, instead of page_curvature_formula and a_max
+
+        Returns:
+            a dictionary of arrays of the estimated principal directions and
+            curvatures and the derived curvature descriptors of the vertices
+            (see estimate_curvatures_batch); a list of them for each variant,
+            if variants are given
+        """
+        _, B_vs = self.collect_curvature_votes_batch(
+            vertex_v_inds, g_max, sigma,
+            page_curvature_formula=page_curvature_formula, a_max=a_max,
+            neighborhoods=neighborhoods, variants=variants)
+        n_vs = self.graph.vp.n_v.get_2d_array([0, 1, 2]).T[vertex_v_inds]
+        if variants is None:
+            return estimate_curvatures_batch(B_vs, n_vs)
+        return [estimate_curvatures_batch(variant_B_vs, n_vs)
+                for variant_B_vs in B_vs]
+
+    def gen_curv_vote(self, poly_surf, vertex_v, radius_hit, locator=None):
         """
         Implements the third pass of the method of Tong & Tang et al., 2005,
         "Algorithm 5. GenCurvVote". Estimates principal curvatures and
@@ -469,6 +615,8 @@ class SurfaceGraph(graphs.SegmentationGraph):
                 are estimated
             radius_hit (float): radius in length unit of the graph for sampling
                 surface points in tangent directions
+            locator (vtkCellLocator, optional): cell locator of poly_surf (see
+                build_cell_locator); if None (default), it is built here
         """
         # Get the coordinates of vertex v and its estimated normal n_v (as numpy
         # array, input of the original method):
@@ -477,10 +625,9 @@ class SurfaceGraph(graphs.SegmentationGraph):
 
         # Define a cellLocator to be able to compute intersections between lines
         # and the surface:
-        locator = vtk.vtkCellLocator()
-        locator.SetDataSet(poly_surf)
-        locator.BuildLocator()
-        tolerance = 0.001
+        if locator is None:
+            locator = self.build_cell_locator(poly_surf)
+        tolerance = SSVV_TOLERANCE
 
         # Define some frequently used functions in the loop:
         multiply = np.multiply
@@ -597,6 +744,117 @@ class SurfaceGraph(graphs.SegmentationGraph):
             vertex_v, t_1, t_2, kappa_1, kappa_2, gauss_curvature,
             mean_curvature, shape_index, curvedness)
 
+    def gen_curv_vote_batch(self, poly_surf, vertex_v_inds, radius_hit,
+                            locator=None):
+        """
+        Runs gen_curv_vote for a block of vertices: the eight sampling lines
+        of all vertices are generated at once, intersected with the surface
+        using one cell locator and the curvature tensors are decomposed with
+        estimate_curvatures_batch.
+
+        Args:
+            poly_surf (vtkPolyData): surface from which the graph was generated,
+                scaled to given units
+            vertex_v_inds (numpy.ndarray): indices of the vertices for which
+                the principal directions and curvatures are estimated
+            radius_hit (float): radius in length unit of the graph for sampling
+                surface points in tangent directions
+            locator (vtkCellLocator, optional): cell locator of poly_surf (see
+                build_cell_locator); if None (default), it is built here
+
+        Returns:
+            a dictionary of arrays of the estimated principal directions and
+            curvatures and the derived curvature descriptors of the vertices
+            (see estimate_curvatures_batch)
+        """
+        if locator is None:
+            locator = self.build_cell_locator(poly_surf)
+        vertex_v_inds = np.asarray(vertex_v_inds, dtype=np.int64)
+        num_v = len(vertex_v_inds)
+        vs = self.graph.vp.xyz.get_2d_array([0, 1, 2]).T[vertex_v_inds]
+        n_vs = self.graph.vp.n_v.get_2d_array([0, 1, 2]).T[vertex_v_inds]
+
+        # eight vectors on the tangent planes, rotated by 45 degrees (pi/4
+        # radians) around n_v axis, shape (n, 8, 3)
+        votedirs = np.zeros((num_v, 8, 3))
+        votedir = perpendicular_vectors(n_vs)
+        R = rotation_matrices(n_vs, math.pi / 4)
+        for i in range(8):
+            votedir = np.einsum('nij,nj->ni', R, votedir)
+            votedirs[:, i] = votedir
+        v_ts = vs[:, np.newaxis, :] + votedirs * radius_hit
+
+        # Find intersection points c between the surface and line segments l
+        # going through v_t and parallel to n_v:
+        p1s = v_ts + n_vs[:, np.newaxis, :] * radius_hit
+        p2s = v_ts - n_vs[:, np.newaxis, :] * radius_hit
+        cs = self._intersect_lines_with_surface(
+            locator, p1s.reshape(-1, 3), p2s.reshape(-1, 3)).reshape(
+            num_v, 8, 3)
+
+        # If there is no intersection, c stays zero and is skipped, as well as
+        # c further than radius_hit from v_t:
+        bs = np.sqrt(np.sum((v_ts - cs) ** 2, axis=2))
+        hit = np.any(cs != 0, axis=2) & (bs <= radius_hit)
+        k_vcs = 2 * bs / (bs ** 2 + radius_hit ** 2)
+        # sign(c) = 1 if c is above the tangent plane t_v(S), -1 if c is below
+        # and 0 if c lies on it
+        sign_cs = np.sign(np.einsum(
+            'ni,nki->nk', n_vs, cs - vs[:, np.newaxis, :]))
+        multiplicators = np.where(hit, sign_cs * k_vcs, 0)
+        B_vs = np.einsum('nk,nki,nkj->nij', multiplicators, votedirs,
+                         votedirs) / 8
+        return estimate_curvatures_batch(B_vs, n_vs, keep_unmatched=True)
+
+    @staticmethod
+    def build_cell_locator(poly_surf):
+        """
+        Builds a cell locator to compute intersections between lines and the
+        surface, which can be reused for all vertices by gen_curv_vote.
+
+        Args:
+            poly_surf (vtkPolyData): surface from which the graph was generated,
+                scaled to given units
+
+        Returns:
+            vtkCellLocator
+        """
+        locator = vtk.vtkCellLocator()
+        locator.SetDataSet(poly_surf)
+        locator.BuildLocator()
+        return locator
+
+    @staticmethod
+    def _intersect_lines_with_surface(locator, p1s, p2s):
+        """
+        Finds the first intersection points between line segments and the
+        surface of a cell locator.
+
+        Args:
+            locator (vtkCellLocator): cell locator of the surface
+            p1s (numpy.ndarray): start points of the line segments, shape
+                (n, 3)
+            p2s (numpy.ndarray): end points of the line segments, shape (n, 3)
+
+        Returns:
+            the intersection points (numpy.ndarray), shape (n, 3); zeros where
+            there is no intersection
+        """
+        cs = np.zeros((len(p1s), 3))
+        # Outputs (we need only c, which is the x, y, z position of the
+        # intersection):
+        t = vtk.mutable(0)
+        pcoords = [0.0, 0.0, 0.0]
+        sub_id = vtk.mutable(0)
+        cell_id = vtk.mutable(0)
+        intersect_with_line = locator.IntersectWithLine
+        for i, (p1, p2) in enumerate(zip(p1s.tolist(), p2s.tolist())):
+            c = [0.0, 0.0, 0.0]
+            intersect_with_line(p1, p2, SSVV_TOLERANCE, t, c, pcoords,
+                                sub_id, cell_id)
+            cs[i] = c
+        return cs
+
     def add_curvature_descriptors_to_vertex(
             self, vertex, t_1, t_2, kappa_1, kappa_2, gauss_curvature,
             mean_curvature, shape_index, curvedness):
@@ -632,6 +890,35 @@ class SurfaceGraph(graphs.SegmentationGraph):
         self.graph.vp.curvedness_VV[vertex] = (0 if curvedness is None
                                                else curvedness)
 
+    def add_curvature_descriptors_to_vertices(self, vertex_inds, descriptors):
+        """
+        Add the given curvature descriptors as vertex properties to the given
+        vertices in the graph, writing whole property arrays. All other
+        vertices get 0 values and vectors.
+
+        Args:
+            vertex_inds (numpy.ndarray): indices of the vertices where the
+                properties should be added
+            descriptors (dict): arrays of the curvature descriptors of the
+                vertices, as returned by estimate_curvatures_batch
+
+        Returns:
+            None
+        """
+        num_v = self.graph.num_vertices()
+        for key in ['t_1', 't_2']:
+            values = np.zeros((num_v, 3))
+            values[vertex_inds] = descriptors[key]
+            self.graph.vp[key].set_2d_array(values.T)
+        for key, prop_key in [('kappa_1', 'kappa_1'), ('kappa_2', 'kappa_2'),
+                              ('gauss_curvature', 'gauss_curvature_VV'),
+                              ('mean_curvature', 'mean_curvature_VV'),
+                              ('shape_index', 'shape_index_VV'),
+                              ('curvedness', 'curvedness_VV')]:
+            values = np.zeros(num_v)
+            values[vertex_inds] = descriptors[key]
+            self.graph.vp[prop_key].a = values
+
 
 class PointGraph(SurfaceGraph):
     """
@@ -671,19 +958,20 @@ class PointGraph(SurfaceGraph):
         # graph property for storing the total surface area:
         self.graph.gp.total_area = self.graph.new_graph_property("float")
         self.graph.gp.total_area = 0.0  # initialize
-        # graph property for storing a list of triplet lists of vertex
-        # coordinates (x, y, z) belonging to one triangle:
-        self.graph.gp.triangle_points = self.graph.new_graph_property("object")
-        self.graph.gp.triangle_points = []
-        # graph property for storing a dictionary mapping vertex coordinates
-        # (x, y, z) to a list of triangle indices sharing this point:
-        self.graph.gp.point_in_triangles = self.graph.new_graph_property(
-            "object")
-        self.graph.gp.point_in_triangles = {}
+        # graph property for storing an array of the three vertex indices of
+        # each triangle, shape (t, 3):
+        self.graph.gp.triangles = self.graph.new_graph_property("object")
+        self.graph.gp.triangles = np.empty((0, 3), dtype=np.int32)
+
+        self._point_in_triangles = None
+        """tuple: the graph, its triangles array and number of vertices and the
+        CSR arrays of the triangles containing each vertex, built by
+        get_point_in_triangles.
+        """
 
     def build_graph_from_vtk_surface(
             self, surface, scale=(1, 1, 1), verbose=False,
-            reverse_normals=False):
+            reverse_normals=False, merge_points=True):
         """
         Builds the graph from the vtkPolyData surface, which is rescaled to
         given units according to the scale factor.
@@ -701,6 +989,9 @@ class PointGraph(SurfaceGraph):
                 information will be printed out
             reverse_normals (boolean, optional): if True (default False), the
                 triangle normals are reversed during graph generation
+            merge_points (boolean, optional): if True (default), points with
+                the same coordinates are merged using vtkCleanPolyData before
+                building the graph; otherwise, each VTK point becomes a vertex
 
         Returns:
             rescaled surface to given units with VTK curvatures
@@ -711,6 +1002,14 @@ class PointGraph(SurfaceGraph):
         # rescale the surface to units and update the attribute
         surface = rescale_surface(surface, scale)
 
+        if merge_points:
+            cleaner = vtk.vtkCleanPolyData()
+            cleaner.SetInputData(surface)
+            cleaner.SetTolerance(0.0)
+            cleaner.PointMergingOn()
+            cleaner.Update()
+            surface = cleaner.GetOutput()
+
         # Adding curvatures and normals to the vtkPolyData surface
         # because VTK and we (gen_surface) have the opposite normal
         # convention: VTK outwards pointing normals, we: inwards pointing
@@ -722,117 +1021,60 @@ class PointGraph(SurfaceGraph):
         surface = add_curvature_to_vtk_surface(surface, "Maximum", invert)
         surface = add_point_normals_to_vtk_surface(surface, reverse_normals)
 
-        point_data = surface.GetPointData()
-        normals = point_data.GetNormals()
-        n = point_data.GetNumberOfArrays()
-        min_curvatures = None
-        max_curvatures = None
-        gauss_curvatures = None
-        mean_curvatures = None
-        for i in range(n):
-            if point_data.GetArrayName(i) == "Minimum_Curvature":
-                min_curvatures = point_data.GetArray(i)
-            elif point_data.GetArrayName(i) == "Maximum_Curvature":
-                max_curvatures = point_data.GetArray(i)
-            elif point_data.GetArrayName(i) == "Gauss_Curvature":
-                gauss_curvatures = point_data.GetArray(i)
-            elif point_data.GetArrayName(i) == "Mean_Curvature":
-                mean_curvatures = point_data.GetArray(i)
-
         if verbose:
             # 0. Check numbers of cells and all points.
             print('{} cells'.format(surface.GetNumberOfCells()))
             print('{} points'.format(surface.GetNumberOfPoints()))
 
-        # 1. Iterate over all cells, adding their points as vertices to the
-        # graph and connecting them by edges.
-        triangle_i = -1  # initialize the triangle index counter
-        for i in range(surface.GetNumberOfCells()):
-            if verbose:
-                print('Cell number {}:'.format(i))
-
-            # Get all points which made up the cell & check that they are 3.
-            cell = surface.GetCell(i)
-            points_cell = cell.GetPoints()
-            if points_cell.GetNumberOfPoints() == 3:
-                triangle_i += 1
-                # 1a) Add each of the 3 points as vertex to the graph, if
-                # it has not been added yet.
-                triangle_points = []
-                for j in range(0, 3):
-                    x, y, z = points_cell.GetPoint(j)
-                    p = (x, y, z)
-                    triangle_points.append(p)
-                    if p in self.graph.gp.point_in_triangles:
-                        self.graph.gp.point_in_triangles[p].append(triangle_i)
-                    else:
-                        self.graph.gp.point_in_triangles[p] = [triangle_i]
-                    if p in self.coordinates_to_vertex_index:
-                        continue
-                    vd = self.graph.add_vertex()  # vertex descriptor
-                    self.graph.vp.xyz[vd] = [x, y, z]
-                    self.coordinates_to_vertex_index[p] = \
-                        self.graph.vertex_index[vd]
-                    if verbose:
-                        print('\tThe point ({}, {}, {}) has been added to '
-                              'the graph as a vertex.'.format(x, y, z))
-
-                    # Add VTK curvatures and normals to the graph
-                    self.graph.vp.min_curvature[vd] = min_curvatures.GetTuple1(
-                        cell.GetPointId(j))
-                    self.graph.vp.max_curvature[vd] = max_curvatures.GetTuple1(
-                        cell.GetPointId(j))
-                    self.graph.vp.gauss_curvature[vd] = (
-                        gauss_curvatures.GetTuple1(cell.GetPointId(j)))
-                    self.graph.vp.mean_curvature[vd] = (
-                        mean_curvatures.GetTuple1(cell.GetPointId(j)))
-                    self.graph.vp.normal[vd] = normals.GetTuple3(
-                        cell.GetPointId(j))
-                self.graph.gp.triangle_points.append(triangle_points)
-
-                # 1b) Add an edge with a distance between all 3 pairs of
-                # vertices, if it has not been added yet.
-                for k in range(0, 2):
-                    x1, y1, z1 = points_cell.GetPoint(k)
-                    p1 = (x1, y1, z1)
-                    # vertex descriptor of the 1st point
-                    vd1 = self.graph.vertex(
-                        self.coordinates_to_vertex_index[p1])
-                    for l in range(k + 1, 3):
-                        x2, y2, z2 = points_cell.GetPoint(l)
-                        p2 = (x2, y2, z2)
-                        # vertex descriptor of the 2nd point
-                        vd2 = self.graph.vertex(
-                            self.coordinates_to_vertex_index[p2])
-                        if not (
-                              (p1, p2) in self.coordinates_pair_connected or
-                              (p2, p1) in self.coordinates_pair_connected):
-                            # edge descriptor
-                            ed = self.graph.add_edge(vd1, vd2)
-                            self.graph.ep.distance[ed] = \
-                                self.distance_between_voxels(p1, p2)
-                            self.coordinates_pair_connected.add((p1, p2))
-                            if verbose:
-                                print('\tThe neighbor points ({}, {}, {}) and '
-                                      '({}, {}, {}) have been connected by an '
-                                      'edge with a distance of {} pixels.'
-                                      .format(x1, y1, z1, x2, y2, z2,
-                                              self.graph.ep.distance[ed]))
-
-                # 1c) Calculate area of the triangle and update the maximal area
-                # and total area graph properties:
-                area = triangle_area_cross_product(*np.array(triangle_points))
-                if area > self.graph.gp.max_triangle_area:
-                    self.graph.gp.max_triangle_area = area
-                self.graph.gp.total_area += area
-            else:
-                print('Oops, there are {} points in cell number {}'.format(
-                    points_cell.GetNumberOfPoints(), i))
-
-        # 2. Check if the numbers of vertices and edges are as they should be:
-        assert self.graph.num_vertices() == len(
-            self.coordinates_to_vertex_index)
-        assert self.graph.num_edges() == len(self.coordinates_pair_connected)
+        # 1. Get the triangle cells and the points belonging to them.
+        cell_ids, point_ids = get_triangle_point_ids(surface)
+        num_ignored = surface.GetNumberOfCells() - len(cell_ids)
+        if num_ignored > 0:
+            print('Oops, {} cells are not triangles! They will be ignored.'
+                  .format(num_ignored))
+        used_point_ids, triangles = np.unique(point_ids, return_inverse=True)
+        triangles = triangles.reshape(-1, 3).astype(np.int32)
+        num_vertices = len(used_point_ids)
+
+        # 2. Add the points as vertices to the graph, with their VTK
+        # curvatures and normals.
+        point_data = surface.GetPointData()
+        xyz = vtk_to_numpy(
+            surface.GetPoints().GetData())[used_point_ids].astype(np.float64)
+        if num_vertices > 0:
+            self.graph.add_vertex(num_vertices)
+        self.graph.vp.xyz.set_2d_array(xyz.T)
+        self.graph.vp.normal.set_2d_array(
+            vtk_to_numpy(point_data.GetNormals())[used_point_ids].T)
+        for prop_key, array_name in [("min_curvature", "Minimum_Curvature"),
+                                     ("max_curvature", "Maximum_Curvature"),
+                                     ("gauss_curvature", "Gauss_Curvature"),
+                                     ("mean_curvature", "Mean_Curvature")]:
+            self.graph.vp[prop_key].a = vtk_to_numpy(
+                point_data.GetArray(array_name))[used_point_ids]
+        self.coordinates_to_vertex_index = xyz
+
+        # 3. Connect the vertices by the unique triangle edges.
+        edges = find_unique_edges(triangles)
+        self.graph.add_edge_list(edges)
+        self.graph.ep.distance.a = np.linalg.norm(
+            xyz[edges[:, 0]] - xyz[edges[:, 1]], axis=1)
+        self.update_bounded_dijkstra()
+        if verbose:
+            print('{} vertices and {} edges'.format(num_vertices, len(edges)))
+
+        # 4. Store the triangles and calculate their areas to update the
+        # maximal area and total area graph properties:
+        self.graph.gp.triangles = triangles
+        self._point_in_triangles = (
+            self.graph, triangles, num_vertices,
+            find_point_triangles(triangles, num_vertices))
+        p0, p1, p2 = (xyz[triangles[:, j]] for j in range(3))
+        areas = 0.5 * np.linalg.norm(np.cross(p1 - p0, p2 - p0), axis=1)
+        if len(areas) > 0:
+            self.graph.gp.max_triangle_area = max(
+                self.graph.gp.max_triangle_area, areas.max())
+        self.graph.gp.total_area += np.sum(areas)
 
         t_end = time.time()
         duration = t_end - t_begin
@@ -842,6 +1084,28 @@ class PointGraph(SurfaceGraph):
 
         return surface
 
+    def get_point_in_triangles(self):
+        """
+        Gets the triangles containing each vertex, found from the graph
+        property "triangles" and kept until the graph changes.
+
+        Returns:
+            CSR arrays indptr and triangle indices (numpy.ndarray), so that the
+            triangles containing vertex i are
+            triangle_ids[indptr[i]:indptr[i + 1]]
+        """
+        graph = self.graph
+        triangles = graph.gp.triangles
+        num_vertices = graph.num_vertices()
+        if (self._point_in_triangles is None or
+                self._point_in_triangles[0] is not graph or
+                self._point_in_triangles[1] is not triangles or
+                self._point_in_triangles[2] != num_vertices):
+            self._point_in_triangles = (
+                graph, triangles, num_vertices,
+                find_point_triangles(triangles, num_vertices))
+        return self._point_in_triangles[3]
+
     def graph_to_triangle_poly(self, verbose=False):
         """
         Generates a VTK PolyData object from the PointGraph object with
@@ -855,79 +1119,37 @@ class PointGraph(SurfaceGraph):
             vtk.vtkPolyData with triangle-cells
         """
         if self.graph.num_vertices() > 0:
-            # Initialization
-            poly_triangles = vtk.vtkPolyData()
+            # Geometry: the vertices are the points
+            vertex_inds = self.graph.get_vertices()
             points = vtk.vtkPoints()
-            vertex_arrays = list()  # should become point's properties
-            # Vertex property arrays
-            for prop_key in list(self.graph.vp.keys()):
-                data_type = self.graph.vp[prop_key].value_type()
-                if (data_type != 'string' and data_type != 'python::object' and
-                        prop_key != 'points'):  # and prop_key != 'xyz'
-                    if verbose:
-                        print('\nvertex property key: {}'.format(prop_key))
-                        print('value type: {}'.format(data_type))
-                    if data_type[0:6] != 'vector':  # scalar
-                        num_components = 1
-                    else:  # vector
-                        num_components = len(
-                            self.graph.vp[prop_key][self.graph.vertex(0)])
-                    array = TypesConverter().gt_to_vtk(data_type)
-                    array.SetName(prop_key)
-                    if verbose:
-                        print('number of components: {}'.format(num_components))
-                    array.SetNumberOfComponents(num_components)
-                    vertex_arrays.append(array)
-            if verbose:
-                print('\nvertex arrays length: {}'.format(len(vertex_arrays)))
-
-            # Geometry
-            # dictionary of points with a key (x, y, z) and the index in VTK
-            # points list as a value
-            points_dict = {}
-            for vd in self.graph.vertices():  # they are the points!
-                [x, y, z] = self.graph.vp.xyz[vd]
-                # add the new point everywhere & update the index
-                i = self.graph.vertex_index[vd]
-                points.InsertPoint(i, x, y, z)
-                points_dict[(x, y, z)] = i
-
-                for array in vertex_arrays:
-                    prop_key = array.GetName()
-                    n_comp = array.GetNumberOfComponents()
-                    data_type = self.graph.vp[prop_key].value_type()
-                    data_type = TypesConverter().gt_to_numpy(data_type)
-                    array.InsertNextTuple(self.get_vertex_prop_entry(
-                        prop_key, vd, n_comp, data_type))
+            points.SetData(self.property_to_vtk_array('xyz', vertex_inds))
             if verbose:
                 print('number of points: {}'.format(points.GetNumberOfPoints()))
 
-            # Topology
-            # Triangles
-            triangles = vtk.vtkCellArray()
-            for triangle_points in self.graph.gp.triangle_points:
-                # triangle_points is a list of three (x, y, z)
-                triangle = vtk.vtkTriangle()
-                # The first parameter is the index of the triangle vertex which
-                # is ALWAYS 0-2.
-                # The second parameter is the index into the point (geometry)
-                # array, so this can range from 0-(NumPoints-1)
-                triangle.GetPointIds().SetId(
-                    0, points_dict[triangle_points[0]])
-                triangle.GetPointIds().SetId(
-                    1, points_dict[triangle_points[1]])
-                triangle.GetPointIds().SetId(
-                    2, points_dict[triangle_points[2]])
-                triangles.InsertNextCell(triangle)
+            # Topology: triangles, whose all vertices are in the graph
+            # lut[vertex_index] = point_array_index, -1 if filtered out
+            lut = np.full(self.graph.num_vertices(ignore_filter=True), -1,
+                          dtype=np.int64)
+            lut[vertex_inds] = np.arange(len(vertex_inds))
+            triangles = lut[np.asarray(self.graph.gp.triangles)]
+            triangles = triangles[np.all(triangles >= 0, axis=1)]
             if verbose:
-                print('number of triangle cells: {}'.format(
-                    triangles.GetNumberOfCells()))
+                print('number of triangle cells: {}'.format(len(triangles)))
 
             # vtkPolyData construction
+            poly_triangles = vtk.vtkPolyData()
             poly_triangles.SetPoints(points)
-            poly_triangles.SetPolys(triangles)
-            for array in vertex_arrays:
-                poly_triangles.GetPointData().AddArray(array)
+            poly_triangles.SetPolys(make_vtk_cell_array(triangles))
+            # Vertex property arrays, which become point's properties
+            for prop_key in list(self.graph.vp.keys()):
+                data_type = self.graph.vp[prop_key].value_type()
+                if (data_type != 'string' and data_type != 'python::object' and
+                        prop_key != 'points'):  # and prop_key != 'xyz'
+                    if verbose:
+                        print('\nvertex property key: {}'.format(prop_key))
+                        print('value type: {}'.format(data_type))
+                    poly_triangles.GetPointData().AddArray(
+                        self.property_to_vtk_array(prop_key, vertex_inds))
 
             return poly_triangles
 
@@ -980,7 +1202,7 @@ class PointGraph(SurfaceGraph):
         dot = np.dot
         outer = np.multiply.outer
         exp = math.exp
-        point_in_triangles = self.graph.gp.point_in_triangles
+        indptr, triangle_ids = self.get_point_in_triangles()
         calculate_geodesic_distance = self._calculate_geodesic_distance
         # acos = nice_acos
 
@@ -1009,10 +1231,8 @@ class PointGraph(SurfaceGraph):
         # Find the neighboring triangles of vertex v:
         neighboring_triangles_of_v = {}  # triangle_idx -> vertex_ids
         for idx_v_i in list(neighbor_idx_to_dist.keys()):
-            # Get neighboring vertex v_i and its coordinates (as numpy array):
-            vertex_v_i = vertex(idx_v_i)
-            v_i = array(xyz[vertex_v_i])
-            triangle_ids_of_v_i = point_in_triangles[tuple(v_i)]
+            triangle_ids_of_v_i = triangle_ids[
+                indptr[idx_v_i]:indptr[idx_v_i + 1]]
             for triangle_idx_of_v_i in triangle_ids_of_v_i:
                 if triangle_idx_of_v_i in neighboring_triangles_of_v:
                     neighboring_triangles_of_v[triangle_idx_of_v_i].append(
@@ -1108,9 +1328,14 @@ class TriangleGraph(SurfaceGraph):
         # vertex property for storing the VTK mean curvature at the
         # corresponding triangle:
         self.graph.vp.mean_curvature = self.graph.new_vertex_property("float")
-        # vertex property for storing the coordinates of the 3 points of the
-        # corresponding triangle:
-        self.graph.vp.points = self.graph.new_vertex_property("object")
+        # vertex property for storing the indices of the 3 points of the
+        # corresponding triangle in the graph property "point_xyz":
+        self.graph.vp.point_ids = self.graph.new_vertex_property(
+            "vector<int32_t>")
+        # graph property for storing the coordinates of the triangle points,
+        # shared by the triangles, in a float32 array of shape (p, 3):
+        self.graph.gp.point_xyz = self.graph.new_graph_property("object")
+        self.graph.gp.point_xyz = np.empty((0, 3), dtype=np.float32)
         # edge property storing the "strength" property of the edge: 1 for a
         # "strong" or 0 for a "weak" one:
         self.graph.ep.is_strong = self.graph.new_edge_property("int")
@@ -1120,14 +1345,9 @@ class TriangleGraph(SurfaceGraph):
         # graph property for storing the total surface area:
         self.graph.gp.total_area = self.graph.new_graph_property("float")
 
-        self.point_in_cells = {}
-        """dict: a dictionary mapping a point coordinates (x, y, z) to a list of
-        triangle-cell indices sharing this point.
-        """
-
-        self.triangle_cell_ids = []
-        """a list of all added triangle cell indices, whose indices correspond
-        to graph vertex indices"""
+        self.triangle_cell_ids = np.empty(0, dtype=np.int64)
+        """numpy.ndarray: indices of all added triangle cells, whose indices
+        correspond to graph vertex indices"""
 
     def build_graph_from_vtk_surface(self, surface, scale=(1, 1, 1),
                                      verbose=False, reverse_normals=False):
@@ -1177,213 +1397,84 @@ class TriangleGraph(SurfaceGraph):
             print('{} points'.format(surface.GetNumberOfPoints()))
 
         point_data = surface.GetPointData()
-        n = point_data.GetNumberOfArrays()
-        min_curvatures = None
-        max_curvatures = None
-        gauss_curvatures = None
-        mean_curvatures = None
-        for i in range(n):
-            if point_data.GetArrayName(i) == "Minimum_Curvature":
-                min_curvatures = point_data.GetArray(i)
-            elif point_data.GetArrayName(i) == "Maximum_Curvature":
-                max_curvatures = point_data.GetArray(i)
-            elif point_data.GetArrayName(i) == "Gauss_Curvature":
-                gauss_curvatures = point_data.GetArray(i)
-            elif point_data.GetArrayName(i) == "Mean_Curvature":
-                mean_curvatures = point_data.GetArray(i)
-
-        # 2. Add each triangle cell as a vertex to the graph. Ignore the
-        # non-triangle cells and cell with area equal to zero.
-        for cell_id in range(surface.GetNumberOfCells()):
-            # Get the cell i and check if it's a triangle:
-            cell = surface.GetCell(cell_id)
-            if not isinstance(cell, vtk.vtkTriangle):
-                print('Oops, the cell number {} is not a vtkTriangle but a {}! '
-                      'It will be ignored.'.format(
-                       cell_id, cell.__class__.__name__))
-                continue
-            if verbose:
-                print('Triangle cell number {}'.format(cell_id))
-
-            # Initialize a list for storing the points coordinates making
-            # out the cell
-            points_xyz = []
-
-            # Get the 3 points which made up the triangular cell:
-            points_cell = cell.GetPoints()
-
-            # Calculate the area of the triangle i and update the maximal area
-            # graph property:
-            area = cell.TriangleArea(points_cell.GetPoint(0),
-                                     points_cell.GetPoint(1),
-                                     points_cell.GetPoint(2))
-            if area > self.graph.gp.max_triangle_area:
-                self.graph.gp.max_triangle_area = area
-            try:
-                assert(area > 0)
-            except AssertionError:
-                print('\tThe cell {} cannot be added to the graph as a vertex, '
-                      'because the triangle area is not positive, but is {}.'
-                      .format(cell_id, area))
-                continue
-
-            # Calculate the centroid of the triangle:
-            for j in range(0, 3):
-                x, y, z = points_cell.GetPoint(j)
-                # Add each point j as a key in point_in_cells and cell index
-                # to the value list:
-                point_j = (x, y, z)
-                if point_j in self.point_in_cells:
-                    self.point_in_cells[point_j].append(cell_id)
-                else:
-                    self.point_in_cells[point_j] = [cell_id]
-
-                # Add each point j into the points coordinates list
-                points_xyz.append(np.array([x, y, z]))
-            center_xyz = triangle_center(*points_xyz)
-
-            # Calculate the normal of the triangle i;
-            normal = np.zeros(shape=3)
-            cell.ComputeNormal(points_cell.GetPoint(0),
-                               points_cell.GetPoint(1),
-                               points_cell.GetPoint(2), normal)
-            if reverse_normals:
-                normal *= -1
-
-            # Get the min, max, Gaussian and mean curvatures (calculated by
-            # VTK) for each of 3 points of the triangle i and calculate the
-            # average curvatures:
-            avg_min_curvature = np.average(
-                [min_curvatures.GetTuple1(
-                    cell.GetPointId(j)) for j in range(0, 3)])
-            avg_max_curvature = np.average(
-                [max_curvatures.GetTuple1(
-                    cell.GetPointId(j)) for j in range(0, 3)])
-            avg_gauss_curvature = np.average(
-                [gauss_curvatures.GetTuple1(
-                    cell.GetPointId(j)) for j in range(0, 3)])
-            avg_mean_curvature = np.average(
-                [mean_curvatures.GetTuple1(
-                    cell.GetPointId(j)) for j in range(0, 3)])
-
-            # Add the centroid as vertex to the graph, setting its properties:
-            vd = self.graph.add_vertex()  # vertex descriptor
-            self.graph.vp.xyz[vd] = center_xyz
-            self.coordinates_to_vertex_index[
-                tuple(center_xyz)] = self.graph.vertex_index[vd]
-            self.graph.vp.area[vd] = area
-            self.graph.vp.normal[vd] = normal
-            self.graph.vp.min_curvature[vd] = avg_min_curvature
-            self.graph.vp.max_curvature[vd] = avg_max_curvature
-            self.graph.vp.gauss_curvature[vd] = avg_gauss_curvature
-            self.graph.vp.mean_curvature[vd] = avg_mean_curvature
-            self.graph.vp.points[vd] = points_xyz
 
-            if verbose:
-                print('\tThe triangle centroid {} has been added to the graph '
-                      'as a vertex. Triangle area = {}, normal = {},\n'
-                      'average minimal curvature = {},'
-                      'average maximal curvature = {}, points = {}.'.format(
-                       self.graph.vp.xyz[vd], self.graph.vp.area[vd],
-                       self.graph.vp.normal[vd],
-                       self.graph.vp.min_curvature[vd],
-                       self.graph.vp.max_curvature[vd],
-                       self.graph.vp.points[vd]))
-
-            self.triangle_cell_ids.append(cell_id)
-
-        # 3. Add edges for each cell / vertex.
-        for i, cell_id in enumerate(self.triangle_cell_ids):
-            # Note: i corresponds to the vertex number of each cell, because
-            # they were added in this order
-            cell = surface.GetCell(cell_id)
-            if verbose:
-                print('(Triangle) cell number {}:'.format(cell_id))
-
-            # Find the "neighbor cells" and how many points they share with
-            # cell i (1 or 2) as follows.
-            # For each point j of cell i, iterate over the neighbor cells
-            # sharing that point (excluding the cell i).
-            # Add each neighbor cell to the neighbor_cells list if it is not
-            # there yet and add 1 into the shared_points list.
-            # Otherwise, find the index of the cell in neighbor_cells and
-            # increase the counter of shared_points at the same index.
-            points_cell = cell.GetPoints()
-            neighbor_cells = []
-            shared_points = []
-            for j in range(points_cell.GetNumberOfPoints()):
-                point_j = points_cell.GetPoint(j)
-                for neighbor_cell_id in self.point_in_cells[point_j]:
-                    if neighbor_cell_id != cell_id:
-                        if neighbor_cell_id not in neighbor_cells:
-                            neighbor_cells.append(neighbor_cell_id)
-                            shared_points.append(1)
-                        else:
-                            idx = neighbor_cells.index(neighbor_cell_id)
-                            shared_points[idx] += 1
-            if verbose:
-                print("has {} neighbor cells".format(len(neighbor_cells)))
-
-            # Get the vertex descriptor representing the cell i (vertex i):
-            vd_i = self.graph.vertex(i)
-
-            # Get the coordinates of the vertex i:
-            p_i = self.graph.vp.xyz[vd_i]  # a list
-            p_i = tuple(p_i)
-
-            # Iterate over the ready neighbor_cells and shared_points lists,
-            # connecting cell i with a neighbor cell x with a "strong" edge
-            # if they share 2 edges and with a "weak" edge otherwise (if
-            # they share only 1 edge).
-            for idx, neighbor_cell_id in enumerate(neighbor_cells):
-                # Get the vertex descriptor representing the cell x:
-                # vertex index of the current neighbor cell
-                x = self.triangle_cell_ids.index(neighbor_cell_id)
-                # vertex descriptor of the current neighbor cell, vertex x
-                vd_x = self.graph.vertex(x)
-
-                # Get the coordinates of the vertex x:
-                p_x = self.graph.vp.xyz[vd_x]
-                p_x = tuple(p_x)
-
-                # Add an edge between the vertices i and x, if it has not
-                # been added yet:
-                if not (((p_i, p_x) in self.coordinates_pair_connected) or
-                        ((p_x, p_i) in self.coordinates_pair_connected)):
-                    ed = self.graph.add_edge(vd_i, vd_x)  # edge descriptor
-                    self.coordinates_pair_connected.add((p_i, p_x))
-
-                    # Add the distance of the edge
-                    self.graph.ep.distance[ed] = self.distance_between_voxels(
-                        p_i, p_x)
-
-                    # Assign the "strength" property to the edge as
-                    # explained above:
-                    if shared_points[idx] == 2:
-                        is_strong = 1
-                        strength = 'strong'
-                    else:
-                        is_strong = 0
-                        strength = 'weak'
-                    self.graph.ep.is_strong[ed] = is_strong
-                    if verbose:
-                        print('\tThe neighbor vertices ({}, {}, {}) and '
-                              '({}, {}, {}) have been connected by a {} '
-                              'edge with a distance of {} pixels.'.format(
-                               p_i[0], p_i[1], p_i[2],
-                               p_x[0], p_x[1], p_x[2], strength,
-                               self.graph.ep.distance[ed]))
-
-        # 4. Check if the numbers of vertices and edges are as they should be:
-        assert self.graph.num_vertices() == len(self.triangle_cell_ids)
-        assert self.graph.num_edges() == len(self.coordinates_pair_connected)
+        # 2. Get the triangle cells and their points as arrays. Ignore the
+        # non-triangle cells and cells with area equal to zero.
+        cell_ids, point_ids = get_triangle_point_ids(surface)
+        num_ignored = surface.GetNumberOfCells() - len(cell_ids)
+        if num_ignored > 0:
+            print('Oops, {} cells are not vtkTriangles! They will be ignored.'
+                  .format(num_ignored))
+        points = vtk_to_numpy(
+            surface.GetPoints().GetData()).astype(np.float64)
+        p0, p1, p2 = (points[point_ids[:, j]] for j in range(3))
+        areas = triangle_areas(p0, p1, p2)
+        if len(areas) > 0:
+            self.graph.gp.max_triangle_area = max(
+                self.graph.gp.max_triangle_area, areas.max())
+        positive = areas > 0
+        for cell_id, area in zip(cell_ids[~positive], areas[~positive]):
+            print('\tThe cell {} cannot be added to the graph as a vertex, '
+                  'because the triangle area is not positive, but is {}.'
+                  .format(cell_id, area))
+        cell_ids = cell_ids[positive]
+        point_ids = point_ids[positive]
+        areas = areas[positive]
+        p0, p1, p2 = p0[positive], p1[positive], p2[positive]
+        centers = (p0 + p1 + p2) / 3.0
+        normals = triangle_normals(p0, p1, p2)
+        if reverse_normals:
+            normals *= -1
+
+        # Average the min, max, Gaussian and mean curvatures (calculated by
+        # VTK) over the 3 points of each triangle:
+        avg_curvatures = {}
+        for prop_key, array_name in [("min_curvature", "Minimum_Curvature"),
+                                     ("max_curvature", "Maximum_Curvature"),
+                                     ("gauss_curvature", "Gauss_Curvature"),
+                                     ("mean_curvature", "Mean_Curvature")]:
+            curvatures = vtk_to_numpy(point_data.GetArray(array_name))
+            avg_curvatures[prop_key] = np.mean(curvatures[point_ids], axis=1)
+
+        # 3. Add each triangle as a vertex to the graph, setting its
+        # properties:
+        num_triangles = len(cell_ids)
+        if num_triangles > 0:
+            self.graph.add_vertex(num_triangles)
+        self.graph.vp.xyz.set_2d_array(centers.T)
+        self.graph.vp.normal.set_2d_array(normals.T)
+        self.graph.vp.area.a = areas
+        for prop_key, avg_curvature in avg_curvatures.items():
+            self.graph.vp[prop_key].a = avg_curvature
+        self.coordinates_to_vertex_index = centers
+        self.triangle_cell_ids = cell_ids
+        # Points with the same coordinates are regarded as the same point.
+        unique_points, unique_ids = merge_duplicated_points(points)
+        triangles = unique_ids[point_ids]
+        self.graph.vp.point_ids.set_2d_array(triangles.T.astype(np.int32))
+        self.graph.gp.point_xyz = unique_points.astype(np.float32)
+
+        # 4. Connect the triangles sharing points, with a "strong" edge if
+        # they share 2 points (a triangle edge) and with a "weak" edge
+        # otherwise (if they share only 1 point).
+        pairs, num_shared_points = find_triangle_neighbors(triangles)
+        self.graph.add_edge_list(pairs)
+        self.graph.ep.distance.a = np.linalg.norm(
+            centers[pairs[:, 0]] - centers[pairs[:, 1]], axis=1)
+        self.update_bounded_dijkstra()
+        self.graph.ep.is_strong.a = (num_shared_points == 2).astype(int)
+
+        assert self.graph.num_vertices() == num_triangles
+        assert self.graph.num_edges() == len(pairs)
         if verbose:
             print('Real number of unique points: {}'.format(
-                len(self.point_in_cells)))
+                len(unique_points)))
+            print('{} strong and {} weak edges'.format(
+                np.sum(num_shared_points == 2),
+                np.sum(num_shared_points != 2)))
 
         # 5. Calculate the total surface area and store as graph property:
-        triangle_areas = self.graph.vp.area.get_array()
-        self.graph.gp.total_area = np.sum(triangle_areas)
+        self.graph.gp.total_area = np.sum(areas)
 
         t_end = time.time()
         duration = t_end - t_begin
@@ -1393,6 +1484,53 @@ class TriangleGraph(SurfaceGraph):
 
         return surface
 
+    def get_triangle_points(self):
+        """
+        Gets the coordinates of the triangle points and the indices of the
+        three points of each triangle (vertex).
+
+        Returns:
+            a float32 array of the point coordinates, shape (p, 3), and an
+            int32 array of the point indices of the triangles, shape (n, 3),
+            where n includes the vertices filtered out (numpy.ndarray)
+        """
+        if "point_ids" not in self.graph.vertex_properties:
+            self._convert_legacy_points()
+        point_ids = np.column_stack([
+            component.a for component in
+            ungroup_vector_property(self.graph.vp.point_ids, [0, 1, 2])])
+        return self.graph.gp.point_xyz, point_ids.astype(np.int32)
+
+    def _convert_legacy_points(self):
+        """
+        Converts the triangle points of a graph saved by an older version,
+        stored as a list of three point coordinates per vertex in the vertex
+        property "points", to the point indices in the vertex property
+        "point_ids" and the point table in the graph property "point_xyz".
+
+        Returns:
+            None
+        """
+        if "points" not in self.graph.vertex_properties:
+            raise pexceptions.PySegInputError(
+                expr='get_triangle_points (TriangleGraph)',
+                msg="The graph has neither the vertex property 'point_ids' "
+                    "nor 'points' with the triangle points.")
+        print('Converting the triangle points of the graph from the vertex '
+              'property "points"...')
+        num_vertices = self.graph.num_vertices(ignore_filter=True)
+        points = self.graph.vp.points
+        xyz = np.array([points[i] for i in range(num_vertices)],
+                       dtype=float).reshape(-1, 3)
+        unique_points, unique_ids = merge_duplicated_points(xyz)
+        self.graph.vp.point_ids = self.graph.new_vertex_property(
+            "vector<int32_t>")
+        self.graph.vp.point_ids.set_2d_array(
+            unique_ids.reshape(-1, 3).T.astype(np.int32))
+        self.graph.gp.point_xyz = self.graph.new_graph_property("object")
+        self.graph.gp.point_xyz = unique_points.astype(np.float32)
+        del self.graph.vertex_properties["points"]
+
     def graph_to_triangle_poly(self, verbose=False):
         """
         Generates a VTK PolyData object from the TriangleGraph object with
@@ -1406,88 +1544,33 @@ class TriangleGraph(SurfaceGraph):
             vtk.vtkPolyData with triangle-cells
         """
         if self.graph.num_vertices() > 0:
-            # Initialization
-            poly_triangles = vtk.vtkPolyData()
+            vertex_inds = self.graph.get_vertices()
+
+            # Geometry: only the points of the remaining triangles are used
+            point_xyz, point_ids = self.get_triangle_points()
+            used_point_ids, lut = np.unique(
+                point_ids[vertex_inds], return_inverse=True)
             points = vtk.vtkPoints()
-            vertex_arrays = list()
-            # Vertex property arrays
+            points.SetData(numpy_to_vtk(np.ascontiguousarray(
+                point_xyz[used_point_ids], dtype=np.float32), deep=True))
+            if verbose:
+                print('number of points: {}'.format(points.GetNumberOfPoints()))
+                print('number of triangle cells: {}'.format(len(vertex_inds)))
+
+            # vtkPolyData construction with triangles of the vertices
+            poly_triangles = vtk.vtkPolyData()
+            poly_triangles.SetPoints(points)
+            poly_triangles.SetPolys(make_vtk_cell_array(lut.reshape(-1, 3)))
+            # Vertex property arrays, which become cell's properties
             for prop_key in list(self.graph.vp.keys()):
                 data_type = self.graph.vp[prop_key].value_type()
                 if (data_type != 'string' and data_type != 'python::object' and
-                        prop_key != 'points'):  # and prop_key != 'xyz'
+                        prop_key != 'point_ids'):  # and prop_key != 'xyz'
                     if verbose:
                         print('\nvertex property key: {}'.format(prop_key))
                         print('value type: {}'.format(data_type))
-                    if data_type[0:6] != 'vector':  # scalar
-                        num_components = 1
-                    else:  # vector
-                        num_components = len(
-                            self.graph.vp[prop_key][self.graph.vertex(0)])
-                    array = TypesConverter().gt_to_vtk(data_type)
-                    array.SetName(prop_key)
-                    if verbose:
-                        print('number of components: {}'.format(num_components))
-                    array.SetNumberOfComponents(num_components)
-                    vertex_arrays.append(array)
-            if verbose:
-                print('\nvertex arrays length: {}'.format(len(vertex_arrays)))
-
-            # Geometry
-            # lut[vertex_index, triangle_point_index*] = point_array_index**
-            # *ALWAYS 0-2, **0-(NumPoints-1)
-            lut = np.zeros(shape=(self.graph.num_vertices(), 3), dtype=np.int)
-            i = 0  # next new point index
-            # dictionary of points with a key (x, y, z) and the index in VTK
-            # points list as a value
-            points_dict = {}
-            for vd in self.graph.vertices():
-                # enumerate over the 3 points of the triangle (vertex)
-                for j, [x, y, z] in enumerate(self.graph.vp.points[vd]):
-                    # add the new point everywhere & update the index
-                    if (x, y, z) not in points_dict:
-                        points.InsertPoint(i, x, y, z)
-                        lut[self.graph.vertex_index[vd], j] = i
-                        points_dict[(x, y, z)] = i
-                        i += 1
-                    else:  # reference the old point index only in the lut
-                        lut[self.graph.vertex_index[vd], j] = points_dict[
-                            (x, y, z)]
-            if verbose:
-                print('number of points: {}'.format(points.GetNumberOfPoints()))
-
-            # Topology
-            # Triangles
-            triangles = vtk.vtkCellArray()
-            for vd in self.graph.vertices():  # vd = vertex descriptor
-                # storing triangles of type Triangle:
-                triangle = vtk.vtkTriangle()
-                # The first parameter is the index of the triangle vertex which
-                # is ALWAYS 0-2.
-                # The second parameter is the index into the point (geometry)
-                # array, so this can range from 0-(NumPoints-1)
-                triangle.GetPointIds().SetId(
-                    0, lut[self.graph.vertex_index[vd], 0])
-                triangle.GetPointIds().SetId(
-                    1, lut[self.graph.vertex_index[vd], 1])
-                triangle.GetPointIds().SetId(
-                    2, lut[self.graph.vertex_index[vd], 2])
-                triangles.InsertNextCell(triangle)
-                for array in vertex_arrays:
-                    prop_key = array.GetName()
-                    n_comp = array.GetNumberOfComponents()
-                    data_type = self.graph.vp[prop_key].value_type()
-                    data_type = TypesConverter().gt_to_numpy(data_type)
-                    array.InsertNextTuple(self.get_vertex_prop_entry(
-                        prop_key, vd, n_comp, data_type))
-            if verbose:
-                print('number of triangle cells: {}'.format(
-                    triangles.GetNumberOfCells()))
-
-            # vtkPolyData construction
-            poly_triangles.SetPoints(points)
-            poly_triangles.SetPolys(triangles)
-            for array in vertex_arrays:
-                poly_triangles.GetCellData().AddArray(array)
+                    poly_triangles.GetCellData().AddArray(
+                        self.property_to_vtk_array(prop_key, vertex_inds))
 
             return poly_triangles
 
@@ -1495,6 +1578,109 @@ class TriangleGraph(SurfaceGraph):
             print("The graph is empty!")
             return None
 
+    def _purge_vertices(self, remove, prop_keys=()):
+        """
+        Purges the given vertices and their edges permanently from the graph
+        at once.
+
+        Args:
+            remove (numpy.ndarray): boolean array telling for each vertex index
+                whether the vertex has to be removed
+            prop_keys (list, optional): keys of vertex properties used for
+                finding the vertices, which are no longer true after purging
+                and will be removed if present
+
+        Returns:
+            None
+        """
+        if np.any(remove):
+            # Set the filter to get only vertices NOT to be removed.
+            keep = self.graph.new_vertex_property("boolean")
+            keep.a = np.invert(remove)
+            self.graph.set_vertex_filter(keep)
+            # Purge filtered out vertices and edges permanently from the graph:
+            self.graph.purge_vertices()
+        # Remove the properties used for filtering that are no longer true:
+        for prop_key in prop_keys:
+            if prop_key in self.graph.vertex_properties:
+                del self.graph.vertex_properties[prop_key]
+        # Update graph's dictionary coordinates_to_vertex_index and its
+        # BoundedDijkstra object:
+        self.update_coordinates_to_vertex_index()
+        self.update_bounded_dijkstra()
+
+    def clean(self, b=None, mask=None, scale=(1, 1, 1), label=1,
+              allowed_dist=0, min_component=0, largest_component=False,
+              verbose=False):
+        """
+        Cleans the graph by purging the vertices meeting any of the given
+        criteria once at the end.
+
+        The criteria are evaluated as boolean arrays in the following order,
+        each on the vertices remaining after the previous ones (using a vertex
+        filter instead of purging), so that the result is the same as when
+        purging after each criterion:
+        1. within distance b to the graph border (and outside the mask, if
+           given),
+        2. in a connected component with less than min_component vertices,
+        3. not in the largest connected component.
+
+        Args:
+            b (float, optional): distance from border in units of the graph; if
+                None (default), vertices are not removed by their distance to
+                border
+            mask (numpy.ndarray, optional): 3D mask of the segmentation from
+                which the underlying surface was created; if given, only the
+                vertices near border which are also outside the mask are
+                removed
+            scale (tuple, optional): pixel size (X, Y, Z) in given units of the
+                mask (default (1, 1, 1))
+            label (int, optional): the label in the mask to be considered
+                (default 1)
+            allowed_dist (int, optional): allowed distance in pixels between a
+                voxel coordinate and a mask voxel (default 0)
+            min_component (int, optional): if > 0 (default 0), vertices in
+                connected components with less vertices are removed
+            largest_component (boolean, optional): if True (default False),
+                vertices not in the largest connected component are removed
+            verbose (boolean, optional): if True (default False), some extra
+                information will be printed out
+
+        Returns:
+            None
+        """
+        t_begin = time.time()
+
+        remove = np.zeros(self.graph.num_vertices(), dtype=bool)
+        if b is not None:
+            if mask is None:
+                self.find_vertices_near_border(b)
+                remove |= self.graph.vp.is_near_border.a.astype(bool)
+            else:
+                self.find_vertices_near_border_and_outside_mask(
+                    b, mask, scale, label=label, allowed_dist=allowed_dist)
+                remove |= self.graph.vp.is_near_border_and_outside_mask.a\
+                    .astype(bool)
+        if min_component > 0:
+            remove |= self._find_small_components(
+                min_component, np.invert(remove), verbose=verbose)[0]
+        if largest_component:
+            keep = np.invert(remove)
+            is_in_lcc = label_largest_component(
+                GraphView(self.graph, vfilt=keep)).a.astype(bool)
+            remove |= keep & np.invert(is_in_lcc)
+        print('{} vertices are removed from the graph.'.format(np.sum(remove)))
+
+        self._purge_vertices(remove, prop_keys=(
+            "num_strong_edges", "is_on_border", "dist_to_border",
+            "is_near_border", "is_outside_mask",
+            "is_near_border_and_outside_mask"))
+
+        t_end = time.time()
+        duration = t_end - t_begin
+        minutes, seconds = divmod(duration, 60)
+        print('Cleaning the graph took: {} min {} s'.format(minutes, seconds))
+
     def find_graph_border(self, purge=False):
         """
         Finds vertices at the graph border, defined as such having less than 3
@@ -1538,18 +1724,9 @@ class TriangleGraph(SurfaceGraph):
         if purge is True:
             print('Filtering out the vertices at the graph borders and their '
                   'edges...')
-            # Set the filter to get only vertices NOT on border.
-            self.graph.set_vertex_filter(self.graph.vp.is_on_border,
-                                         inverted=True)
-            # Purge the filtered out vertices and edges permanently from the
-            # graph:
-            self.graph.purge_vertices()
-            # Remove the properties used for the filtering that are no longer
-            # true:
-            del self.graph.vertex_properties["num_strong_edges"]
-            del self.graph.vertex_properties["is_on_border"]
-            # Update graph's dictionary coordinates_to_vertex_index:
-            self.update_coordinates_to_vertex_index()
+            self._purge_vertices(
+                self.graph.vp.is_on_border.a.astype(bool), prop_keys=(
+                    "num_strong_edges", "is_on_border", "dist_to_border"))
 
         return border_vertices_indices
 
@@ -1557,6 +1734,10 @@ class TriangleGraph(SurfaceGraph):
         """
         Finds vertices that are within a given distance to the graph border.
 
+        The geodesic distance of every vertex to the nearest border vertex is
+        calculated once and stored in the vertex property "dist_to_border",
+        from which the vertices within any distance can be found.
+
         Args:
             b (float): distance from border in given units
             purge (boolean, optional): if True, those vertices and their edges
@@ -1566,55 +1747,33 @@ class TriangleGraph(SurfaceGraph):
         Returns:
             None
         """
-        if "is_near_border" not in self.graph.vertex_properties:
+        if "dist_to_border" not in self.graph.vertex_properties:
             border_vertices_indices = self.find_graph_border()
 
-            print('For each graph border vertex, finding vertices within '
-                  'geodesic distance {} to it...'.format(b))
-            vertex_id_within_b_to_border = dict()
-            for border_v_i in border_vertices_indices:
-                border_v = self.graph.vertex(border_v_i)
-                dist_border_v = shortest_distance(
-                    self.graph, source=border_v, target=None,
-                    weights=self.graph.ep.distance, max_dist=b)
-                dist_border_v = dist_border_v.get_array()
-
-                idxs = np.where(dist_border_v <= b)[0]
-                for idx in idxs:
-                    dist = dist_border_v[idx]
-                    try:
-                        vertex_id_within_b_to_border[idx] = min(
-                            dist, vertex_id_within_b_to_border[idx])
-                    except KeyError:
-                        vertex_id_within_b_to_border[idx] = dist
-            print('{} vertices are within distance {} to the graph border.'
-                  .format(len(vertex_id_within_b_to_border), b))
-
-            # Add a boolean vertex property telling whether a vertex is within
-            # distance b to border:
-            self.graph.vp.is_near_border = self.graph.new_vertex_property(
-                "boolean")
-            for v in self.graph.vertices():
-                v_i = self.graph.vertex_index[v]
-                if v_i in vertex_id_within_b_to_border:
-                    self.graph.vp.is_near_border[v] = 1
-                else:
-                    self.graph.vp.is_near_border[v] = 0
+            print('Finding geodesic distances of all vertices to the graph '
+                  'border...')
+            # Add a float vertex property storing the distance to the nearest
+            # border vertex (infinity if not reachable):
+            self.graph.vp.dist_to_border = self.graph.new_vertex_property(
+                "float")
+            self.graph.vp.dist_to_border.a = \
+                self.get_bounded_dijkstra().distances_from_nearest(
+                    border_vertices_indices)
+
+        # Add a boolean vertex property telling whether a vertex is within
+        # distance b to border:
+        self.graph.vp.is_near_border = self.graph.new_vertex_property(
+            "boolean")
+        self.graph.vp.is_near_border.a = self.graph.vp.dist_to_border.a <= b
+        print('{} vertices are within distance {} to the graph border.'.format(
+            np.sum(self.graph.vp.is_near_border.a), b))
 
         if purge is True:
             print('Filtering out those vertices and their edges...')
-            # Set the filter to get only vertices NOT within distance b to
-            # border.
-            self.graph.set_vertex_filter(self.graph.vp.is_near_border,
-                                         inverted=True)
-            # Purge filtered out vertices and edges permanently from the graph:
-            self.graph.purge_vertices()
-            # Remove the properties used for filtering that are no longer true:
-            del self.graph.vertex_properties["num_strong_edges"]
-            del self.graph.vertex_properties["is_on_border"]
-            del self.graph.vertex_properties["is_near_border"]
-            # Update graph's dictionary coordinates_to_vertex_index:
-            self.update_coordinates_to_vertex_index()
+            self._purge_vertices(
+                self.graph.vp.is_near_border.a.astype(bool), prop_keys=(
+                    "num_strong_edges", "is_on_border", "dist_to_border",
+                    "is_near_border"))
 
     def find_vertices_outside_mask(
             self, mask, scale, label=1, allowed_dist=0):
@@ -1638,37 +1797,48 @@ class TriangleGraph(SurfaceGraph):
         """
         if isinstance(mask, np.ndarray):
             print('\nFinding vertices outside the membrane mask...')
+            # Transform the vertex coordinates to pixels:
+            xyz = self.graph.vp.xyz.get_2d_array([0, 1, 2]).T
+            pixels = np.round(xyz / np.asarray(scale, dtype=float)).astype(int)
+            is_inside = np.all((pixels >= 0) & (pixels < mask.shape), axis=1)
+            if not np.all(is_inside):
+                print("{} vertices were transformed to pixels, which are not "
+                      "inside the mask with shape {}; they are not regarded "
+                      "as outside the mask.".format(
+                       np.sum(~is_inside), mask.shape))
+            is_outside_mask = np.zeros(len(pixels), dtype=bool)
+
+            if np.any(is_inside):
+                # Crop the mask to the vertices, padded by the allowed
+                # distance: if a mask voxel is within the allowed distance to
+                # a vertex, it is inside the crop, so the distances in the
+                # crop are exact up to the allowed distance.
+                pad = int(math.ceil(allowed_dist)) + 1
+                pixels = pixels[is_inside]
+                crop_min = np.maximum(pixels.min(axis=0) - pad, 0)
+                crop_max = np.minimum(pixels.max(axis=0) + pad + 1,
+                                      mask.shape)
+                crop = (mask[crop_min[0]:crop_max[0], crop_min[1]:crop_max[1],
+                             crop_min[2]:crop_max[2]] == label)
+                pixels = pixels - crop_min
+                if np.any(crop):
+                    # Invert the boolean matrix, because
+                    # distance_transform_edt calculates distances from '0's,
+                    # not from '1's!
+                    maskd = ndimage.morphology.distance_transform_edt(
+                        np.invert(crop))
+                    is_outside_mask[is_inside] = maskd[
+                        pixels[:, 0], pixels[:, 1], pixels[:, 2]] > allowed_dist
+                else:  # no mask voxel is within the allowed distance
+                    is_outside_mask[is_inside] = True
+
             # Add a boolean vertex property telling whether a vertex is outside
             # the mask:
             self.graph.vp.is_outside_mask = self.graph.new_vertex_property(
                 "boolean")
-            # Invert the boolean matrix, because distance_transform_edt
-            # calculates distances from '0's, not from '1's!
-            maskd = ndimage.morphology.distance_transform_edt(
-                np.invert(mask == label))
-
-            num_vertices_outside_mask = 0
-            for v in self.graph.vertices():
-                v_xyz = self.graph.vp.xyz[v]
-                v_pixel_x = int(round(v_xyz[0] / scale[0]))
-                v_pixel_y = int(round(v_xyz[1] / scale[1]))
-                v_pixel_z = int(round(v_xyz[2] / scale[2]))
-                try:
-                    if maskd[v_pixel_x, v_pixel_y, v_pixel_z] > allowed_dist:
-                        self.graph.vp.is_outside_mask[v] = 1
-                        num_vertices_outside_mask += 1
-                    else:
-                        self.graph.vp.is_outside_mask[v] = 0
-                except IndexError:
-                    print("IndexError happened. Vertex with coordinates "
-                          "({}, {}, {})".format(v_xyz[0], v_xyz[1], v_xyz[2]))
-                    print("was transformed to pixel ({}, {}, {}),".format(
-                        v_pixel_x, v_pixel_y, v_pixel_z))
-                    print("which is not inside the mask with shape ({}, {}, {})"
-                          .format(maskd.shape[0], maskd.shape[1],
-                                  maskd.shape[2]))
+            self.graph.vp.is_outside_mask.a = is_outside_mask
             print('{} vertices are further away than {} pixel to the mask.'
-                  .format(num_vertices_outside_mask, allowed_dist))
+                  .format(np.sum(is_outside_mask), allowed_dist))
 
         else:
             raise pexceptions.PySegInputError(
@@ -1712,35 +1882,21 @@ class TriangleGraph(SurfaceGraph):
         # b to border and outside mask:
         self.graph.vp.is_near_border_and_outside_mask = \
             self.graph.new_vertex_property("boolean")
-        num_vertices_near_border_and_outside_mask = 0
-        for v in self.graph.vertices():
-            if (self.graph.vp.is_near_border[v] == 1 and
-                    self.graph.vp.is_outside_mask[v] == 1):
-                self.graph.vp.is_near_border_and_outside_mask[v] = 1
-                num_vertices_near_border_and_outside_mask += 1
-            else:
-                self.graph.vp.is_near_border_and_outside_mask[v] = 0
+        self.graph.vp.is_near_border_and_outside_mask.a = np.logical_and(
+            self.graph.vp.is_near_border.a, self.graph.vp.is_outside_mask.a)
         print('{} vertices are within distance {} to the graph border and '
               'further than {} pixel from the mask.'.format(
-               num_vertices_near_border_and_outside_mask, b, allowed_dist))
+               np.sum(self.graph.vp.is_near_border_and_outside_mask.a), b,
+               allowed_dist))
 
         if purge is True:
             print('Filtering out those vertices and their edges...')
-            # Set the filter to get only vertices NOT {near border and outside
-            # mask}.
-            self.graph.set_vertex_filter(
-                self.graph.vp.is_near_border_and_outside_mask, inverted=True)
-            # Purge filtered out vertices and edges permanently from the graph:
-            self.graph.purge_vertices()
-            # Remove the properties used for filtering that are no longer true:
-            del self.graph.vertex_properties["num_strong_edges"]
-            del self.graph.vertex_properties["is_on_border"]
-            del self.graph.vertex_properties["is_near_border"]
-            # until here as in find_vertices_near_border, because not purged
-            del self.graph.vertex_properties["is_outside_mask"]
-            del self.graph.vertex_properties["is_near_border_and_outside_mask"]
-            # Update graph's dictionary coordinates_to_vertex_index:
-            self.update_coordinates_to_vertex_index()
+            self._purge_vertices(
+                self.graph.vp.is_near_border_and_outside_mask.a.astype(bool),
+                prop_keys=("num_strong_edges", "is_on_border",
+                           "dist_to_border", "is_near_border",
+                           "is_outside_mask",
+                           "is_near_border_and_outside_mask"))
 
     def find_largest_connected_component(self, replace=False):
         """
@@ -1768,12 +1924,7 @@ class TriangleGraph(SurfaceGraph):
         if replace is True and lcc.num_vertices() < self.graph.num_vertices():
             print('Filtering out those vertices and edges not belonging to the '
                   'largest connected component...')
-            # Set the filter to get only vertices belonging to the lcc.
-            self.graph.set_vertex_filter(is_in_lcc, inverted=False)
-            # Purge filtered out vertices and edges permanently from the graph:
-            self.graph.purge_vertices()
-            # Update graph's dictionary coordinates_to_vertex_index:
-            self.update_coordinates_to_vertex_index()
+            self._purge_vertices(np.invert(is_in_lcc.a.astype(bool)))
 
         return lcc
 
@@ -1793,48 +1944,19 @@ class TriangleGraph(SurfaceGraph):
                 information will be printed out
 
         Returns:
-            None
+            numbers of vertices and areas of the connected components
+            (numpy.ndarray), indexed by the component label
         """
         t_begin = time.time()
 
-        comp_labels_map, sizes = label_components(self.graph)
-        small_components = [i for i, size in enumerate(sizes)
-                            if size < threshold]
-        print("The graph has {} components, {} of them have size < {}".format(
-            len(sizes), len(small_components), threshold))
-        if verbose:
-            print("Sizes of components:")
-            print(sizes)
-
-        if len(small_components) > 0:
-            # Add a boolean vertex property telling whether a vertex belongs to
-            # a small component with size below the threshold:
-            self.graph.vp.small_component = \
-                self.graph.new_vertex_property("boolean")
-            num_vertices_in_small_components = 0
-            for v in self.graph.vertices():
-                if comp_labels_map[v] in small_components:
-                    self.graph.vp.small_component[v] = 1
-                    num_vertices_in_small_components += 1
-                else:
-                    self.graph.vp.small_component[v] = 0
-            print("{} vertices are in the small components.".format(
-                num_vertices_in_small_components))
-
-            if purge is True:
-                print('Filtering out those vertices and their edges belonging '
-                      'to the small components...')
-                # Set the filter to get only vertices NOT belonging to a small
-                # component.
-                self.graph.set_vertex_filter(self.graph.vp.small_component,
-                                             inverted=True)
-                # Purge filtered out vertices and edges from the graph:
-                self.graph.purge_vertices()
-                # Update graph's dictionary coordinates_to_vertex_index:
-                self.update_coordinates_to_vertex_index()
-
-            # Remove the property used for the filtering that is no longer true:
-            del self.graph.vertex_properties["small_component"]
+        keep = np.ones(self.graph.num_vertices(), dtype=bool)
+        in_small, sizes, areas = self._find_small_components(
+            threshold, keep, verbose=verbose)
+
+        if purge is True and np.any(in_small):
+            print('Filtering out those vertices and their edges belonging '
+                  'to the small components...')
+            self._purge_vertices(in_small)
 
         t_end = time.time()
         duration = t_end - t_begin
@@ -1842,11 +1964,53 @@ class TriangleGraph(SurfaceGraph):
         print('Finding small components took: {} min {} s'.format(
             minutes, seconds))
 
+        return sizes, areas
+
+    def _find_small_components(self, threshold, keep, verbose=False):
+        """
+        Finds the vertices in connected components below a given threshold
+        size among the vertices to be kept, without changing the graph.
+
+        Args:
+            threshold (int): threshold size in vertices, below which connected
+                components are considered small
+            keep (numpy.ndarray): boolean array telling for each vertex index
+                whether the vertex is kept (the rest is filtered out)
+            verbose (boolean, optional): if True (default False), histograms
+                of the component sizes and areas will be printed out
+
+        Returns:
+            boolean array telling for each vertex index whether the vertex is
+            kept and in a small component, numbers of vertices and areas of the
+            connected components (numpy.ndarray), indexed by the component
+            label
+        """
+        comp_labels_map, _ = label_components(
+            GraphView(self.graph, vfilt=keep))
+        labels = comp_labels_map.a[keep].astype(np.int64)
+        sizes = np.bincount(labels)
+        areas = np.bincount(labels, weights=self.graph.vp.area.a[keep],
+                            minlength=len(sizes))
+        # lookup table telling for each component label whether it is small
+        is_small = sizes < threshold
+        print("The graph has {} components, {} of them have size < {}".format(
+            len(sizes), np.sum(is_small), threshold))
+        if verbose and len(sizes) > 0:
+            for name, values in (("sizes", sizes), ("areas", areas)):
+                counts, edges = np.histogram(values)
+                print("Histogram of component {}:".format(name))
+                for count, low, high in zip(counts, edges[:-1], edges[1:]):
+                    print("[{:.4g}, {:.4g}]: {}".format(low, high, count))
+        in_small = np.zeros(len(keep), dtype=bool)
+        in_small[keep] = is_small[labels]
+        print("{} vertices are in the small components.".format(
+            np.sum(in_small)))
+        return in_small, sizes, areas
+
     # * The following TriangleGraph methods are implementing with adaptations
     # the first step of normal vector voting algorithm of Page et al., 2002. *
 
-    def collect_normal_votes(self, vertex_v_ind, g_max, a_max, sigma,
-                             full_dist_map=None):
+    def collect_normal_votes(self, vertex_v_ind, g_max, a_max, sigma):
         """
         For a vertex v, collects the normal votes of all triangles within its
         geodesic neighborhood and calculates the weighted covariance matrix sum
@@ -1874,9 +2038,6 @@ class TriangleGraph(SurfaceGraph):
                 triangle-graph
             sigma (float): sigma, defined as 3*sigma = g_max, so that votes
                 beyond the neighborhood can be ignored
-            full_dist_map (graph_tool.PropertyMap, optional): the full distance
-                map for the whole graph; if None, a local distance map is
-                calculated for this vertex (default)
 
         Returns:
             - number of geodesic neighbors of vertex v
@@ -1901,8 +2062,7 @@ class TriangleGraph(SurfaceGraph):
         # Find the neighboring vertices of vertex v to be returned:
         if vertex_v_ind == 0:
             print("Calling find_geodesic_neighbors")
-        neighbor_idx_to_dist = self.find_geodesic_neighbors(
-            vertex_v, g_max, full_dist_map=full_dist_map)
+        neighbor_idx_to_dist = self.find_geodesic_neighbors(vertex_v, g_max)
         try:
             assert len(neighbor_idx_to_dist) > 0
         except AssertionError:
@@ -1949,3 +2109,54 @@ class TriangleGraph(SurfaceGraph):
             V_v += w_i * V_i
 
         return len(neighbor_idx_to_dist), V_v
+
+    def collect_normal_votes_batch(self, vertex_v_inds, g_max, a_max, sigma,
+                                   chunk_size=256, neighborhoods=None):
+        """
+        Vectorized version of collect_normal_votes() for a block of vertices.
+
+        The geodesic neighborhoods are found for chunks of vertices and the
+        votes of all neighbors are calculated at once with
+        collect_normal_votes_csr() from the vertex property arrays.
+
+        Args:
+            vertex_v_inds (numpy.ndarray): indices of the vertices v in the
+                surface triangle-graph for which the votes are collected
+            g_max (float): the maximal geodesic distance in units of the graph
+            a_max (float): the area of the largest triangle in the surface
+                triangle-graph
+            sigma (float): sigma, defined as 3*sigma = g_max, so that votes
+                beyond the neighborhood can be ignored
+            chunk_size (int, optional): number of vertices whose votes are
+                calculated at once, limiting the memory usage (default 256)
+            neighborhoods (NeighborhoodIndex, optional): if given (default
+                None), the geodesic neighborhoods are taken from it instead of
+                being searched in the graph
+
+        Returns:
+            - numbers of geodesic neighbors of the vertices v (numpy.ndarray)
+            - the 3x3 symmetric matrices V_v, shape (n, 3, 3)
+        """
+        vertex_v_inds = np.asarray(vertex_v_inds, dtype=np.int64)
+        xyz = self.graph.vp.xyz.get_2d_array([0, 1, 2]).T
+        normals = self.graph.vp.normal.get_2d_array([0, 1, 2]).T
+        areas = self.graph.vp.area.get_array()
+
+        num_neighbors = np.zeros(len(vertex_v_inds), dtype=np.int64)
+        V_vs = np.zeros((len(vertex_v_inds), 3, 3))
+        for start in range(0, len(vertex_v_inds), chunk_size):
+            chunk = vertex_v_inds[start:start + chunk_size]
+            if neighborhoods is not None:
+                indptr, ids, dists = neighborhoods.block(chunk)
+            else:
+                indptr, ids, dists = self.find_geodesic_neighbors_batch(
+                    chunk, g_max)
+            (num_neighbors[start:start + chunk_size],
+             V_vs[start:start + chunk_size]) = collect_normal_votes_csr(
+                xyz[chunk], indptr, ids, dists, xyz, normals, areas, a_max,
+                sigma)
+
+        for vertex_v_ind in vertex_v_inds[num_neighbors == 0]:
+            print("\nWarning: the vertex v = {} has 0 neighbors. It will be "
+                  "ignored later.".format(xyz[vertex_v_ind]))
+        return num_neighbors, V_vs
@@ -0,0 +1,207 @@
+import numpy as np
+import vtk
+from vtk.util.numpy_support import vtk_to_numpy, numpy_to_vtk
+
+"""
+Set of functions converting the cells of a vtkPolyData surface from and to
+arrays and finding the adjacency of triangles, used to build and export the
+graphs without iterating over the cells in Python.
+
+Author: Maria Salfer (Max Planck Institute for Biochemistry)
+"""
+
+__author__ = 'Maria Salfer'
+
+
+def get_triangle_point_ids(surface):
+    """
+    Gets the triangle cells of a vtkPolyData surface with their point ids.
+
+    Args:
+        surface (vtk.vtkPolyData): a surface
+
+    Returns:
+        ids of the triangle cells (numpy.ndarray of shape (t,)) and the ids of
+        their three points (numpy.ndarray of shape (t, 3))
+    """
+    polys = surface.GetPolys()
+    offsets = vtk_to_numpy(polys.GetOffsetsArray()).astype(np.int64)
+    connectivity = vtk_to_numpy(
+        polys.GetConnectivityArray()).astype(np.int64)
+    if len(offsets) < 2:
+        return np.empty(0, dtype=np.int64), np.empty((0, 3), dtype=np.int64)
+    starts = offsets[:-1]
+    is_triangle = np.diff(offsets) == 3
+    starts = starts[is_triangle]
+    point_ids = connectivity[starts[:, np.newaxis] + np.arange(3)]
+    # cells of a vtkPolyData are numbered: vertices, lines, polygons, strips
+    first_poly_id = surface.GetNumberOfVerts() + surface.GetNumberOfLines()
+    cell_ids = first_poly_id + np.flatnonzero(is_triangle)
+    return cell_ids, point_ids
+
+
+def make_vtk_cell_array(point_ids):
+    """
+    Creates cells with the same number of points at once.
+
+    Args:
+        point_ids (numpy.ndarray): point ids of the cells, shape (n, k), e.g.
+            k=1 for vertex-cells, k=2 for line-cells and k=3 for triangles
+
+    Returns:
+        vtk.vtkCellArray with the n cells
+    """
+    point_ids = np.asarray(point_ids, dtype=np.int64)
+    num_cells, cell_size = point_ids.shape
+    offsets = np.arange(0, (num_cells + 1) * cell_size, cell_size)
+    cells = vtk.vtkCellArray()
+    cells.SetData(
+        numpy_to_vtk(offsets, deep=True, array_type=vtk.VTK_ID_TYPE),
+        numpy_to_vtk(point_ids.ravel(), deep=True,
+                     array_type=vtk.VTK_ID_TYPE))
+    return cells
+
+
+def merge_duplicated_points(points):
+    """
+    Assigns the same index to points with the same coordinates.
+
+    Args:
+        points (numpy.ndarray): point coordinates, shape (n, 3)
+
+    Returns:
+        coordinates of the unique points (numpy.ndarray of shape (u, 3)) and
+        the index of the unique point of each point (numpy.ndarray of shape
+        (n,))
+    """
+    # adding 0 turns -0.0 into 0.0, which are the same coordinate
+    unique_points, inverse = np.unique(
+        np.asarray(points) + 0.0, axis=0, return_inverse=True)
+    return unique_points, inverse.reshape(-1)
+
+
+def find_triangle_neighbors(triangles):
+    """
+    Finds all pairs of triangles sharing at least one point.
+
+    The (triangle, point) incidences are sorted by the point, so that the
+    triangles sharing a point are consecutive; pairs are formed between
+    incidences shifted by 1, 2, ... up to the maximal number of triangles
+    sharing a point, and counted by sorting their keys.
+
+    Args:
+        triangles (numpy.ndarray): point indices of the triangles, shape
+            (t, 3)
+
+    Returns:
+        pairs of triangle indices (numpy.ndarray of shape (m, 2), the first
+        index smaller than the second one, sorted) and the number of points
+        they share (numpy.ndarray of shape (m,))
+    """
+    triangles = np.asarray(triangles, dtype=np.int64)
+    num_triangles = len(triangles)
+    point_ids = triangles.ravel()
+    triangle_ids = np.repeat(np.arange(num_triangles, dtype=np.int64), 3)
+    order = np.lexsort((triangle_ids, point_ids))
+    point_ids = point_ids[order]
+    triangle_ids = triangle_ids[order]
+    keys = []
+    shift = 1
+    while shift < len(point_ids):
+        same_point = point_ids[shift:] == point_ids[:-shift]
+        if not same_point.any():
+            break
+        first = triangle_ids[:-shift][same_point]
+        second = triangle_ids[shift:][same_point]
+        different = first != second
+        keys.append(first[different] * num_triangles + second[different])
+        shift += 1
+    if len(keys) == 0:
+        return np.empty((0, 2), dtype=np.int64), np.empty(0, dtype=np.int64)
+    keys, counts = np.unique(np.concatenate(keys), return_counts=True)
+    pairs = np.column_stack([keys // num_triangles, keys % num_triangles])
+    return pairs, counts
+
+
+def find_unique_edges(triangles):
+    """
+    Finds the unique edges of triangles.
+
+    Args:
+        triangles (numpy.ndarray): point indices of the triangles, shape
+            (t, 3)
+
+    Returns:
+        pairs of point indices of the edges (numpy.ndarray of shape (m, 2),
+        the first index smaller than the second one, sorted)
+    """
+    triangles = np.asarray(triangles, dtype=np.int64)
+    pairs = np.concatenate(
+        [triangles[:, [0, 1]], triangles[:, [1, 2]], triangles[:, [0, 2]]])
+    pairs = np.sort(pairs, axis=1)
+    pairs = pairs[pairs[:, 0] != pairs[:, 1]]
+    return np.unique(pairs, axis=0)
+
+
+def find_point_triangles(triangles, num_points):
+    """
+    Finds the triangles containing each point.
+
+    Args:
+        triangles (numpy.ndarray): point indices of the triangles, shape
+            (t, 3)
+        num_points (int): number of points
+
+    Returns:
+        CSR arrays indptr (numpy.ndarray of shape (num_points + 1,)) and
+        triangle indices, so that the triangles containing point i are
+        triangle_ids[indptr[i]:indptr[i + 1]], in increasing order
+    """
+    point_ids = np.asarray(triangles, dtype=np.int64).ravel()
+    order = np.argsort(point_ids, kind='stable')
+    indptr = np.zeros(num_points + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum(np.bincount(point_ids, minlength=num_points))
+    return indptr, order // 3
+
+
+def extract_polygons(surface, keep):
+    """
+    Extracts the given polygon cells of a surface at once, keeping all points
+    and their data.
+
+    Args:
+        surface (vtk.vtkPolyData): a surface consisting only of polygon cells
+        keep (numpy.ndarray): boolean array telling for each cell whether it
+            is kept
+
+    Returns:
+        a new surface with the kept cells and their data (vtk.vtkPolyData)
+    """
+    keep = np.asarray(keep, dtype=bool)
+    polys = surface.GetPolys()
+    offsets = vtk_to_numpy(polys.GetOffsetsArray()).astype(np.int64)
+    connectivity = vtk_to_numpy(polys.GetConnectivityArray()).astype(np.int64)
+    sizes = np.diff(offsets)[keep]
+    kept_offsets = np.zeros(len(sizes) + 1, dtype=np.int64)
+    kept_offsets[1:] = np.cumsum(sizes)
+    is_kept_id = np.repeat(keep, np.diff(offsets))
+    cells = vtk.vtkCellArray()
+    cells.SetData(
+        numpy_to_vtk(kept_offsets, deep=True, array_type=vtk.VTK_ID_TYPE),
+        numpy_to_vtk(connectivity[is_kept_id], deep=True,
+                     array_type=vtk.VTK_ID_TYPE))
+
+    extracted = vtk.vtkPolyData()
+    extracted.SetPoints(surface.GetPoints())
+    extracted.GetPointData().ShallowCopy(surface.GetPointData())
+    extracted.SetPolys(cells)
+    cell_data = surface.GetCellData()
+    for i in range(cell_data.GetNumberOfArrays()):
+        array = cell_data.GetArray(i)
+        if array is None:  # not a numeric array
+            continue
+        kept_array = numpy_to_vtk(vtk_to_numpy(array)[keep], deep=True,
+                                  array_type=array.GetDataType())
+        kept_array.SetName(array.GetName())
+        extracted.GetCellData().AddArray(kept_array)
+    return extracted
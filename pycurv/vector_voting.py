@@ -2,13 +2,15 @@ import time
 import numpy as np
 import math
 from graph_tool import load_graph
-from graph_tool.topology import shortest_distance
-import pathos.pools as pp
 from functools import partial
-from os import remove
-from os.path import isfile
+from copy import copy
+from os.path import splitext
+import warnings
 
 from .surface_graphs import TriangleGraph, PointGraph
+from .worker_pool import run_in_pool
+from .neighborhoods import NeighborhoodIndex, MEMORY_BUDGET
+from . import pexceptions
 
 """
 Contains a function implementing the normal vector voting algorithm (Page et
@@ -27,10 +29,21 @@ date: 2017-06-17
 __author__ = 'Maria Salfer'
 
 
+# shapes per vertex and dtypes of the results of the second pass (see
+# SurfaceGraph.second_pass_batch) for run_in_pool:
+_CURVATURE_OUTPUTS = {
+    't_1': ((3,), np.float64), 't_2': ((3,), np.float64),
+    'kappa_1': ((), np.float64), 'kappa_2': ((), np.float64),
+    'gauss_curvature': ((), np.float64), 'mean_curvature': ((), np.float64),
+    'shape_index': ((), np.float64), 'curvedness': ((), np.float64),
+    'valid': ((), np.bool_)}
+
+
 def normals_directions_and_curvature_estimation(
         sg, radius_hit, epsilon=0, eta=0, methods=['VV'],
-        page_curvature_formula=False, full_dist_map=False, graph_file='temp.gt',
-        area2=True, only_normals=False, poly_surf=None, cores=6, runtimes=''):
+        page_curvature_formula=False, full_dist_map=False, graph_file=None,
+        area2=True, only_normals=False, poly_surf=None, cores=6, runtimes='',
+        memory_budget=MEMORY_BUDGET):
     """
     Runs the modified Normal Vector Voting algorithm (with different options for
     the second pass) to estimate surface orientation, principle curvatures and
@@ -39,9 +52,11 @@ def normals_directions_and_curvature_estimation(
     Args:
         sg (TriangleGraph or PointGraph): triangle or point graph generated
             from a surface of interest
-        radius_hit (float): radius in length unit of the graph;
+        radius_hit (float or list): radius in length unit of the graph;
             it should be chosen to correspond to radius of smallest features of
-            interest on the surface
+            interest on the surface; if a list of radii is given, the geodesic
+            neighborhoods are found once for the largest radius and the
+            algorithm is run on a copy of the graph for each radius
         epsilon (float, optional): parameter of Normal Vector Voting algorithm
             influencing the number of triangles classified as "crease junction"
             (class 2), default 0
@@ -49,17 +64,22 @@ def normals_directions_and_curvature_estimation(
             influencing the number of triangles classified as "crease junction"
             (class 2) and "no preferred orientation" (class 3, see Notes),
             default 0
-        methods (list, optional): all methods to run in the second pass ('VV'
-            and 'SSVV' are possible, default is 'VV')
+        methods (list, optional): all methods to run in the second pass ('VV',
+            'RVV', 'AVV', 'NVV' and 'SSVV' are possible, default is 'VV'); the
+            votes of all vector voting methods are collected in one sweep (see
+            curvature_estimation_multiple_methods)
         page_curvature_formula (boolean, optional): if True (default False),
             normal curvature formula from Page et al. is used in VV (see
             collect_curvature_votes)
-        full_dist_map (boolean, optional): if True, a full distance map is
-            calculated for the whole graph (not possible for PointGraph),
-            otherwise a local distance map is calculated later for each vertex
-            (default)
-        graph_file (string, optional): name for a temporary graph file
-            after the first run of the algorithm (default 'temp.gt')
+        full_dist_map (boolean, optional): deprecated and ignored, a
+            DeprecationWarning is given if True; memory_budget controls
+            whether the geodesic neighborhoods of all vertices are stored or
+            found on demand
+        graph_file (string, optional): if given (default None), the graph
+            after the first run of the algorithm is saved to this file as a
+            checkpoint and the geodesic neighborhoods of a TriangleGraph are
+            saved next to it and reused by later runs on the same graph; the
+            second run gets the graph in memory in any case
         area2 (boolean, optional): if True (default), votes are weighted by
             triangle area also in the second step (principle directions and
             curvatures estimation; not possible for PointGraph)
@@ -72,13 +92,20 @@ def normals_directions_and_curvature_estimation(
         cores (int, optional): number of cores to run VV in parallel (default 6)
         runtimes (str, optional): if given, runtimes and some parameters are
             added to this file (default '')
+        memory_budget (int, optional): memory budget in bytes for the geodesic
+            neighborhoods of all vertices of a TriangleGraph; if they are
+            estimated to need more, they are found on demand for each block of
+            vertices (default MEMORY_BUDGET)
 
     Returns:
-        a dictionary mapping the method name ('VV' and 'SSVV') to the
+        a dictionary mapping the method name (e.g. 'VV' and 'SSVV') to the
         tuple of two elements: TriangleGraph or PointGraph (if pg was given)
         graph and vtkPolyData surface of triangles with classified orientation
         and estimated normals or tangents, principle curvatures and directions
-        (if only_normals is False)
+        (if only_normals is False); if a list of radii was given, a dictionary
+        mapping each radius to such a dictionary; if only_normals is True, the
+        FirstPassState (or a dictionary mapping each radius to its
+        FirstPassState, if a list of radii was given)
 
     Notes:
         * Maximal geodesic neighborhood distance g_max for normal vector voting
@@ -86,41 +113,75 @@ def normals_directions_and_curvature_estimation(
         * If epsilon = 0 and eta = 0 (default), all triangles will be classified
           as "surface patch" (class 1).
     """
+    _warn_full_dist_map(full_dist_map)
+
     t_begin = time.time()
 
-    normals_estimation(sg, radius_hit, epsilon, eta, full_dist_map, cores=cores,
-                       runtimes=runtimes, graph_file=graph_file)
+    multiple_radii = isinstance(radius_hit, (list, tuple, np.ndarray))
+    radii = list(radius_hit) if multiple_radii else [radius_hit]
+
     if sg.__class__.__name__ == "PointGraph":
         vertex_based = True
         area2 = False
-        full_dist_map = False
+        neighborhoods_max = None
     else:
         vertex_based = False
+        # The geodesic neighborhoods are found once for the largest radius and
+        # reused by both passes, all methods and all radii:
+        g_max = math.pi * max(radii) / 2
+        neighborhoods_max = _find_neighborhoods(
+            sg, g_max, cores, graph_file, memory_budget)
+
+    results_per_radius = {}
+    states_per_radius = {}
+    for rh in radii:
+        if multiple_radii:
+            print("\nradius_hit = {}".format(rh))
+            # each radius gets its own graph (and graph file), so that the
+            # results of the other radii are not overwritten
+            sg_rh = _copy_graph(sg)
+            if graph_file is None:
+                graph_file_rh = None
+            else:
+                graph_file_rh = '{}_rh{}{}'.format(
+                    splitext(graph_file)[0], rh, splitext(graph_file)[1])
+        else:
+            sg_rh = sg
+            graph_file_rh = graph_file
+        if neighborhoods_max is not None:
+            neighborhoods = neighborhoods_max.threshold(math.pi * rh / 2)
+        else:
+            neighborhoods = None
 
-    if only_normals is False:
-        if len(methods) > 1:
-            # load the graph from file, so each method starts anew
-            sg = None
-        results = {}
-        for method in methods:
-            sg_curv, surface_curv = curvature_estimation(
-                radius_hit, graph_file=graph_file, method=method,
-                page_curvature_formula=page_curvature_formula, area2=area2,
-                poly_surf=poly_surf, full_dist_map=full_dist_map, cores=cores,
-                runtimes=runtimes, vertex_based=vertex_based, sg=sg)
-            results[method] = (sg_curv, surface_curv)
-        if graph_file == 'temp.gt' and isfile(graph_file):
-            remove(graph_file)
+        state = normals_estimation(
+            sg_rh, rh, epsilon, eta, cores=cores,
+            runtimes=runtimes, graph_file=graph_file_rh,
+            neighborhoods=neighborhoods, memory_budget=memory_budget)
 
+        if only_normals:
+            states_per_radius[rh] = state
+        else:
+            results_per_radius[rh] = state.curvature_estimation(
+                methods=methods, page_curvature_formula=page_curvature_formula,
+                area2=area2, poly_surf=poly_surf, cores=cores,
+                runtimes=runtimes)
+
+    if only_normals is False:
         t_end = time.time()
         duration = t_end - t_begin
         minutes, seconds = divmod(duration, 60)
         print('Whole method took: {} min {} s'.format(minutes, seconds))
-        return results
+        if multiple_radii:
+            return results_per_radius
+        return results_per_radius[radius_hit]
+    if multiple_radii:
+        return states_per_radius
+    return states_per_radius[radius_hit]
 
 
 def normals_estimation(sg, radius_hit, epsilon=0, eta=0, full_dist_map=False,
-                       cores=6, runtimes='', graph_file='temp.gt'):
+                       cores=6, runtimes='', graph_file=None,
+                       neighborhoods=None, memory_budget=MEMORY_BUDGET):
     """
     Runs the modified Normal Vector Voting algorithm to estimate surface
     orientation (classification in surface patch with normal, crease junction
@@ -145,19 +206,28 @@ def normals_estimation(sg, radius_hit, epsilon=0, eta=0, full_dist_map=False,
             influencing the number of triangles classified as "crease junction"
             (class 2) and "no preferred orientation" (class 3, see Notes),
             default 0
-        full_dist_map (boolean, optional): if True, a full distance map is
-            calculated for the whole graph (not possible for PointGraph),
-            otherwise a local distance map is calculated later for each vertex
-            (default)
+        full_dist_map (boolean, optional): deprecated and ignored, a
+            DeprecationWarning is given if True; memory_budget controls
+            whether the geodesic neighborhoods of all vertices are stored or
+            found on demand
         cores (int, optional): number of cores to run VV (collect_normal_votes
             and estimate_normal) in parallel (default 6)
         runtimes (str, optional): if given, runtimes and some parameters are
             added to this file (default '')
-        graph_file (str, optional): file path to save the graph, default file
-            'temp.gt'
+        graph_file (str, optional): if given (default None), file path to
+            save the graph as a checkpoint, next to which also the geodesic
+            neighborhoods of a TriangleGraph are saved and reused by later runs
+        neighborhoods (NeighborhoodIndex, optional): geodesic neighborhoods of
+            all vertices with g_max derived from radius_hit (only for
+            TriangleGraph); if None (default), they are found here
+        memory_budget (int, optional): memory budget in bytes for the geodesic
+            neighborhoods of all vertices of a TriangleGraph; if they are
+            estimated to need more, they are found on demand for each block of
+            vertices (default MEMORY_BUDGET)
 
     Returns:
-        None
+        a FirstPassState object holding the graph with the estimated normals
+        and the neighborhoods for the second pass
 
     Note:
         * Maximal geodesic neighborhood distance g_max for normal vector voting
@@ -165,6 +235,8 @@ def normals_estimation(sg, radius_hit, epsilon=0, eta=0, full_dist_map=False,
         * If epsilon = 0 and eta = 0 (default), all triangles will be classified
           as "surface patch" (class 1).
     """
+    _warn_full_dist_map(full_dist_map)
+
     # Preparation (calculations that are the same for the whole graph)
     t_begin0 = time.time()
     print('\nPreparing for running modified Vector Voting...')
@@ -198,19 +270,10 @@ def normals_estimation(sg, radius_hit, epsilon=0, eta=0, full_dist_map=False,
     # vertex (if the vertex belongs to class 2):
     sg.graph.vp.t_v = sg.graph.new_vertex_property("vector<float>")
 
-    if full_dist_map is True and sg.__class__.__name__ == "TriangleGraph":
-        # * Distance map between all pairs of vertices *
-        t_begin0_2 = time.time()
-        print("\nCalculating the full distance map...")
-        full_dist_map = shortest_distance(  # <class 'graph_tool.PropertyMap'>
-            sg.graph, weights=sg.graph.ep.distance)
-        t_end0_2 = time.time()
-        duration0_2 = t_end0_2 - t_begin0_2
-        minutes, seconds = divmod(duration0_2, 60)
-        print('Calculation of the full distance map took: {} min {} s'.format(
-            minutes, seconds))
-    else:
-        full_dist_map = None
+    if (sg.__class__.__name__ == "TriangleGraph" and
+            neighborhoods is None):
+        neighborhoods = _find_neighborhoods(
+            sg, g_max, cores, graph_file, memory_budget)
 
     t_end0 = time.time()
     duration0 = t_end0 - t_begin0
@@ -229,67 +292,33 @@ def normals_estimation(sg, radius_hit, epsilon=0, eta=0, full_dist_map=False,
         print("\nFirst pass: classifying orientation and estimating normals for"
               " surface patches and tangents for creases...")
 
-    collect_normal_votes = sg.collect_normal_votes
-    estimate_normal = sg.estimate_normal
-    first_pass = sg.first_pass
+    first_pass_batch = partial(
+        sg.first_pass_batch, g_max=g_max, a_max=a_max, sigma=sigma,
+        epsilon=epsilon, eta=eta, neighborhoods=neighborhoods)
     num_v = sg.graph.num_vertices()
     print("number of vertices: {}".format(num_v))
-    classes_counts = {}
-    vertex = sg.graph.vertex
-    vp_orientation_class = sg.graph.vp.orientation_class
-    vp_n_v = sg.graph.vp.n_v
-    vp_t_v = sg.graph.vp.t_v
+    vertex_inds = np.arange(num_v)
 
     if cores > 1:  # parallel processing
-        p = pp.ProcessPool(cores)
-        print('Opened a pool with {} processes'.format(cores))
-        results_list = p.map(partial(first_pass,
-                                     g_max=g_max, a_max=a_max, sigma=sigma,
-                                     full_dist_map=full_dist_map),
-                             list(range(num_v)))  # a list of vertex v indices
-        p.close()
-        p.clear()
-
-        results_array = np.array(results_list, dtype=object)
-        # Calculating average neighbors number:
-        num_neighbors_array = results_array[:, 0]
-        avg_num_neighbors = np.mean(num_neighbors_array)
-        class_v_array = results_array[:, 1]
-        n_v_array = results_array[:, 2]
-        t_v_array = results_array[:, 3]
-
-        # Adding the estimated properties to the graph and counting classes:
-        for i in range(num_v):
-            v = vertex(i)
-            vp_orientation_class[v] = class_v_array[i]
-            vp_n_v[v] = n_v_array[i]
-            vp_t_v[v] = t_v_array[i]
-            try:
-                classes_counts[class_v_array[i]] += 1
-            except KeyError:
-                classes_counts[class_v_array[i]] = 1
-
+        results = run_in_pool(
+            first_pass_batch, vertex_inds,
+            {'num_neighbors': ((), np.int64),
+             'orientation_class': ((), np.int32),
+             'n_v': ((3,), np.float64), 't_v': ((3,), np.float64)},
+            cores)
     else:  # cores == 1, sequential processing
-        sum_num_neighbors = 0
-        for i in range(num_v):
-            if sg.__class__.__name__ == "TriangleGraph":
-                num_neighbors, V_v = collect_normal_votes(
-                    i, g_max, a_max, sigma, full_dist_map=full_dist_map)
-            else:  # PointGraph
-                num_neighbors, V_v = collect_normal_votes(
-                    i, g_max, a_max, sigma)
-            sum_num_neighbors += num_neighbors
-            class_v, n_v, t_v = estimate_normal(i, V_v, epsilon, eta)
-            # Adding the estimated properties to the graph and counting classes:
-            v = vertex(i)
-            vp_orientation_class[v] = class_v
-            vp_n_v[v] = n_v
-            vp_t_v[v] = t_v
-            try:
-                classes_counts[class_v] += 1
-            except KeyError:
-                classes_counts[class_v] = 1
-        avg_num_neighbors = float(sum_num_neighbors) / float(num_v)
+        results = first_pass_batch(vertex_inds)
+
+    class_v_array = results['orientation_class']
+    # Calculating average neighbors number:
+    avg_num_neighbors = np.mean(results['num_neighbors'])
+
+    # Adding the estimated properties to the graph and counting classes:
+    sg.graph.vp.orientation_class.a = class_v_array
+    sg.graph.vp.n_v.set_2d_array(results['n_v'].T)
+    sg.graph.vp.t_v.set_2d_array(results['t_v'].T)
+    classes, counts = np.unique(class_v_array, return_counts=True)
+    classes_counts = dict(zip(classes.tolist(), counts.tolist()))
 
     # Printing out some numbers concerning the first pass:
     print("Average number of geodesic neighbors for all vertices: {}".format(
@@ -300,9 +329,6 @@ def normals_estimation(sg, radius_hit, epsilon=0, eta=0, full_dist_map=False,
     if 3 in classes_counts:
         print("{} no preferred orientation".format(classes_counts[3]))
 
-    # Save the graph to a file for use by different methods in the second run:
-    sg.graph.save(graph_file)
-
     t_end1 = time.time()
     duration1 = t_end1 - t_begin1
     minutes, seconds = divmod(duration1, 60)
@@ -313,11 +339,125 @@ def normals_estimation(sg, radius_hit, epsilon=0, eta=0, full_dist_map=False,
             f.write("{};{};{};{};{};{};".format(
                 num_v, radius_hit, g_max, avg_num_neighbors, cores, duration1))
 
+    state = FirstPassState(sg, radius_hit, neighborhoods=neighborhoods,
+                           memory_budget=memory_budget)
+    if graph_file is not None:
+        # Save the graph to a file as a checkpoint for later second runs:
+        state.save(graph_file)
+    return state
+
+
+class FirstPassState(object):
+    """
+    Class holding the state of the modified Normal Vector Voting algorithm
+    after the first pass in memory: the graph with the classified orientations
+    and estimated normals or tangents and the geodesic neighborhoods, which are
+    handed over to the second pass without saving and loading the graph.
+    """
+
+    def __init__(self, sg, radius_hit, neighborhoods=None,
+                 full_dist_map=False, memory_budget=MEMORY_BUDGET):
+        """
+        Constructor of a FirstPassState object.
+
+        Args:
+            sg (TriangleGraph or PointGraph): graph after the first pass
+            radius_hit (float): radius in length unit of the graph used in the
+                first pass
+            neighborhoods (NeighborhoodIndex, optional): geodesic
+                neighborhoods of all vertices with g_max derived from
+                radius_hit (only for TriangleGraph, default None)
+            full_dist_map (boolean, optional): deprecated and ignored, a
+                DeprecationWarning is given if True; memory_budget controls
+                whether the geodesic neighborhoods of all vertices are stored
+                or found on demand
+            memory_budget (int, optional): memory budget in bytes for the
+                geodesic neighborhoods of all vertices (default MEMORY_BUDGET)
+
+        Returns:
+            None
+        """
+        _warn_full_dist_map(full_dist_map)
+        self.sg = sg
+        self.radius_hit = radius_hit
+        self.neighborhoods = neighborhoods
+        self.memory_budget = memory_budget
+
+    @property
+    def vertex_based(self):
+        """
+        True if the graph is a PointGraph (boolean).
+        """
+        return self.sg.__class__.__name__ == "PointGraph"
+
+    def snapshot(self):
+        """
+        Gets a copy of the graph after the first pass, e.g. for running a
+        second pass method without changing this state.
+
+        Returns:
+            a copy of the TriangleGraph or PointGraph
+        """
+        return _copy_graph(self.sg)
+
+    def save(self, graph_file):
+        """
+        Saves the graph after the first pass to a file as a checkpoint, which
+        can be given to curvature_estimation later.
+
+        Args:
+            graph_file (str): file path to save the graph
+
+        Returns:
+            None
+        """
+        self.sg.graph.save(graph_file)
+
+    def curvature_estimation(self, methods=['VV'],
+                             page_curvature_formula=False, area2=True,
+                             poly_surf=None, cores=6, runtimes='', keep=False):
+        """
+        Runs the second pass with the given methods on the graph in memory
+        (see curvature_estimation_multiple_methods).
+
+        Args:
+            methods (list, optional): all methods to run in the second pass
+                ('VV', 'RVV', 'AVV', 'NVV' and 'SSVV' are possible, default is
+                'VV')
+            page_curvature_formula (boolean, optional): if True (default
+                False), normal curvature formula from Page et al. is used by
+                the 'VV' method
+            area2 (boolean, optional): if True (default), votes are weighted
+                by triangle area by the 'VV' method
+            poly_surf (vtkPolyData, optional): scaled surface from which the
+                graph was generated (required only for 'SSVV', default None)
+            cores (int, optional): number of cores to run VV in parallel
+                (default 6)
+            runtimes (str, optional): if given, runtimes are added to this file
+                (default '')
+            keep (boolean, optional): if True (default False), all methods run
+                on snapshots of the graph, so this state can be used again;
+                otherwise, the last method runs on the graph itself
+
+        Returns:
+            a dictionary mapping the method name to the tuple of TriangleGraph
+            or PointGraph graph and vtkPolyData surface with the estimated
+            principle curvatures and directions
+        """
+        sg = self.snapshot() if keep else self.sg
+        return curvature_estimation_multiple_methods(
+            self.radius_hit, methods=methods, graph_file=None,
+            page_curvature_formula=page_curvature_formula, area2=area2,
+            poly_surf=poly_surf, cores=cores, runtimes=runtimes,
+            vertex_based=self.vertex_based, sg=sg,
+            neighborhoods=self.neighborhoods, memory_budget=self.memory_budget)
+
 
 def curvature_estimation(
-        radius_hit, graph_file='temp.gt', method='VV',
+        radius_hit, graph_file=None, method='VV',
         page_curvature_formula=False, area2=True, poly_surf=None,
-        full_dist_map=False, cores=6, runtimes='', vertex_based=False, sg=None):
+        full_dist_map=False, cores=6, runtimes='', vertex_based=False, sg=None,
+        neighborhoods=None, memory_budget=MEMORY_BUDGET):
     """
     Runs the second pass of the modified Normal Vector Voting algorithm with
     the given method to estimate principle curvatures and directions for a
@@ -328,10 +468,12 @@ def curvature_estimation(
         radius_hit (float): radius in length unit of the graph;
             it should be chosen to correspond to radius of smallest features of
             interest on the surface
-        graph_file (string, optional): name for a graph file after the first run
-            of the algorithm (default 'temp.gt' will be removed after loading)
-        method (str, optional): a method to run in the second pass ('VV' and
-            'SSVV' are possible, default is 'VV')
+        graph_file (string, optional): name of the graph file saved after the
+            first run of the algorithm (see normals_estimation), loaded if sg
+            is None (default None)
+        method (str, optional): a method to run in the second pass ('VV',
+            'RVV', 'AVV', 'NVV' and 'SSVV' are possible, default is 'VV'); 'VV'
+            is RVV, AVV or NVV depending on page_curvature_formula and area2
         page_curvature_formula (boolean, optional): if True (default False),
             normal curvature formula from Page et al. is used in VV (see
             collect_curvature_votes)
@@ -340,80 +482,62 @@ def curvature_estimation(
             vertex-based approach)
         poly_surf (vtkPolyData): scaled surface from which the graph was
             generated, (required only if method="SSVV", default None)
-        full_dist_map (boolean, optional): if True, a full distance map is
-            calculated for the whole graph (not possible for vertex-based
-            approach), otherwise a local distance map is calculated later for
-            each vertex (default)
-        cores (int): number of cores to run VV (collect_curvature_votes and
-            estimate_curvature) in parallel (default 6)
+        full_dist_map (boolean, optional): deprecated and ignored, a
+            DeprecationWarning is given if True; memory_budget controls
+            whether the geodesic neighborhoods of all vertices are stored or
+            found on demand
+        cores (int): number of cores to run the second pass (VV or SSVV) in
+            parallel (default 6)
         runtimes (str): if given, runtimes and some parameters are added to
             this file (default '')
         vertex_based (boolean, optional): if True (default False), curvature is
             calculated per triangle vertex instead of triangle center.
-        sg (TriangleGraph or PointGraph): if given (default None), this graph
-            object will be used instead of loading from the 'graph_file' file
+        sg (TriangleGraph, PointGraph or FirstPassState): if given (default
+            None), this graph object or the graph of this state returned by
+            normals_estimation will be used instead of loading from the
+            'graph_file' file
+        neighborhoods (NeighborhoodIndex, optional): geodesic neighborhoods of
+            all vertices with g_max derived from radius_hit (only for
+            TriangleGraph); if None (default), they are taken from the
+            FirstPassState or found here
+        memory_budget (int, optional): memory budget in bytes for the geodesic
+            neighborhoods of all vertices of a TriangleGraph; if they are
+            estimated to need more, they are found on demand for each block of
+            vertices (default MEMORY_BUDGET)
 
     Returns:
         a tuple of TriangleGraph or PointGraph (if pg was given) graph and
         vtkPolyData surface of triangles with classified orientation and
         estimated normals or tangents, principle curvatures and directions
     """
+    _warn_full_dist_map(full_dist_map)
+
     # Preparation (calculations that are the same for the whole graph)
     t_begin0 = time.time()
-    if sg is None:
-        if vertex_based:
-            sg = PointGraph()
-        else:
-            sg = TriangleGraph()
-        sg.graph = load_graph(graph_file)
+    sg, vertex_based, neighborhoods = _get_first_pass_graph(
+        radius_hit, graph_file, vertex_based, sg, neighborhoods,
+        'curvature_estimation')
 
     if vertex_based:
         # cannot weight by triangle area in vertex-based approach
         area2 = False
 
-    if full_dist_map is True and sg.__class__.__name__ == "TriangleGraph":
-        # * Distance map between all pairs of vertices *
-        t_begin0_2 = time.time()
-        print("\nCalculating the full distance map...")
-        full_dist_map = shortest_distance(  # <class 'graph_tool.PropertyMap'>
-            sg.graph, weights=sg.graph.ep.distance)
-        t_end0_2 = time.time()
-        duration0_2 = t_end0_2 - t_begin0_2
-        minutes, seconds = divmod(duration0_2, 60)
-        print('Calculation of the full distance map took: {} min {} s'.format(
-            minutes, seconds))
-    else:
-        full_dist_map = None
-
     g_max = math.pi * radius_hit / 2.0
     sigma = g_max / 3.0
-    if method == "VV" and area2:
+    if method != "SSVV":
+        page_curvature_formula, area2 = _vv_variant(
+            method, page_curvature_formula, area2, vertex_based)
+        if (sg.__class__.__name__ == "TriangleGraph" and
+                neighborhoods is None):
+            neighborhoods = _find_neighborhoods(
+                sg, g_max, cores, graph_file, memory_budget)
+    if method != "SSVV" and area2:
         a_max = sg.graph.gp.max_triangle_area
         print("Maximal triangle area = {}".format(a_max))
     else:
         a_max = 0.0
 
-    # * Adding vertex properties to be filled by all curvature methods *
-    # vertex properties for storing the estimated principal directions of the
-    # maximal and minimal curvatures of the corresponding triangle:
-    sg.graph.vp.t_1 = sg.graph.new_vertex_property("vector<float>")
-    sg.graph.vp.t_2 = sg.graph.new_vertex_property("vector<float>")
-    # vertex properties for storing the estimated maximal and minimal curvatures
-    # of the corresponding triangle:
-    sg.graph.vp.kappa_1 = sg.graph.new_vertex_property("float")
-    sg.graph.vp.kappa_2 = sg.graph.new_vertex_property("float")
-    # vertex property for storing the Gaussian curvature calculated from kappa_1
-    # and kappa_2 at the corresponding triangle:
-    sg.graph.vp.gauss_curvature_VV = sg.graph.new_vertex_property("float")
-    # vertex property for storing the mean curvature calculated from kappa_1 and
-    # kappa_2 at the corresponding triangle:
-    sg.graph.vp.mean_curvature_VV = sg.graph.new_vertex_property("float")
-    # vertex property for storing the shape index calculated from kappa_1 and
-    # kappa_2 at the corresponding triangle:
-    sg.graph.vp.shape_index_VV = sg.graph.new_vertex_property("float")
-    # vertex property for storing the curvedness calculated from kappa_1 and
-    # kappa_2 at the corresponding triangle:
-    sg.graph.vp.curvedness_VV = sg.graph.new_vertex_property("float")
+    _add_curvature_properties(sg)
 
     t_end0 = time.time()
     duration0 = t_end0 - t_begin0
@@ -421,91 +545,46 @@ def curvature_estimation(
     print('Preparation took: {} min {} s'.format(minutes, seconds))
 
     t_begin2 = time.time()
-    if method == 'VV':
-        if page_curvature_formula:
-            method_print = 'NVV'
-        elif area2:
-            method_print = 'AVV'
-        else:
-            method_print = 'RVV'
-    else:  # method == 'SSVV'
+    if method == 'SSVV':
         method_print = 'SSVV'
+    else:
+        method_print = _vv_method_name(page_curvature_formula, area2)
     print("\nSecond pass: estimating principle curvatures and directions for "
           "surface patches using {}...".format(method_print))
 
     # shortcuts
-    vertices = sg.graph.vertices
-    vertex = sg.graph.vertex
-    collect_curvature_votes = sg.collect_curvature_votes
-    gen_curv_vote = sg.gen_curv_vote
-    estimate_curvature = sg.estimate_curvature
-    second_pass = sg.second_pass
     orientation_class = sg.graph.vp.orientation_class
-    add_curvature_descriptors_to_vertex = sg.add_curvature_descriptors_to_vertex
+    add_curvature_descriptors_to_vertices = \
+        sg.add_curvature_descriptors_to_vertices
     graph_to_triangle_poly = sg.graph_to_triangle_poly
 
     # Estimate principal directions and curvatures (and calculate the
     # Gaussian and mean curvatures, shape index and curvedness) for vertices
     # belonging to a surface patch
-    good_vertices_ind = []
-    for v in vertices():
-        if orientation_class[v] == 1:
-            good_vertices_ind.append(int(v))
-            # Voting and curvature estimation for SSVV:
-            if method == "SSVV":  # sequential processing, edits the graph
-                # curvatures saved in the graph, placeholders where error
-                gen_curv_vote(poly_surf, v, radius_hit)
-        else:  # add placeholders for vertices classified as crease or noise
-            add_curvature_descriptors_to_vertex(
-                v, None, None, None, None, None, None, None, None)
+    good_vertices_ind = np.where(orientation_class.a == 1)[0]
     print("{} vertices to estimate curvature".format(len(good_vertices_ind)))
+    if method == "SSVV":
+        # Voting and curvature estimation for SSVV, using one cell locator
+        # for all vertices:
+        second_pass_batch = partial(
+            sg.gen_curv_vote_batch, poly_surf, radius_hit=radius_hit,
+            locator=sg.build_cell_locator(poly_surf))
+    else:  # vector voting method
+        # Curvature votes collection and estimation for VV:
+        second_pass_batch = partial(
+            sg.second_pass_batch, g_max=g_max, sigma=sigma,
+            page_curvature_formula=page_curvature_formula, a_max=a_max,
+            neighborhoods=neighborhoods)
+    if cores > 1:  # parallel processing
+        results = run_in_pool(
+            second_pass_batch, good_vertices_ind, _CURVATURE_OUTPUTS, cores)
+    else:  # cores == 1, sequential processing
+        results = second_pass_batch(good_vertices_ind)
 
-    if method == "VV":
-        if cores > 1:  # parallel processing
-            p = pp.ProcessPool(cores)
-            print('Opened a pool with {} processes'.format(cores))
-            # results_list has same length as good_vertices_ind
-            # columns: t_1, t_2, kappa_1, kappa_2, gauss_curvature,
-            # mean_curvature, shape_index, curvedness
-            results_list = p.map(partial(
-                second_pass, g_max=g_max, sigma=sigma,
-                page_curvature_formula=page_curvature_formula, a_max=a_max,
-                full_dist_map=full_dist_map),
-                good_vertices_ind)
-            p.close()
-            p.clear()
-
-            results_array = np.array(results_list, dtype=object)
-            t_1_array = results_array[:, 0]
-            t_2_array = results_array[:, 1]
-            kappa_1_array = results_array[:, 2]
-            kappa_2_array = results_array[:, 3]
-            gauss_curvature_array = results_array[:, 4]
-            mean_curvature_array = results_array[:, 5]
-            shape_index_array = results_array[:, 6]
-            curvedness_array = results_array[:, 7]
-
-            # Add the curvature descriptors as properties to the graph:
-            # (v_ind is vertex v index, i is v_ind index in results arrays)
-            for i, v_ind in enumerate(good_vertices_ind):
-                v = vertex(v_ind)
-                add_curvature_descriptors_to_vertex(
-                    v, t_1_array[i], t_2_array[i], kappa_1_array[i],
-                    kappa_2_array[i], gauss_curvature_array[i],
-                    mean_curvature_array[i], shape_index_array[i],
-                    curvedness_array[i])
-
-        else:  # cores == 1, sequential processing
-            # Curvature votes collection and estimation for VV:
-            for i, v_ind in enumerate(good_vertices_ind):
-                B_v = collect_curvature_votes(
-                    v_ind, g_max, sigma,
-                    page_curvature_formula=page_curvature_formula,
-                    a_max=a_max, full_dist_map=full_dist_map)
-                results = estimate_curvature(v_ind, B_v)
-                # Add the properties to the graph:
-                v = vertex(v_ind)
-                add_curvature_descriptors_to_vertex(v, *results)
+    # Add the curvature descriptors as properties to the graph (zeros where
+    # the estimation did not work and for vertices classified as crease or
+    # noise):
+    add_curvature_descriptors_to_vertices(good_vertices_ind, results)
 
     # Transforming the resulting graph to a surface with triangles:
     surface_curv = graph_to_triangle_poly(verbose=False)
@@ -523,3 +602,368 @@ def curvature_estimation(
             f.write("{};{}\n".format(method, duration2))
 
     return sg, surface_curv
+
+
+def curvature_estimation_multiple_methods(
+        radius_hit, methods=['RVV', 'AVV', 'NVV'], graph_file=None,
+        page_curvature_formula=False, area2=True, poly_surf=None,
+        full_dist_map=False, cores=6, runtimes='', vertex_based=False, sg=None,
+        neighborhoods=None, memory_budget=MEMORY_BUDGET):
+    """
+    Runs the second pass of the modified Normal Vector Voting algorithm with
+    several methods, collecting the curvature votes of all vector voting
+    methods (RVV, AVV and NVV, which differ only in the area weighting and the
+    normal curvature formula) in one sweep over the geodesic neighborhoods.
+
+    Args:
+        radius_hit (float): radius in length unit of the graph;
+            it should be chosen to correspond to radius of smallest features of
+            interest on the surface
+        methods (list, optional): all methods to run in the second pass ('VV',
+            'RVV', 'AVV', 'NVV' and 'SSVV' are possible, default is 'RVV',
+            'AVV' and 'NVV')
+        graph_file (string, optional): name of the graph file saved after the
+            first run of the algorithm (see normals_estimation), loaded if sg
+            is None (default None)
+        page_curvature_formula (boolean, optional): if True (default False),
+            normal curvature formula from Page et al. is used by the 'VV'
+            method (see collect_curvature_votes)
+        area2 (boolean, optional): if True (default), votes are weighted by
+            triangle area by the 'VV' method (not possible for vertex-based
+            approach)
+        poly_surf (vtkPolyData): scaled surface from which the graph was
+            generated, (required only for 'SSVV', default None)
+        full_dist_map (boolean, optional): deprecated and ignored, a
+            DeprecationWarning is given if True; memory_budget controls
+            whether the geodesic neighborhoods of all vertices are stored or
+            found on demand
+        cores (int): number of cores to run VV in parallel (default 6)
+        runtimes (str): if given, runtimes and some parameters are added to
+            this file (default '')
+        vertex_based (boolean, optional): if True (default False), curvature is
+            calculated per triangle vertex instead of triangle center.
+        sg (TriangleGraph, PointGraph or FirstPassState): if given (default
+            None), this graph object or the graph of this state returned by
+            normals_estimation will be used instead of loading from the
+            'graph_file' file; the curvatures of the last method are added to
+            it and the other methods get copies of it
+        neighborhoods (NeighborhoodIndex, optional): geodesic neighborhoods of
+            all vertices with g_max derived from radius_hit (only for
+            TriangleGraph); if None (default), they are taken from the
+            FirstPassState or found here
+        memory_budget (int, optional): memory budget in bytes for the geodesic
+            neighborhoods of all vertices of a TriangleGraph; if they are
+            estimated to need more, they are found on demand for each block of
+            vertices (default MEMORY_BUDGET)
+
+    Returns:
+        a dictionary mapping the method name to the tuple of TriangleGraph or
+        PointGraph graph and vtkPolyData surface of triangles with classified
+        orientation and estimated normals or tangents, principle curvatures and
+        directions
+    """
+    _warn_full_dist_map(full_dist_map)
+
+    sg, vertex_based, neighborhoods = _get_first_pass_graph(
+        radius_hit, graph_file, vertex_based, sg, neighborhoods,
+        'curvature_estimation_multiple_methods')
+    if vertex_based:
+        # cannot weight by triangle area in vertex-based approach
+        area2 = False
+
+    vv_methods = [method for method in methods if method != 'SSVV']
+    variants = [_vv_variant(method, page_curvature_formula, area2,
+                            vertex_based) for method in vv_methods]
+
+    # each method gets its own copy of the graph, apart from the last one
+    graphs = {}
+    for i, method in enumerate(methods):
+        if i == len(methods) - 1:
+            graphs[method] = sg
+        else:
+            graphs[method] = _copy_graph(sg)
+
+    results = {}
+    if len(vv_methods) > 0:
+        t_begin2 = time.time()
+        print("\nSecond pass: estimating principle curvatures and directions "
+              "for surface patches using {}...".format(", ".join(
+                [_vv_method_name(*variant) for variant in variants])))
+        g_max = math.pi * radius_hit / 2.0
+        sigma = g_max / 3.0
+        if (sg.__class__.__name__ == "TriangleGraph" and
+                neighborhoods is None):
+            neighborhoods = _find_neighborhoods(
+                sg, g_max, cores, graph_file, memory_budget)
+        if any(variant_area2 for _, variant_area2 in variants):
+            a_max = sg.graph.gp.max_triangle_area
+            print("Maximal triangle area = {}".format(a_max))
+        else:
+            a_max = 0.0
+        # (page_curvature_formula, a_max) for each method:
+        variants_a_max = [(variant_page, a_max if variant_area2 else 0.0)
+                          for variant_page, variant_area2 in variants]
+
+        good_vertices_ind = np.where(sg.graph.vp.orientation_class.a == 1)[0]
+        print("{} vertices to estimate curvature".format(
+            len(good_vertices_ind)))
+        second_pass_batch = partial(
+            sg.second_pass_batch, g_max=g_max, sigma=sigma,
+            neighborhoods=neighborhoods, variants=variants_a_max)
+        if cores > 1:  # parallel processing
+            def flat_second_pass_batch(inds):
+                return {(i, key): array for i, variant_results in enumerate(
+                    second_pass_batch(inds))
+                    for key, array in variant_results.items()}
+            flat_results = run_in_pool(
+                flat_second_pass_batch, good_vertices_ind,
+                {(i, key): output for i in range(len(variants))
+                 for key, output in _CURVATURE_OUTPUTS.items()}, cores)
+            results_list = [{key: flat_results[(i, key)]
+                             for key in _CURVATURE_OUTPUTS}
+                            for i in range(len(variants))]
+        else:  # cores == 1, sequential processing
+            results_list = second_pass_batch(good_vertices_ind)
+
+        for method, method_results in zip(vv_methods, results_list):
+            sg_method = graphs[method]
+            _add_curvature_properties(sg_method)
+            sg_method.add_curvature_descriptors_to_vertices(
+                good_vertices_ind, method_results)
+            # Transforming the resulting graph to a surface with triangles:
+            results[method] = (
+                sg_method, sg_method.graph_to_triangle_poly(verbose=False))
+
+        t_end2 = time.time()
+        duration2 = t_end2 - t_begin2
+        minutes, seconds = divmod(duration2, 60)
+        print('Second run of {} took: {} min {} s'.format(
+            ", ".join(vv_methods), minutes, seconds))
+        # adding to the runtimes CSV file one row per method, as for
+        # curvature_estimation, with the shared duration divided evenly:
+        # - method
+        # - duration2
+        if runtimes != '':
+            with open(runtimes, 'a') as f:
+                for method in vv_methods:
+                    f.write("{};{}\n".format(
+                        method, duration2 / len(vv_methods)))
+
+    if 'SSVV' in methods:
+        results['SSVV'] = curvature_estimation(
+            radius_hit, graph_file=graph_file, method='SSVV',
+            poly_surf=poly_surf, cores=cores, runtimes=runtimes,
+            vertex_based=vertex_based, sg=graphs['SSVV'])
+
+    return {method: results[method] for method in methods}
+
+
+def _warn_full_dist_map(full_dist_map):
+    """
+    Gives a DeprecationWarning if the ignored parameter full_dist_map is True.
+
+    Args:
+        full_dist_map (boolean): value of the parameter given by the caller
+
+    Returns:
+        None
+    """
+    if full_dist_map:
+        warnings.warn(
+            "full_dist_map is deprecated and ignored, memory_budget controls "
+            "whether the geodesic neighborhoods of all vertices are stored or "
+            "found on demand", DeprecationWarning, stacklevel=3)
+
+
+def _get_first_pass_graph(radius_hit, graph_file, vertex_based, sg,
+                          neighborhoods, expr):
+    """
+    Gets the graph after the first pass for the second pass: the given graph,
+    the graph of the given FirstPassState or the graph loaded from the file.
+
+    Args:
+        radius_hit (float): radius in length unit of the graph of the second
+            pass
+        graph_file (str): name of the graph file saved after the first pass,
+            loaded if sg is None
+        vertex_based (boolean): if True, a PointGraph is loaded, otherwise a
+            TriangleGraph
+        sg (TriangleGraph, PointGraph or FirstPassState): graph or state after
+            the first pass, or None
+        neighborhoods (NeighborhoodIndex): geodesic neighborhoods of all
+            vertices or None
+        expr (str): name of the calling function for the error message
+
+    Returns:
+        the graph, vertex_based and the neighborhoods (taken from the state
+        if not given and the state has the same radius_hit)
+    """
+    if isinstance(sg, FirstPassState):
+        if neighborhoods is None and sg.radius_hit == radius_hit:
+            neighborhoods = sg.neighborhoods
+        return sg.sg, sg.vertex_based, neighborhoods
+    if sg is None:
+        if graph_file is None:
+            raise pexceptions.PySegInputError(
+                expr=expr,
+                msg="Either a graph (or the state returned by "
+                    "normals_estimation) or the file of the graph saved after "
+                    "the first pass (graph_file) has to be given.")
+        if vertex_based:
+            sg = PointGraph()
+        else:
+            sg = TriangleGraph()
+        sg.graph = load_graph(graph_file)
+    return sg, vertex_based, neighborhoods
+
+
+def _vv_variant(method, page_curvature_formula=False, area2=True,
+                vertex_based=False):
+    """
+    Gets the options of a vector voting method for the second pass.
+
+    Args:
+        method (str): 'VV', 'RVV', 'AVV' or 'NVV'
+        page_curvature_formula (boolean, optional): normal curvature formula
+            option of 'VV' (default False)
+        area2 (boolean, optional): area weighting option of 'VV' (default True)
+        vertex_based (boolean, optional): if True (default False), the votes
+            cannot be weighted by triangle area
+
+    Returns:
+        a tuple of the page_curvature_formula and area2 options of the method
+    """
+    if method == 'VV':
+        return page_curvature_formula, area2 and not vertex_based
+    elif method == 'RVV':
+        return False, False
+    elif method == 'AVV':
+        if vertex_based:
+            raise pexceptions.PySegInputError(
+                expr='_vv_variant',
+                msg="AVV is not possible for the vertex-based approach.")
+        return False, True
+    elif method == 'NVV':
+        return True, False
+    else:
+        raise pexceptions.PySegInputError(
+            expr='_vv_variant',
+            msg="Method should be 'VV', 'RVV', 'AVV', 'NVV' or 'SSVV'.")
+
+
+def _vv_method_name(page_curvature_formula, area2):
+    """
+    Gets the name of the vector voting method with the given options.
+
+    Args:
+        page_curvature_formula (boolean): normal curvature formula option
+        area2 (boolean): area weighting option
+
+    Returns:
+        'NVV', 'AVV' or 'RVV'
+    """
+    if page_curvature_formula:
+        return 'NVV'
+    elif area2:
+        return 'AVV'
+    else:
+        return 'RVV'
+
+
+def _copy_graph(sg):
+    """
+    Copies a TriangleGraph or PointGraph object together with its graph.
+
+    Args:
+        sg (TriangleGraph or PointGraph): graph to copy
+
+    Returns:
+        the copy of the graph object
+    """
+    sg_copy = copy(sg)
+    sg_copy.graph = sg.graph.copy()
+    return sg_copy
+
+
+def _add_curvature_properties(sg):
+    """
+    Adds the vertex properties to be filled by all curvature methods to the
+    graph.
+
+    Args:
+        sg (TriangleGraph or PointGraph): graph after the first pass
+
+    Returns:
+        None
+    """
+    # vertex properties for storing the estimated principal directions of the
+    # maximal and minimal curvatures of the corresponding triangle:
+    sg.graph.vp.t_1 = sg.graph.new_vertex_property("vector<float>")
+    sg.graph.vp.t_2 = sg.graph.new_vertex_property("vector<float>")
+    # vertex properties for storing the estimated maximal and minimal curvatures
+    # of the corresponding triangle:
+    sg.graph.vp.kappa_1 = sg.graph.new_vertex_property("float")
+    sg.graph.vp.kappa_2 = sg.graph.new_vertex_property("float")
+    # vertex property for storing the Gaussian curvature calculated from kappa_1
+    # and kappa_2 at the corresponding triangle:
+    sg.graph.vp.gauss_curvature_VV = sg.graph.new_vertex_property("float")
+    # vertex property for storing the mean curvature calculated from kappa_1 and
+    # kappa_2 at the corresponding triangle:
+    sg.graph.vp.mean_curvature_VV = sg.graph.new_vertex_property("float")
+    # vertex property for storing the shape index calculated from kappa_1 and
+    # kappa_2 at the corresponding triangle:
+    sg.graph.vp.shape_index_VV = sg.graph.new_vertex_property("float")
+    # vertex property for storing the curvedness calculated from kappa_1 and
+    # kappa_2 at the corresponding triangle:
+    sg.graph.vp.curvedness_VV = sg.graph.new_vertex_property("float")
+
+
+def _find_neighborhoods(sg, g_max, cores=6, graph_file=None,
+                        memory_budget=MEMORY_BUDGET):
+    """
+    Finds the geodesic neighborhoods of all vertices of a TriangleGraph, which
+    are used by both passes of the algorithm.
+
+    If a graph file is given, the neighborhoods are saved next to it and
+    loaded from there in later runs, as long as the graph topology, its edge
+    distances and g_max stay the same. If the neighborhoods are estimated to
+    need more memory than the budget, they are not stored, but found on demand
+    for each block of vertices by the passes.
+
+    Args:
+        sg (TriangleGraph): triangle graph generated from a surface of interest
+        g_max (float): maximal geodesic distance in units of the graph
+        cores (int, optional): number of processes to find the neighborhoods
+            in parallel (default 6)
+        graph_file (str, optional): file path of the graph, next to which the
+            neighborhoods are saved; not saved if None (default) or for a
+            temporary graph file 'temp.gt'
+        memory_budget (int, optional): memory budget in bytes for the geodesic
+            neighborhoods of all vertices of a TriangleGraph; if they are
+            estimated to need more, they are found on demand for each block of
+            vertices (default MEMORY_BUDGET)
+
+    Returns:
+        a NeighborhoodIndex object or None if the neighborhoods are found on
+        demand
+    """
+    if graph_file == 'temp.gt':
+        graph_file = None
+    if graph_file is not None:
+        key = NeighborhoodIndex.graph_key(sg, g_max)
+        neighborhoods = NeighborhoodIndex.load(graph_file, key, g_max)
+        if neighborhoods is not None:
+            print("\nLoaded the geodesic neighborhoods saved for {}".format(
+                graph_file))
+            return neighborhoods
+
+    nbytes = NeighborhoodIndex.estimate_nbytes(sg, g_max)
+    if nbytes > memory_budget:
+        print("\nThe geodesic neighborhoods would need about {} MB, more "
+              "than the budget of {} MB, they will be found on demand".format(
+                nbytes // 1024 ** 2, memory_budget // 1024 ** 2))
+        return None
+    neighborhoods = NeighborhoodIndex.from_graph(sg, g_max, cores=cores)
+    if graph_file is not None:
+        neighborhoods.save(graph_file, key)
+    return neighborhoods
@@ -0,0 +1,191 @@
+import multiprocessing
+import numpy as np
+
+"""
+Contains functions running the normal vector voting passes on blocks of
+vertices in a pool of forked worker processes.
+
+The functions to run and the graph they use are published to the workers
+through fork copy-on-write, so only the block positions are sent with each
+task.
+
+Author: Maria Salfer (Max Planck Institute for Biochemistry)
+"""
+
+__author__ = 'Maria Salfer'
+
+
+# State published to the worker processes of run_in_pool and map_in_pool: the
+# processes are forked after it is set, so they inherit the graph and the
+# shared result arrays copy-on-write instead of receiving them pickled with
+# every task.
+_pool_state = {}
+
+
+def run_in_pool(func, vertex_inds, outputs, cores, blocks_per_core=4):
+    """
+    Runs a function on blocks of vertices in a pool of forked worker
+    processes, which write the results into shared arrays.
+
+    Args:
+        func (callable): function getting an array of vertex indices and
+            returning a dictionary of result arrays for these vertices
+        vertex_inds (numpy.ndarray): indices of all vertices to process
+        outputs (dict): maps each key of the results to a tuple of the shape
+            of the result per vertex and its numpy dtype
+        cores (int): number of worker processes
+        blocks_per_core (int, optional): number of vertex blocks per process,
+            to balance the load (default 4)
+
+    Returns:
+        a dictionary mapping the keys of outputs to the result arrays for all
+        vertices
+    """
+    if 'fork' not in multiprocessing.get_all_start_methods():
+        print("Forking worker processes is not supported on this platform, "
+              "running sequentially")
+        return func(vertex_inds)
+
+    ctx = multiprocessing.get_context('fork')
+    num_vertices = len(vertex_inds)
+    shared = {}
+    for key, (shape, dtype) in outputs.items():
+        dtype = np.dtype(dtype)
+        size = num_vertices * int(np.prod(shape))
+        shared[key] = (
+            ctx.RawArray(np.ctypeslib.as_ctypes_type(dtype), max(size, 1)),
+            (num_vertices,) + tuple(shape), dtype)
+
+    blocks = _split_blocks(num_vertices, cores * blocks_per_core)
+
+    _pool_state['func'] = func
+    _pool_state['vertex_inds'] = vertex_inds
+    _pool_state['shared'] = shared
+    try:
+        with ctx.Pool(cores, initializer=_init_pool_worker) as pool:
+            print('Opened a pool with {} processes'.format(cores))
+            for _ in pool.imap_unordered(_run_pool_task, blocks):
+                pass
+        results = {key: array.copy()
+                   for key, array in _shared_to_arrays(shared).items()}
+    finally:
+        _pool_state.clear()
+    return results
+
+
+def map_in_pool(func, vertex_inds, cores, blocks_per_core=4):
+    """
+    Runs a function on blocks of vertices in a pool of forked worker
+    processes and collects the results of all blocks, e.g. when their size is
+    not known in advance.
+
+    Args:
+        func (callable): function getting an array of vertex indices and
+            returning a (picklable) result for these vertices
+        vertex_inds (numpy.ndarray): indices of all vertices to process
+        cores (int): number of worker processes
+        blocks_per_core (int, optional): number of vertex blocks per process,
+            to balance the load (default 4)
+
+    Returns:
+        a list of the results of the consecutive blocks of vertices
+    """
+    blocks = _split_blocks(len(vertex_inds), cores * blocks_per_core)
+    if 'fork' not in multiprocessing.get_all_start_methods():
+        print("Forking worker processes is not supported on this platform, "
+              "running sequentially")
+        return [func(vertex_inds[start:stop]) for start, stop in blocks]
+
+    ctx = multiprocessing.get_context('fork')
+    _pool_state['func'] = func
+    _pool_state['vertex_inds'] = vertex_inds
+    try:
+        with ctx.Pool(cores) as pool:
+            print('Opened a pool with {} processes'.format(cores))
+            results_list = pool.map(_map_pool_task, blocks, chunksize=1)
+    finally:
+        _pool_state.clear()
+    return results_list
+
+
+def _split_blocks(num_vertices, num_blocks):
+    """
+    Splits positions of vertices into consecutive blocks of nearly equal
+    sizes.
+
+    Args:
+        num_vertices (int): number of vertices
+        num_blocks (int): wanted number of blocks
+
+    Returns:
+        a list of tuples of the start and stop positions of the non-empty
+        blocks
+    """
+    num_blocks = max(1, min(num_vertices, num_blocks))
+    bounds = np.linspace(0, num_vertices, num_blocks + 1).astype(int)
+    return [(int(start), int(stop)) for start, stop in
+            zip(bounds[:-1], bounds[1:]) if stop > start]
+
+
+def _shared_to_arrays(shared):
+    """
+    Wraps shared memory arrays created by run_in_pool as numpy arrays.
+
+    Args:
+        shared (dict): maps each result key to a tuple of the shared array,
+            the full shape and the numpy dtype
+
+    Returns:
+        a dictionary mapping the result keys to numpy arrays (views of the
+        shared memory)
+    """
+    arrays = {}
+    for key, (raw_array, shape, dtype) in shared.items():
+        size = int(np.prod(shape))
+        arrays[key] = np.frombuffer(raw_array, dtype=dtype)[:size].reshape(
+            shape)
+    return arrays
+
+
+def _init_pool_worker():
+    """
+    Initializes a worker process of run_in_pool, wrapping the inherited
+    shared result arrays as numpy arrays once per process.
+
+    Returns:
+        None
+    """
+    _pool_state['arrays'] = _shared_to_arrays(_pool_state['shared'])
+
+
+def _run_pool_task(block):
+    """
+    Processes a block of vertices in a worker process of run_in_pool and
+    writes the results into the shared arrays.
+
+    Args:
+        block (tuple): start and stop positions of the block in the vertex
+            indices array
+
+    Returns:
+        None
+    """
+    start, stop = block
+    results = _pool_state['func'](_pool_state['vertex_inds'][start:stop])
+    for key, array in _pool_state['arrays'].items():
+        array[start:stop] = results[key]
+
+
+def _map_pool_task(block):
+    """
+    Processes a block of vertices in a worker process of map_in_pool.
+
+    Args:
+        block (tuple): start and stop positions of the block in the vertex
+            indices array
+
+    Returns:
+        the result of the function for the block
+    """
+    start, stop = block
+    return _pool_state['func'](_pool_state['vertex_inds'][start:stop])
@@ -14,7 +14,8 @@ from functools import partial
 
 from pycurv import (
     pexceptions, normals_directions_and_curvature_estimation, run_gen_surface,
-    TriangleGraph, PointGraph, curvature_estimation, merge_vtp_files,
+    TriangleGraph, PointGraph, curvature_estimation,
+    curvature_estimation_multiple_methods, merge_vtp_files,
     split_segmentation, MAX_DIST_SURF, THRESH_SIGMA1)
 from pycurv import pycurv_io as io
 
@@ -267,20 +268,20 @@ def new_workflow(
         print('The graph has {} vertices and {} edges'.format(
             tg.graph.num_vertices(), tg.graph.num_edges()))
 
-        # Remove the wrong borders (surface generation artefact)
-        if remove_wrong_borders:
-            b = MAX_DIST_SURF  # "padding" from masking in surface generation
-            print('\nFinding triangles that are {} pixels to surface borders...'
-                  .format(b))
-            tg.find_vertices_near_border(b * pixel_size, purge=True)
-            print('The graph has {} vertices and {} edges'.format(
-                tg.graph.num_vertices(), tg.graph.num_edges()))
-
-        # Filter out possibly occurring small disconnected fragments
-        if min_component > 0:
-            print('\nFinding small connected components of the graph...')
-            tg.find_small_connected_components(
-                threshold=min_component, purge=True, verbose=True)
+        # Remove the wrong borders (surface generation artefact) and filter
+        # out possibly occurring small disconnected fragments, purging the
+        # graph only once
+        if remove_wrong_borders or min_component > 0:
+            b = None
+            if remove_wrong_borders:
+                # "padding" from masking in surface generation
+                b = MAX_DIST_SURF
+                print('\nFinding triangles that are {} pixels to surface '
+                      'borders...'.format(b))
+                b *= pixel_size
+            if min_component > 0:
+                print('\nFinding small connected components of the graph...')
+            tg.clean(b=b, min_component=min_component, verbose=True)
             print('The graph has {} vertices and {} edges'.format(
                 tg.graph.num_vertices(), tg.graph.num_edges()))
 
@@ -317,12 +318,10 @@ def new_workflow(
         if runtimes != '':
             with open(runtimes, 'w') as f:
                 f.write("method;duration2\n")
-        for method in methods:
-            tg_curv, surface_curv = curvature_estimation(
-                radius_hit, graph_file=gt_file1, method=method,
-                page_curvature_formula=page_curvature_formula, area2=area2,
-                poly_surf=surf_clean, cores=cores, runtimes=runtimes)
-            method_tg_surf_dict[method] = (tg_curv, surface_curv)
+        method_tg_surf_dict = curvature_estimation_multiple_methods(
+            radius_hit, methods=methods, graph_file=gt_file1,
+            page_curvature_formula=page_curvature_formula, area2=area2,
+            poly_surf=surf_clean, cores=cores, runtimes=runtimes)
 
     if only_normals is False:  # Saving the output (graph and surface objects)
         # for later filtering or inspection in ParaView:
@@ -718,7 +717,7 @@ def from_vtk_workflow(
         if not vertex_based:
             triangle_graph_file = base_filename + ".gt"
             if not isfile(triangle_graph_file):
-                # uses TriangleGraph's point_in_cells and triangle_cell_ids
+                # uses TriangleGraph's triangle_cell_ids
                 print('\nBuilding a triangle graph from the surface...')
                 tg = TriangleGraph()
                 tg.build_graph_from_vtk_surface(
@@ -761,12 +760,10 @@ def from_vtk_workflow(
             graph_file=normals_graph_file)
     else:
         # Estimate directions and curvatures using the graph file with normals:
-        for method in methods:
-            sg_curv, surface_curv = curvature_estimation(
-                radius_hit, graph_file=normals_graph_file, method=method,
-                page_curvature_formula=page_curvature_formula, area2=area2,
-                poly_surf=surf, cores=cores, vertex_based=vertex_based)
-            method_tg_surf_dict[method] = (sg_curv, surface_curv)
+        method_tg_surf_dict = curvature_estimation_multiple_methods(
+            radius_hit, methods=methods, graph_file=normals_graph_file,
+            page_curvature_formula=page_curvature_formula, area2=area2,
+            poly_surf=surf, cores=cores, vertex_based=vertex_based)
 
     for method in list(method_tg_surf_dict.keys()):
         # Saving the output (TriangleGraph object) for later inspection in
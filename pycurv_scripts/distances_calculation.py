@@ -80,8 +80,7 @@ def generate_mem1_mem2_graphs_and_surface(
     mem1_tg.build_graph_from_vtk_surface(mem1_surface, scale)
     print('The raw {} graph has {} vertices and {} edges'.format(
             mem1, mem1_tg.graph.num_vertices(), mem1_tg.graph.num_edges()))
-    mem1_tg.find_vertices_near_border(
-        MAX_DIST_SURF * pixel_size, purge=True)
+    mem1_tg.clean(b=MAX_DIST_SURF * pixel_size)
     print('The cleaned {} graph has {} vertices and {} edges'.format(
             mem1, mem1_tg.graph.num_vertices(), mem1_tg.graph.num_edges()))
     if mem1_tg.graph.num_vertices() == 0:
@@ -91,8 +90,7 @@ def generate_mem1_mem2_graphs_and_surface(
     mem2_tg.build_graph_from_vtk_surface(mem2_surface, scale)
     print('The raw {} graph has {} vertices and {} edges'.format(
             mem2, mem2_tg.graph.num_vertices(), mem2_tg.graph.num_edges()))
-    mem2_tg.find_vertices_near_border(
-        MAX_DIST_SURF * pixel_size, purge=True)
+    mem2_tg.clean(b=MAX_DIST_SURF * pixel_size)
     print('The cleaned {} graph has {} vertices and {} edges'.format(
             mem2, mem2_tg.graph.num_vertices(), mem2_tg.graph.num_edges()))
     if mem2_tg.graph.num_vertices() == 0:
@@ -10,6 +10,12 @@ from the Mindboggle and FreeSurfer packages using the synthetic surfaces
 - unit testing of histogram area calculation used for the choice of the best
 neighborhood parameter
 - unit testing of some linear algebra functions
+- unit testing of the vectorized vote collection functions
+- unit testing of the geodesic neighborhoods index
+- unit testing of the bounded shortest distances search
+- unit testing of the indexed priority queue
+- unit testing of the array-based triangle mesh functions
+- unit testing of the mapping of vertex coordinates to vertex indices
 """
 
 from .synthetic_volumes import *
@@ -22,3 +28,9 @@ from .visualization import *
 from .test_distances_calculation import *
 from .test_histogram_area_calculation import *
 from .test_linalg import *
+from .test_batch_voting import *
+from .test_neighborhoods import *
+from .test_bounded_dijkstra import *
+from .test_indexed_heap import *
+from .test_triangle_mesh import *
+from .test_coordinates_index import *
@@ -0,0 +1,228 @@
+import numpy as np
+import math
+import pytest
+
+from pycurv import (segment_sum, collect_normal_votes_csr,
+                    collect_curvature_votes_variants_csr,
+                    collect_curvature_votes_csr, estimate_normals_batch,
+                    estimate_curvatures_batch, nice_acos, signum)
+
+"""
+Unit tests for testing the vectorized vote collection functions against the
+per-neighbor calculations.
+
+Author: Maria Salfer (Max Planck Institute for Biochemistry)
+"""
+
+__author__ = 'Maria Salfer'
+
+
+def test_segment_sum():
+    """
+    Tests summing up rows within CSR segments, including empty segments.
+
+    Returns:
+        None
+    """
+    values = np.arange(12, dtype=float).reshape(6, 2)
+    indptr = np.array([0, 2, 2, 5, 6, 6])
+    sums = segment_sum(values, indptr)
+    true_sums = np.array([[2, 4], [0, 0], [18, 21], [10, 11], [0, 0]])
+    assert np.allclose(sums, true_sums)
+
+
+def test_collect_normal_votes_csr():
+    """
+    Tests the vectorized normal votes collection against the per-neighbor
+    calculation of TriangleGraph.collect_normal_votes.
+
+    Returns:
+        None
+    """
+    rand = np.random.RandomState(0)
+    num_v = 20
+    xyz = rand.rand(num_v, 3) * 10
+    normals = rand.rand(num_v, 3) - 0.5
+    normals /= np.linalg.norm(normals, axis=1)[:, np.newaxis]
+    areas = rand.rand(num_v) + 0.1
+    a_max = areas.max()
+    sigma = 2.0
+    v_inds = np.array([0, 5, 7])
+    # the second vertex has no neighbors:
+    neighbors = [np.array([1, 2, 3]), np.array([], dtype=int),
+                 np.array([4, 8, 9, 10])]
+    indptr = np.concatenate([[0], np.cumsum([len(n) for n in neighbors])])
+    ids = np.concatenate(neighbors)
+    dists = rand.rand(len(ids)) * 5
+
+    num_neighbors, V_vs = collect_normal_votes_csr(
+        xyz[v_inds], indptr, ids, dists, xyz, normals, areas, a_max, sigma)
+
+    assert np.array_equal(num_neighbors, [3, 0, 4])
+    for i, v_ind in enumerate(v_inds):
+        V_v = np.zeros(shape=(3, 3))
+        for k in range(indptr[i], indptr[i + 1]):
+            c_i = ids[k]
+            vc_i = xyz[c_i] - xyz[v_ind]
+            vc_i_len = np.sqrt(np.dot(vc_i, vc_i))
+            cos_theta_i = - (np.dot(normals[c_i], vc_i)) / vc_i_len
+            n_i = normals[c_i] + 2 * cos_theta_i * vc_i / vc_i_len
+            w_i = areas[c_i] / a_max * np.exp(- dists[k] / sigma)
+            V_v += w_i * np.multiply.outer(n_i, n_i)
+        assert np.allclose(V_vs[i], V_v)
+
+
+@pytest.mark.parametrize("page_curvature_formula,a_max", [
+    (False, 0.0), (False, 1.0), (True, 0.0)])
+def test_collect_curvature_votes_csr(page_curvature_formula, a_max):
+    """
+    Tests the vectorized curvature votes collection against the per-neighbor
+    calculation of SurfaceGraph.collect_curvature_votes for the RVV, AVV and
+    NVV formulas.
+
+    Args:
+        page_curvature_formula (boolean): if True, normal curvature formula
+            from Page et al. is used, otherwise the one from Tong and Tang
+        a_max (float): if > 0, votes are weighted by triangle area
+
+    Returns:
+        None
+    """
+    rand = np.random.RandomState(1)
+    num_v = 20
+    xyz = rand.rand(num_v, 3) * 10
+    n_vs = rand.rand(num_v, 3) - 0.5
+    n_vs /= np.linalg.norm(n_vs, axis=1)[:, np.newaxis]
+    areas = rand.rand(num_v) + 0.1
+    sigma = 2.0
+    v_inds = np.array([0, 5, 7])
+    # the second vertex has no neighbors:
+    neighbors = [np.array([1, 2, 3]), np.array([], dtype=int),
+                 np.array([4, 8, 9, 10])]
+    indptr = np.concatenate([[0], np.cumsum([len(n) for n in neighbors])])
+    ids = np.concatenate(neighbors)
+    dists = rand.rand(len(ids)) * 5 + 0.1
+
+    num_neighbors, B_vs = collect_curvature_votes_csr(
+        xyz[v_inds], n_vs[v_inds], indptr, ids, dists, xyz, n_vs, sigma,
+        page_curvature_formula=page_curvature_formula, areas=areas,
+        a_max=a_max)
+
+    assert np.array_equal(num_neighbors, [3, 0, 4])
+    assert np.all(np.isnan(B_vs[1]))
+    for i in [0, 2]:
+        v = xyz[v_inds[i]]
+        n_v = n_vs[v_inds[i]]
+        B_v = np.zeros(shape=(3, 3))
+        all_w_i = []
+        for k in range(indptr[i], indptr[i + 1]):
+            w_i = math.exp(- dists[k] / sigma)
+            if a_max > 0:
+                w_i *= areas[ids[k]] / a_max
+            all_w_i.append(w_i)
+            vv_i = xyz[ids[k]] - v
+            t_i = vv_i - np.dot(n_v, vv_i) * n_v
+            t_i = t_i / math.sqrt(np.dot(t_i, t_i))
+            p_i = np.cross(n_v, t_i)
+            n_v_i = n_vs[ids[k]]
+            n_v_i_p = n_v_i - np.dot(p_i, n_v_i) * p_i
+            cos_phi = float(np.dot(n_v, n_v_i_p) /
+                            math.sqrt(np.dot(n_v_i_p, n_v_i_p)))
+            phi = nice_acos(cos_phi)
+            if page_curvature_formula:
+                kappa_i = phi / dists[k]
+            else:
+                kappa_i = abs(2 * math.cos((math.pi - phi) / 2) /
+                              math.sqrt(np.dot(vv_i, vv_i)))
+                kappa_i *= -1 * signum(np.dot(t_i, n_v_i_p))
+            B_v += w_i * kappa_i * np.multiply.outer(t_i, t_i)
+        factor = 2 * math.pi / np.sum(all_w_i)
+        B_v *= factor / (2 * math.pi)
+        assert np.allclose(B_vs[i], B_v)
+
+
+def test_collect_curvature_votes_variants_csr():
+    """
+    Tests that the curvature votes of the RVV, AVV and NVV variants collected
+    in one sweep equal the votes collected separately for each variant.
+
+    Returns:
+        None
+    """
+    rand = np.random.RandomState(2)
+    num_v = 20
+    xyz = rand.rand(num_v, 3) * 10
+    n_vs = rand.rand(num_v, 3) - 0.5
+    n_vs /= np.linalg.norm(n_vs, axis=1)[:, np.newaxis]
+    areas = rand.rand(num_v) + 0.1
+    sigma = 2.0
+    v_inds = np.array([0, 5, 7])
+    neighbors = [np.array([1, 2, 3]), np.array([], dtype=int),
+                 np.array([4, 8, 9, 10])]
+    indptr = np.concatenate([[0], np.cumsum([len(n) for n in neighbors])])
+    ids = np.concatenate(neighbors)
+    dists = rand.rand(len(ids)) * 5 + 0.1
+    variants = [(False, 0.0), (False, 1.1), (True, 0.0)]
+
+    num_neighbors, B_vs_list = collect_curvature_votes_variants_csr(
+        xyz[v_inds], n_vs[v_inds], indptr, ids, dists, xyz, n_vs, sigma,
+        variants, areas=areas)
+
+    assert len(B_vs_list) == len(variants)
+    for (page_curvature_formula, a_max), B_vs in zip(variants, B_vs_list):
+        num_neighbors_single, B_vs_single = collect_curvature_votes_csr(
+            xyz[v_inds], n_vs[v_inds], indptr, ids, dists, xyz, n_vs, sigma,
+            page_curvature_formula=page_curvature_formula, areas=areas,
+            a_max=a_max)
+        assert np.array_equal(num_neighbors, num_neighbors_single)
+        assert np.allclose(B_vs, B_vs_single, equal_nan=True)
+
+
+def test_estimate_normals_batch():
+    """
+    Tests the stacked orientation classification and normals estimation.
+
+    Returns:
+        None
+    """
+    normals = np.array([[0, 0, 1], [0, 0, -1], [1, 0, 0]], dtype=float)
+    V_vs = np.array([np.diag([0.1, 0.2, 5.0]),  # surface patch
+                     np.diag([0.1, 0.2, 5.0]),  # surface patch, flipped
+                     np.diag([0.1, 4.0, 5.0])])  # crease junction
+    classes, n_vs, t_vs = estimate_normals_batch(V_vs, normals, epsilon=2)
+    assert np.array_equal(classes, [1, 1, 2])
+    assert np.allclose(n_vs, [[0, 0, 1], [0, 0, -1], [0, 0, 0]])
+    assert np.allclose(np.abs(t_vs), [[0, 0, 0], [0, 0, 0], [1, 0, 0]])
+
+
+def test_estimate_curvatures_batch():
+    """
+    Tests the stacked principal directions and curvatures estimation,
+    including the matching of an eigenvector to the normal and the ignored
+    vertices.
+
+    Returns:
+        None
+    """
+    n_v = np.array([0, 0, 1.0])
+    e_x = np.array([1.0, 0, 0])
+    e_y = np.array([0, 1.0, 0])
+
+    def tensor(b_1, b_2):
+        return b_1 * np.outer(e_x, e_x) + b_2 * np.outer(e_y, e_y)
+
+    B_vs = np.array([tensor(0.3, 0.1),  # normal has the smallest eigenvalue
+                     tensor(0.2, -0.1),  # normal has the middle eigenvalue
+                     np.full((3, 3), np.nan)])  # ignored vertex
+    n_vs = np.array([n_v, n_v, n_v])
+    results = estimate_curvatures_batch(B_vs, n_vs)
+    assert np.array_equal(results['valid'], [True, True, False])
+    assert np.allclose(results['kappa_1'], [0.8, 0.7, 0])
+    assert np.allclose(results['kappa_2'], [0.0, -0.5, 0])
+    assert np.allclose(np.abs(results['t_1'][:2]), [e_x, e_x])
+    assert np.allclose(np.abs(results['t_2'][:2]), [e_y, e_y])
+    assert np.allclose(results['gauss_curvature'], [0, -0.35, 0])
+    assert np.allclose(results['mean_curvature'], [0.4, 0.1, 0])
+    assert np.allclose(results['shape_index'][1],
+                       2 / math.pi * math.atan(0.2 / 1.2))
+    assert results['shape_index'][2] == 0
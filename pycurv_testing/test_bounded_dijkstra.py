@@ -0,0 +1,64 @@
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra
+
+from pycurv import BoundedDijkstra
+
+"""
+Unit tests for the shortest distances search bounded to a maximal distance.
+
+Author: Maria Salfer (Max Planck Institute for Biochemistry)
+"""
+
+__author__ = 'Maria Salfer'
+
+
+def _grid_graph(size=15):
+    """
+    Generates a triangulated grid on a bumpy surface.
+
+    Args:
+        size (int, optional): number of vertices along each side (default 15)
+
+    Returns:
+        vertex coordinates and edges (rows of source, target and distance)
+    """
+    x, y = np.meshgrid(np.arange(size), np.arange(size), indexing='ij')
+    xyz = np.column_stack([x.ravel(), y.ravel(),
+                           np.sin(x.ravel() / 2.0)]).astype(np.float32)
+    inds = np.arange(size * size).reshape(size, size)
+    pairs = np.concatenate([
+        np.column_stack([inds[:-1, :].ravel(), inds[1:, :].ravel()]),
+        np.column_stack([inds[:, :-1].ravel(), inds[:, 1:].ravel()]),
+        np.column_stack([inds[:-1, :-1].ravel(), inds[1:, 1:].ravel()])])
+    dists = np.linalg.norm(xyz[pairs[:, 0]] - xyz[pairs[:, 1]], axis=1)
+    return xyz, np.column_stack([pairs, dists])
+
+
+def test_bounded_dijkstra_search():
+    """
+    Tests that the bounded search finds the same vertices and distances as
+    Dijkstra's algorithm on the whole graph.
+
+    Returns:
+        None
+    """
+    xyz, edges = _grid_graph()
+    num_v = len(xyz)
+    full = csr_matrix((edges[:, 2], (edges[:, 0].astype(int),
+                                     edges[:, 1].astype(int))),
+                      shape=(num_v, num_v))
+    bounded_dijkstra = BoundedDijkstra(xyz, edges)
+    for source in [0, 17, 112]:
+        for max_dist in [1.5, 4.0]:
+            ids, dists = bounded_dijkstra.search(source, max_dist)
+            true_dists = dijkstra(full, directed=False, indices=source,
+                                  limit=max_dist)
+            true_ids = np.where(np.isfinite(true_dists))[0]
+            assert np.array_equal(ids, true_ids)
+            assert np.allclose(dists, true_dists[true_ids])
+
+    true_dists = dijkstra(full, directed=False, indices=[3, 50])
+    assert np.allclose(bounded_dijkstra.distances_from([3, 50]), true_dists)
+    assert np.allclose(bounded_dijkstra.distances_from_nearest([3, 50]),
+                       true_dists.min(axis=0))
@@ -0,0 +1,45 @@
+import numpy as np
+
+from pycurv import CoordinatesIndex
+
+"""
+Unit tests for the mapping of vertex coordinates to vertex indices.
+
+Author: Maria Salfer (Max Planck Institute for Biochemistry)
+"""
+
+__author__ = 'Maria Salfer'
+
+
+def test_coordinates_index():
+    """
+    Tests that single and batch lookups of coordinates give the same vertex
+    indices as a dictionary, including coordinates added like to a dictionary
+    and coordinates that are not in the index.
+
+    Returns:
+        None
+    """
+    rand = np.random.RandomState(0)
+    xyz = rand.randint(0, 20, size=(300, 3)) * 1.5
+    xyz = np.unique(xyz, axis=0)
+    rand.shuffle(xyz)
+    expected = dict(zip(map(tuple, xyz.tolist()), range(len(xyz))))
+    index = CoordinatesIndex(xyz)
+    index[(100.0, 100.0, 100.0)] = len(xyz)
+    expected[(100.0, 100.0, 100.0)] = len(xyz)
+    assert len(index) == len(expected)
+    assert set(index) == set(expected)
+
+    for coordinates, vertex_index in expected.items():
+        assert coordinates in index
+        assert index[coordinates] == vertex_index
+    missing = (0.5, 0.0, 0.0)
+    assert missing not in index
+    assert index.get(missing, -1) == -1
+
+    queries = np.vstack([np.array(list(expected.keys())), [missing]])
+    assert np.array_equal(index.lookup(queries),
+                          list(expected.values()) + [-1])
+    assert np.array_equal(CoordinatesIndex().lookup(queries),
+                          np.full(len(queries), -1))
@@ -0,0 +1,40 @@
+import numpy as np
+
+from pycurv import IndexedHeap
+
+"""
+Unit tests for the indexed priority queue used by the fast marching algorithm.
+
+Author: Maria Salfer (Max Planck Institute for Biochemistry)
+"""
+
+__author__ = 'Maria Salfer'
+
+
+def test_indexed_heap():
+    """
+    Tests that items are popped in the order of their last keys after random
+    pushes and key decreases, equal keys in the order of the last update.
+
+    Returns:
+        None
+    """
+    rand = np.random.RandomState(0)
+    heap = IndexedHeap()
+    keys = {}
+    updates = {}
+    for count in range(500):
+        item = int(rand.randint(100))
+        key = float(rand.randint(50))
+        if item not in keys or key < keys[item]:
+            heap.push(item, key)
+            keys[item] = key
+            updates[item] = count
+    assert len(heap) == len(keys)
+    assert 5 in heap or 5 not in keys
+
+    popped = []
+    while len(heap) > 0:
+        popped.append(heap.pop())
+    assert popped == sorted([(key, item) for item, key in keys.items()],
+                            key=lambda pair: (pair[0], updates[pair[1]]))
@@ -0,0 +1,95 @@
+import numpy as np
+
+from pycurv import NeighborhoodIndex
+
+"""
+Unit tests for testing the index of geodesic neighborhoods.
+
+Author: Maria Salfer (Max Planck Institute for Biochemistry)
+"""
+
+__author__ = 'Maria Salfer'
+
+
+def test_neighborhood_index_block():
+    """
+    Tests getting the neighborhoods of a block of vertices from the index,
+    with and without a vertex mask.
+
+    Returns:
+        None
+    """
+    # 4 vertices, vertex 2 has no neighbors:
+    indptr = np.array([0, 2, 5, 5, 7])
+    ids = np.array([1, 3, 0, 2, 3, 0, 1])
+    dists = np.array([1.0, 2.0, 1.0, 1.5, 2.5, 2.0, 2.5])
+    index = NeighborhoodIndex(indptr, ids, dists, g_max=3)
+    assert np.array_equal(index.num_neighbors, [2, 3, 0, 2])
+
+    block_indptr, block_ids, block_dists = index.block(np.array([3, 2, 1]))
+    assert np.array_equal(block_indptr, [0, 2, 2, 5])
+    assert np.array_equal(block_ids, [0, 1, 0, 2, 3])
+    assert np.allclose(block_dists, [2.0, 2.5, 1.0, 1.5, 2.5])
+    assert block_dists.dtype == np.float64
+
+    vertex_mask = np.array([True, False, True, True])
+    block_indptr, block_ids, block_dists = index.block(
+        np.array([3, 2, 1]), vertex_mask=vertex_mask)
+    assert np.array_equal(block_indptr, [0, 1, 1, 4])
+    assert np.array_equal(block_ids, [0, 0, 2, 3])
+    assert np.allclose(block_dists, [2.0, 1.0, 1.5, 2.5])
+
+
+def test_neighborhood_index_threshold():
+    """
+    Tests deriving the neighborhoods for a smaller maximal geodesic distance.
+
+    Returns:
+        None
+    """
+    indptr = np.array([0, 2, 5, 5, 7])
+    ids = np.array([1, 3, 0, 2, 3, 0, 1])
+    dists = np.array([1.0, 2.0, 1.0, 1.5, 2.5, 2.0, 2.5])
+    index = NeighborhoodIndex(indptr, ids, dists, g_max=3)
+    assert index.threshold(3) is index
+
+    small_index = index.threshold(2)
+    assert small_index.g_max == 2
+    assert np.array_equal(small_index.indptr, [0, 2, 4, 4, 5])
+    assert np.array_equal(small_index.ids, [1, 3, 0, 2, 0])
+    assert np.allclose(small_index.dists, [1.0, 2.0, 1.0, 1.5, 2.0])
+
+    # a distance just above g_max, which would round to g_max as float32:
+    index = NeighborhoodIndex([0, 1], [1], [0.1 + 1e-9], g_max=1)
+    assert index.threshold(0.1).num_neighbors[0] == 0
+
+
+def test_neighborhood_index_save_load(tmpdir):
+    """
+    Tests saving and loading the neighborhoods next to a graph file, keeping
+    the neighborhoods of other maximal geodesic distances.
+
+    Returns:
+        None
+    """
+    # a directory name which is a glob pattern:
+    graph_file = str(tmpdir.mkdir("surface[1]").join("surface.gt"))
+    indptr = np.array([0, 2, 5, 5, 7])
+    ids = np.array([1, 3, 0, 2, 3, 0, 1])
+    dists = np.array([1.0, 2.0, 1.0, 1.5, 2.5, 2.0, 2.5])
+    NeighborhoodIndex(indptr, ids, dists, g_max=3).save(graph_file, "a")
+    small_index = NeighborhoodIndex(indptr, ids, dists, g_max=3).threshold(2)
+    small_index.save(graph_file, "b")
+
+    index = NeighborhoodIndex.load(graph_file, "a", g_max=3)
+    assert np.array_equal(index.indptr, indptr)
+    assert np.array_equal(index.ids, ids)
+    assert np.allclose(index.dists, dists)
+    assert NeighborhoodIndex.load(graph_file, "b", g_max=2) is not None
+    assert NeighborhoodIndex.load(graph_file, "b", g_max=3) is None
+
+    # the neighborhoods of a changed graph replace the stale ones:
+    NeighborhoodIndex(indptr, ids, dists, g_max=3).save(graph_file, "c")
+    assert NeighborhoodIndex.load(graph_file, "a", g_max=3) is None
+    assert NeighborhoodIndex.load(graph_file, "c", g_max=3) is not None
+    assert NeighborhoodIndex.load(graph_file, "b", g_max=2) is not None
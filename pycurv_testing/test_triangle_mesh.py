@@ -0,0 +1,92 @@
+import vtk
+import numpy as np
+from itertools import combinations
+
+from pycurv import (get_triangle_point_ids, merge_duplicated_points,
+                    find_triangle_neighbors, find_unique_edges,
+                    find_point_triangles, extract_polygons, triangle_areas,
+                    triangle_normals)
+
+"""
+Unit tests for the array-based triangle mesh functions used to build the
+surface graphs.
+
+Author: Maria Salfer (Max Planck Institute for Biochemistry)
+"""
+
+__author__ = 'Maria Salfer'
+
+
+def test_triangle_mesh_arrays():
+    """
+    Tests the triangles, their areas, normals, neighbors, edges and the
+    triangles of each point extracted from a sphere surface against the VTK
+    triangle cells and brute-force searches.
+
+    Returns:
+        None
+    """
+    sphere = vtk.vtkSphereSource()
+    sphere.SetThetaResolution(12)
+    sphere.SetPhiResolution(8)
+    sphere.Update()
+    # give each triangle its own points, duplicating the shared points
+    surface = vtk.vtkPolyData()
+    surface.SetPoints(vtk.vtkPoints())
+    surface.SetPolys(vtk.vtkCellArray())
+    for i in range(sphere.GetOutput().GetNumberOfCells()):
+        cell_points = sphere.GetOutput().GetCell(i).GetPoints()
+        triangle = vtk.vtkTriangle()
+        for j in range(3):
+            point_id = surface.GetPoints().InsertNextPoint(
+                cell_points.GetPoint(j))
+            triangle.GetPointIds().SetId(j, point_id)
+        surface.GetPolys().InsertNextCell(triangle)
+
+    cell_ids, point_ids = get_triangle_point_ids(surface)
+    assert np.array_equal(cell_ids, np.arange(surface.GetNumberOfCells()))
+    points = np.array([surface.GetPoint(i)
+                       for i in range(surface.GetNumberOfPoints())])
+    p0, p1, p2 = (points[point_ids[:, j]] for j in range(3))
+    areas = triangle_areas(p0, p1, p2)
+    normals = triangle_normals(p0, p1, p2)
+    for i in cell_ids:
+        cell = surface.GetCell(i)
+        assert [cell.GetPointId(j) for j in range(3)] == list(point_ids[i])
+        cell_points = cell.GetPoints()
+        area = cell.TriangleArea(*[cell_points.GetPoint(j) for j in range(3)])
+        normal = np.zeros(3)
+        cell.ComputeNormal(*[cell_points.GetPoint(j) for j in range(3)] +
+                           [normal])
+        assert np.isclose(areas[i], area)
+        assert np.allclose(normals[i], normal)
+
+    unique_points, unique_ids = merge_duplicated_points(points)
+    assert np.array_equal(unique_points[unique_ids], points)
+    assert len(unique_points) == sphere.GetOutput().GetNumberOfPoints()
+    triangles = unique_ids[point_ids]
+    pairs, num_shared = find_triangle_neighbors(triangles)
+    true_pairs = []
+    true_num_shared = []
+    for i, j in combinations(range(len(triangles)), 2):
+        shared = len(set(triangles[i]) & set(triangles[j]))
+        if shared > 0:
+            true_pairs.append((i, j))
+            true_num_shared.append(shared)
+    assert np.array_equal(pairs, true_pairs)
+    assert np.array_equal(num_shared, true_num_shared)
+
+    edges = find_unique_edges(triangles)
+    true_edges = sorted({tuple(sorted((t[j], t[k]))) for t in triangles
+                         for j, k in [(0, 1), (1, 2), (0, 2)]})
+    assert np.array_equal(edges, true_edges)
+    indptr, triangle_ids = find_point_triangles(triangles, len(unique_points))
+    for i in range(len(unique_points)):
+        assert np.array_equal(triangle_ids[indptr[i]:indptr[i + 1]],
+                              np.flatnonzero((triangles == i).any(axis=1)))
+
+    keep = np.arange(surface.GetNumberOfCells()) % 3 != 0
+    extracted = extract_polygons(surface, keep)
+    assert extracted.GetNumberOfPoints() == surface.GetNumberOfPoints()
+    assert np.array_equal(get_triangle_point_ids(extracted)[1],
+                          point_ids[keep])